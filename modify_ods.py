@@ -6,10 +6,12 @@ Adiciona "DOUGLAS GOSTOSO" na linha 14 da planilha
 """
 
 import zipfile
-import xml.etree.ElementTree as ET
 import os
 import shutil
 from tempfile import TemporaryDirectory
+from ods_xml_backend import obter_backend
+
+XML = obter_backend()
 
 def modify_ods_file(ods_path, text_to_add="DOUGLAS GOSTOSO", target_row=14):
     """
@@ -38,8 +40,8 @@ def modify_ods_file(ods_path, text_to_add="DOUGLAS GOSTOSO", target_row=14):
             raise FileNotFoundError("content.xml não encontrado no arquivo ODS")
         
         # Parsear o XML
-        tree = ET.parse(content_xml_path)
-        root = tree.getroot()
+        with open(content_xml_path, 'rb') as f:
+            root = XML.fromstring(f.read())
         
         # Namespaces do OpenDocument
         namespaces = {
@@ -62,7 +64,7 @@ def modify_ods_file(ods_path, text_to_add="DOUGLAS GOSTOSO", target_row=14):
         
         # Garantir que temos linhas suficientes
         while len(rows) < target_row:
-            new_row = ET.SubElement(table, f"{{{namespaces['table']}}}table-row")
+            new_row = XML.SubElement(table, f"{{{namespaces['table']}}}table-row")
             rows.append(new_row)
         
         # Pegar a linha alvo (target_row - 1 porque é 0-indexed)
@@ -73,7 +75,7 @@ def modify_ods_file(ods_path, text_to_add="DOUGLAS GOSTOSO", target_row=14):
         
         if not cells:
             # Criar nova célula se não existir
-            cell = ET.SubElement(target_row_element, f"{{{namespaces['table']}}}table-cell")
+            cell = XML.SubElement(target_row_element, f"{{{namespaces['table']}}}table-cell")
         else:
             cell = cells[0]
         
@@ -82,11 +84,12 @@ def modify_ods_file(ods_path, text_to_add="DOUGLAS GOSTOSO", target_row=14):
             cell.remove(child)
         
         # Adicionar o novo texto
-        p_element = ET.SubElement(cell, f"{{{namespaces['text']}}}p")
+        p_element = XML.SubElement(cell, f"{{{namespaces['text']}}}p")
         p_element.text = text_to_add
         
         # Salvar o XML modificado
-        tree.write(content_xml_path, encoding='utf-8', xml_declaration=True)
+        with open(content_xml_path, 'wb') as f:
+            f.write(XML.tostring(root))
         
         # Recriar o arquivo ODS
         with zipfile.ZipFile(ods_path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
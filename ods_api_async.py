@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Integração assíncrona com a API da diretoria
+Variante do DiretoriaAPIIntegrator em asyncio, para rodar dentro de um
+serviço assíncrono e sobrepor a busca ao processamento:
+
+    ClienteAPIAssincrono           HTTP/1.1 em sockets não bloqueantes (streams do
+                                   asyncio), com um pool de conexões keep-alive
+    DiretoriaAPIIntegratorAsync    mesmos métodos e mesmas saídas, como corrotinas
+
+As participações das operações são buscadas em paralelo, na ordem das datas.
+Quando todas as operações até um dia D já chegaram, nenhum servidor ganha mais
+datas até D, então os períodos que terminam antes de D são fechados na hora,
+enquanto as buscas seguintes ainda estão em andamento.
+
+Uso:
+    python ods_api_async.py [--api URL] [--janela N] [--conexoes 8]
+    (imprime os períodos em JSON; ods_benchmark.py api compara com o caminho síncrono)
+"""
+
+import asyncio
+import gzip
+import json
+import urllib.parse
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from ods_api_client import ErroAPI
+from ods_diretoria_api_integration import DiretoriaAPIIntegrator
+from ods_instrumentation import contar, etapa
+
+ESTADOS_CONFIRMADOS = ('CONFIRMADO', 'ADICIONADO_SUP')
+CONEXOES_PADRAO = 8
+
+
+class _ConexaoFechada(Exception):
+    """O servidor fechou uma conexão keep-alive reaproveitada"""
+
+
+class ClienteAPIAssincrono:
+    """Pool de conexões HTTP/1.1 keep-alive em asyncio (http://host:porta)"""
+
+    def __init__(self, base_url: str, headers: Optional[Dict[str, str]] = None, conexoes: int = CONEXOES_PADRAO,
+                 timeout: float = 30):
+        """
+        Args:
+            conexoes (int): Requisições simultâneas (e conexões abertas) no máximo
+            timeout (float): Segundos por requisição
+        """
+        url = urllib.parse.urlsplit(base_url)
+        self.https = url.scheme == 'https'
+        self.host = url.hostname
+        self.port = url.port or (443 if self.https else 80)
+        self.prefixo = url.path.rstrip('/')
+        self.headers = dict(headers or {})
+        self.headers.setdefault('Accept-Encoding', 'gzip')
+        self.timeout = timeout
+        self.conexoes = conexoes
+        self._livres: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._limite: Optional[asyncio.Semaphore] = None
+        self.requisicoes = 0
+        self.conexoes_abertas = 0
+
+    async def _abrir(self):
+        leitor, escritor = await asyncio.open_connection(self.host, self.port, ssl=True if self.https else None)
+        self.conexoes_abertas += 1
+        return leitor, escritor
+
+    async def _ler_resposta(self, leitor: asyncio.StreamReader) -> Tuple[int, Dict[str, str], bytes]:
+        linha = await leitor.readline()
+        if not linha:
+            raise _ConexaoFechada()
+        status = int(linha.split(None, 2)[1])
+        cabecalhos = {}
+        while True:
+            linha = await leitor.readline()
+            if linha in (b'\r\n', b'\n', b''):
+                break
+            nome, _, valor = linha.decode('latin-1').partition(':')
+            cabecalhos[nome.strip().lower()] = valor.strip()
+
+        if cabecalhos.get('transfer-encoding', '').lower() == 'chunked':
+            partes = []
+            while True:
+                tamanho = int((await leitor.readline()).split(b';', 1)[0], 16)
+                if tamanho == 0:
+                    # Trailers até a linha vazia
+                    while (await leitor.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                partes.append(await leitor.readexactly(tamanho))
+                await leitor.readexactly(2)
+            corpo = b''.join(partes)
+        elif 'content-length' in cabecalhos:
+            corpo = await leitor.readexactly(int(cabecalhos['content-length']))
+        else:
+            corpo = await leitor.read()
+            cabecalhos['connection'] = 'close'
+        return status, cabecalhos, corpo
+
+    async def _requisitar(self, caminho: str) -> Tuple[int, Dict[str, str], bytes]:
+        reaproveitada = bool(self._livres)
+        leitor, escritor = self._livres.pop() if reaproveitada else await self._abrir()
+        pedido = [f"GET {caminho} HTTP/1.1", f"Host: {self.host}:{self.port}", "Connection: keep-alive"]
+        pedido += [f"{nome}: {valor}" for nome, valor in self.headers.items()]
+        try:
+            escritor.write(('\r\n'.join(pedido) + '\r\n\r\n').encode('latin-1'))
+            await escritor.drain()
+            status, cabecalhos, corpo = await self._ler_resposta(leitor)
+        except (_ConexaoFechada, asyncio.IncompleteReadError, ConnectionError) as e:
+            escritor.close()
+            if reaproveitada:
+                # Conexão keep-alive que o servidor já tinha fechado: refaz uma vez
+                raise _ConexaoFechada() from e
+            raise ConnectionError(f"Conexão encerrada sem resposta em {caminho}") from e
+        except BaseException:
+            escritor.close()
+            raise
+
+        if cabecalhos.get('connection', '').lower() == 'close':
+            escritor.close()
+        else:
+            self._livres.append((leitor, escritor))
+        return status, cabecalhos, corpo
+
+    async def get(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> bytes:
+        """GET em endpoint (ex.: '/api/unified/operacoes') e retorna o corpo"""
+        if self._limite is None:
+            self._limite = asyncio.Semaphore(self.conexoes)
+        caminho = self.prefixo + endpoint
+        if params:
+            caminho += '?' + urllib.parse.urlencode(params)
+
+        async with self._limite:
+            try:
+                status, cabecalhos, corpo = await asyncio.wait_for(self._requisitar(caminho), self.timeout)
+            except _ConexaoFechada:
+                status, cabecalhos, corpo = await asyncio.wait_for(self._requisitar(caminho), self.timeout)
+
+        self.requisicoes += 1
+        contar(requisicoes=1, bytes=len(corpo))
+        if cabecalhos.get('content-encoding') == 'gzip':
+            corpo = gzip.decompress(corpo)
+        if status >= 400:
+            raise ErroAPI(status, endpoint)
+        return corpo
+
+    async def get_json(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        return json.loads((await self.get(endpoint, params)).decode('utf-8'))
+
+    async def fechar(self):
+        while self._livres:
+            _, escritor = self._livres.pop()
+            escritor.close()
+            try:
+                await escritor.wait_closed()
+            except ConnectionError:
+                pass
+
+
+class PeriodosIncrementais:
+    """
+    Períodos consecutivos de cada servidor, fechados à medida que as datas chegam
+
+    Mesmo resultado de DiretoriaAPIIntegrator.calcular_periodos_consecutivos
+    sobre todas as datas do servidor (inclusive para datas repetidas), mas
+    calculado aos poucos: avancar(D) declara que todas as datas até D já
+    chegaram e fecha os períodos que não podem mais crescer.
+    """
+
+    def __init__(self):
+        self._pendentes: Dict[Any, List[date]] = {}
+        self._aberto: Dict[Any, Tuple[date, date]] = {}
+        self.fechados: Dict[Any, List[Dict[str, Any]]] = {}
+
+    def adicionar(self, servidor_id, data: date):
+        self._pendentes.setdefault(servidor_id, []).append(data)
+
+    def _fechar(self, servidor_id, inicio: date, fim: date):
+        self.fechados.setdefault(servidor_id, []).append(
+            {'inicio': inicio, 'fim': fim, 'dias': (fim - inicio).days + 1})
+
+    def avancar(self, fronteira: Optional[date]):
+        """Processa as datas até 'fronteira' (None = todas; nada mais vai chegar)"""
+        for servidor_id in list(self._pendentes):
+            pendentes = self._pendentes[servidor_id]
+            if fronteira is None:
+                prontas, resto = pendentes, []
+            else:
+                prontas = [d for d in pendentes if d <= fronteira]
+                resto = [d for d in pendentes if d > fronteira]
+            if resto:
+                self._pendentes[servidor_id] = resto
+            else:
+                del self._pendentes[servidor_id]
+
+            aberto = self._aberto.pop(servidor_id, None)
+            for data_atual in sorted(prontas):
+                if aberto is None:
+                    aberto = (data_atual, data_atual)
+                elif (data_atual - aberto[1]).days == 1:
+                    aberto = (aberto[0], data_atual)
+                else:
+                    self._fechar(servidor_id, *aberto)
+                    aberto = (data_atual, data_atual)
+            if aberto is None:
+                continue
+            # Todas as datas até a fronteira chegaram: se o dia seguinte ao fim já
+            # passou dela, a próxima data (se houver) não é consecutiva
+            if fronteira is None or aberto[1] + timedelta(days=1) <= fronteira:
+                self._fechar(servidor_id, *aberto)
+            else:
+                self._aberto[servidor_id] = aberto
+
+        if fronteira is None:
+            for servidor_id, aberto in self._aberto.items():
+                self._fechar(servidor_id, *aberto)
+            self._aberto.clear()
+
+
+def _data(texto: str) -> date:
+    return datetime.fromisoformat(texto.replace('Z', '+00:00')).date()
+
+
+class DiretoriaAPIIntegratorAsync(DiretoriaAPIIntegrator):
+    """
+    DiretoriaAPIIntegrator com a busca em asyncio
+
+    make_api_request, get_janelas_operacionais, get_operacoes_planejadas,
+    get_participacoes_operacao, processar_dados_diretoria e integrate_with_api
+    são corrotinas com as mesmas saídas dos métodos síncronos; formatação e
+    gravação são as mesmas (a gravação roda em uma thread, fora do loop).
+    """
+
+    def __init__(self, ods_file_path: str, api_base_url: str = "http://localhost:3000",
+                 api_client: Optional[ClienteAPIAssincrono] = None, conexoes: int = CONEXOES_PADRAO):
+        super().__init__(ods_file_path, api_base_url)
+        self.api_client = api_client or ClienteAPIAssincrono(api_base_url, {'User-Agent': self.headers['User-Agent']},
+                                                             conexoes=conexoes)
+
+    async def make_api_request(self, endpoint: str, params: Optional[Dict] = None) -> Optional[Dict]:
+        """Fazer requisição para a API"""
+        try:
+            return await self.api_client.get_json(endpoint, params)
+        except json.JSONDecodeError as e:
+            print(f"❌ Erro ao decodificar JSON: {e}")
+            return None
+        except Exception as e:
+            print(f"❌ Erro na requisição para {endpoint}: {e}")
+            return None
+
+    async def get_janelas_operacionais(self) -> List[Dict]:
+        """Obter janelas operacionais ativas"""
+        print("🔍 Buscando janelas operacionais...")
+        data = await self.make_api_request('/api/supervisor/janelas-operacionais')
+        if data and data.get('success'):
+            janelas_ativas = [j for j in data['data'] if j.get('status') == 'ATIVA']
+            print(f"✅ {len(janelas_ativas)} janelas ativas encontradas")
+            return janelas_ativas
+        print("❌ Erro ao obter janelas operacionais")
+        return []
+
+    async def get_operacoes_planejadas(self, janela_id: int) -> List[Dict]:
+        """Obter operações planejadas de uma janela"""
+        print(f"📋 Buscando operações planejadas da janela {janela_id}...")
+        params = {'janela_id': janela_id, 'tipo': 'PLANEJADA', '_t': int(datetime.now().timestamp())}
+        data = await self.make_api_request('/api/unified/operacoes', params)
+        if data and data.get('success'):
+            operacoes = data['data']
+            print(f"✅ {len(operacoes)} operações encontradas")
+            return operacoes
+        print("❌ Erro ao obter operações planejadas")
+        return []
+
+    async def get_participacoes_operacao(self, operacao_id: int) -> List[Dict]:
+        """Obter participações de uma operação específica"""
+        params = {'_t': int(datetime.now().timestamp())}
+        data = await self.make_api_request(f'/api/agendamento/operacoes/{operacao_id}/participacoes', params)
+        if data and data.get('success'):
+            return data['data']
+        return []
+
+    async def processar_dados_diretoria(self, janela_id: int) -> Dict[str, Any]:
+        """
+        Processar dados da diretoria seguindo a lógica da TabelaOperacoesDiretoria
+
+        As participações chegam fora de ordem; a ordem dos servidores e o nome
+        e a matrícula de cada um são os da primeira participação confirmada na
+        ordem (operação, participação) do caminho síncrono.
+        """
+        print(f"🔄 Processando dados da diretoria para janela {janela_id}...")
+        with etapa('periodos'):
+            operacoes = await self.get_operacoes_planejadas(janela_id)
+            if not operacoes:
+                return {"periodos": []}
+
+            datas_operacao = []
+            for operacao in operacoes:
+                texto = operacao.get('data_operacao') or operacao.get('dataOperacao')
+                datas_operacao.append(texto)
+            # Operações ainda em andamento com data: a menor delas limita a fronteira
+            pendentes_por_data: Dict[date, int] = {}
+            for texto in datas_operacao:
+                if texto:
+                    dia = _data(texto)
+                    pendentes_por_data[dia] = pendentes_por_data.get(dia, 0) + 1
+
+            periodos = PeriodosIncrementais()
+            primeira: Dict[Any, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+            totais = {'participacoes': 0, 'confirmadas': 0}
+
+            def receber(indice: int, participacoes: List[Dict]):
+                texto = datas_operacao[indice]
+                totais['participacoes'] += len(participacoes)
+                for posicao, p in enumerate(participacoes):
+                    if not (p.get('ativa') and p.get('estado_visual') in ESTADOS_CONFIRMADOS):
+                        continue
+                    totais['confirmadas'] += 1
+                    servidor_id = p.get('membro_id') or p.get('servidor_id')
+                    ordem = (indice, posicao)
+                    if servidor_id not in primeira or ordem < primeira[servidor_id][0]:
+                        primeira[servidor_id] = (ordem, p)
+                    if texto:
+                        periodos.adicionar(servidor_id, _data(texto))
+                if texto:
+                    dia = _data(texto)
+                    pendentes_por_data[dia] -= 1
+                    if not pendentes_por_data[dia]:
+                        del pendentes_por_data[dia]
+                    if pendentes_por_data:
+                        periodos.avancar(min(pendentes_por_data) - timedelta(days=1))
+
+            async def buscar(indice: int):
+                return indice, await self.get_participacoes_operacao(operacoes[indice]['id'])
+
+            # Na ordem das datas, para a fronteira andar enquanto as buscas seguem
+            ordem_busca = sorted(range(len(operacoes)),
+                                 key=lambda i: (datas_operacao[i] is None, datas_operacao[i] or '', i))
+            for tarefa in asyncio.as_completed([buscar(i) for i in ordem_busca]):
+                indice, participacoes = await tarefa
+                receber(indice, participacoes)
+            periodos.avancar(None)
+
+            print(f"👥 {totais['participacoes']} participações encontradas")
+            print(f"✅ {totais['confirmadas']} participações confirmadas")
+
+            periodos_agrupados: Dict[str, List[Dict[str, Any]]] = {}
+            for servidor_id, (_, p) in sorted(primeira.items(), key=lambda item: item[1][0]):
+                for periodo in periodos.fechados.get(servidor_id, []):
+                    data_retorno = periodo['fim'] + timedelta(days=1)
+                    periodo_str = f"{periodo['inicio'].strftime('%d/%m')} a {data_retorno.strftime('%d/%m/%Y')}"
+                    periodos_agrupados.setdefault(periodo_str, []).append({
+                        'nome': p.get('servidor_nome') or p.get('nome', 'Servidor'),
+                        'matricula': p.get('matricula', ''),
+                        'nViagem': '', 'conc': '', 'rev': '', 'obs': '',
+                    })
+
+            resultado = {"periodos": [{"periodo": periodo, "servidores": servidores}
+                                      for periodo, servidores in sorted(periodos_agrupados.items())]}
+            print(f"📊 {len(resultado['periodos'])} períodos processados")
+            contar(participacoes=totais['confirmadas'], periodos=len(resultado['periodos']))
+            return resultado
+
+    async def integrate_with_api(self, janela_id: Optional[int] = None, start_row: int = 20):
+        """Processo completo de integração com a API real"""
+        try:
+            print("🔄 Iniciando integração com API da diretoria...")
+            await asyncio.to_thread(self.create_backup)
+
+            if janela_id is None:
+                janelas = await self.get_janelas_operacionais()
+                if not janelas:
+                    print("❌ Nenhuma janela operacional ativa encontrada")
+                    return False
+                janela_id = janelas[0]['id']
+                print(f"🎯 Usando janela operacional: {janelas[0].get('titulo', janela_id)}")
+
+            diretoria_data = await self.processar_dados_diretoria(janela_id)
+            if not diretoria_data['periodos']:
+                print("⚠️ Nenhum período encontrado para inserir na planilha")
+                return False
+
+            await asyncio.to_thread(self._gravar, diretoria_data, start_row)
+            print("✅ Integração com API concluída com sucesso!")
+            print(f"📁 Backup salvo em: {self.backup_path}")
+            print(f"🎯 {len(diretoria_data['periodos'])} períodos processados")
+            return True
+
+        except Exception as e:
+            print(f"❌ Erro durante a integração: {str(e)}")
+            return False
+        finally:
+            await self.api_client.fechar()
+
+    def _gravar(self, diretoria_data: Dict[str, Any], start_row: int):
+        formatted_data = self.format_diretoria_data_for_ods(diretoria_data)
+        # Planilha e manifesto na mesma escrita travada
+        self.insert_and_save(formatted_data, start_row)
+
+
+def processar_diretoria(api_base_url: str, janela_id: Optional[int] = None, conexoes: int = CONEXOES_PADRAO,
+                        ods_path: str = '') -> Dict[str, Any]:
+    """Busca e processa uma janela (a primeira ativa, sem janela_id) fora de um loop já existente"""
+    async def executar():
+        integrador = DiretoriaAPIIntegratorAsync(ods_path, api_base_url, conexoes=conexoes)
+        try:
+            janela = janela_id
+            if janela is None:
+                janelas = await integrador.get_janelas_operacionais()
+                if not janelas:
+                    return {"periodos": []}
+                janela = janelas[0]['id']
+            return await integrador.processar_dados_diretoria(janela)
+        finally:
+            await integrador.api_client.fechar()
+    return asyncio.run(executar())
+
+
+def main(argv=None):
+    import argparse
+    import contextlib
+    import sys
+
+    parser = argparse.ArgumentParser(description='Períodos da diretoria pela API, em asyncio')
+    parser.add_argument('--api', default='http://localhost:3000', help='URL base da API')
+    parser.add_argument('--janela', type=int, help='Janela (padrão: a primeira ativa)')
+    parser.add_argument('--conexoes', type=int, default=CONEXOES_PADRAO, help='Requisições simultâneas')
+    args = parser.parse_args(argv)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        dados = processar_diretoria(args.api, args.janela, args.conexoes)
+    json.dump(dados, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+    return 0 if dados['periodos'] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cliente HTTP da API da aplicação para os integradores
+O urllib abre uma conexão TCP nova a cada requisição; aqui cada thread mantém
+uma conexão persistente (keep-alive) com o servidor, reaproveitada entre as
+chamadas de janelas, operações e participações. Respostas gzip são aceitas.
+
+Várias exportações simultâneas (serviço residente, lotes) consultam a mesma
+instância da aplicação que os supervisores usam. Por isso:
+    VooUnico          requisições idênticas (URL e cabeçalhos) em andamento ao
+                      mesmo tempo viram uma só; as demais esperam e recebem
+                      o mesmo corpo
+    LimiteEndpoints   balde de fichas por rota (/api/.../operacoes/{id}/...),
+                      compartilhado pelos clientes da mesma API no processo
+"""
+
+import gzip
+import http.client
+import json
+import re
+import threading
+import time
+import urllib.parse
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ods_instrumentation import contar, medido
+
+
+class ErroAPI(Exception):
+    """Resposta HTTP de erro da API"""
+
+    def __init__(self, status: int, endpoint: str):
+        super().__init__(f"HTTP {status} em {endpoint}")
+        self.status = status
+        self.endpoint = endpoint
+
+
+# Parâmetros que só furam caches (carimbo de tempo): não distinguem requisições
+PARAMETROS_IGNORADOS = ('_t',)
+
+
+def rota(endpoint: str) -> str:
+    """Endpoint sem os ids: '/api/agendamento/operacoes/7/participacoes' -> '.../operacoes/{id}/participacoes'"""
+    return re.sub(r'/\d+(?=/|$)', '/{id}', endpoint)
+
+
+class LimiteTaxa:
+    """Balde de fichas: até 'rajada' requisições seguidas, depois 'taxa' por segundo"""
+
+    def __init__(self, taxa: float, rajada: Optional[float] = None):
+        self.taxa = taxa
+        self.rajada = rajada or max(1.0, taxa)
+        self._fichas = self.rajada
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+        self.esperas = 0
+        self.segundos_espera = 0.0
+
+    def aguardar(self) -> float:
+        """Reserva uma ficha, dormindo até ela existir; retorna a espera em segundos"""
+        with self._lock:
+            agora = time.monotonic()
+            self._fichas = min(self.rajada, self._fichas + (agora - self._ultimo) * self.taxa)
+            self._ultimo = agora
+            # Fichas negativas são reservas de quem já está na fila
+            self._fichas -= 1
+            espera = -self._fichas / self.taxa if self._fichas < 0 else 0.0
+            if espera:
+                self.esperas += 1
+                self.segundos_espera += espera
+        if espera:
+            time.sleep(espera)
+        return espera
+
+
+class LimiteEndpoints:
+    """Um LimiteTaxa por rota, todos com a mesma taxa e rajada"""
+
+    def __init__(self, taxa: float, rajada: Optional[float] = None):
+        self.taxa = taxa
+        self.rajada = rajada
+        self._baldes: Dict[str, LimiteTaxa] = {}
+        self._lock = threading.Lock()
+
+    def aguardar(self, endpoint: str) -> float:
+        chave = rota(endpoint)
+        with self._lock:
+            balde = self._baldes.get(chave)
+            if balde is None:
+                balde = self._baldes[chave] = LimiteTaxa(self.taxa, self.rajada)
+        return balde.aguardar()
+
+    def estatisticas(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {chave: {'esperas': balde.esperas, 'segundos_espera': balde.segundos_espera}
+                    for chave, balde in self._baldes.items()}
+
+
+class _Voo:
+    __slots__ = ('pronto', 'resultado', 'erro')
+
+    def __init__(self):
+        self.pronto = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class VooUnico:
+    """Chamadas com a mesma chave em andamento ao mesmo tempo executam uma vez só"""
+
+    def __init__(self):
+        self._voos: Dict[Any, _Voo] = {}
+        self._lock = threading.Lock()
+        self.executadas = 0
+        self.coalescidas = 0
+
+    def executar(self, chave, funcao: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Returns:
+            tuple: (resultado, True se foi aproveitado de uma chamada já em andamento)
+
+        Uma exceção da chamada em andamento é repassada a todos que a esperavam.
+        """
+        with self._lock:
+            voo = self._voos.get(chave)
+            dono = voo is None
+            if dono:
+                voo = self._voos[chave] = _Voo()
+                self.executadas += 1
+            else:
+                self.coalescidas += 1
+
+        if not dono:
+            voo.pronto.wait()
+            if voo.erro is not None:
+                raise voo.erro
+            return voo.resultado, True
+
+        try:
+            voo.resultado = funcao()
+        except BaseException as e:
+            voo.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._voos[chave]
+            voo.pronto.set()
+        return voo.resultado, False
+
+
+# Compartilhados por todos os ClienteAPI do processo com o mesmo host:porta
+_VOOS: Dict[Tuple[str, Optional[int]], VooUnico] = {}
+_LIMITES: Dict[Tuple[str, Optional[int]], LimiteEndpoints] = {}
+_LOCK_COMPARTILHADOS = threading.Lock()
+
+
+def compartilhados(base_url: str, taxa: Optional[float] = None,
+                   rajada: Optional[float] = None) -> Tuple[VooUnico, Optional[LimiteEndpoints]]:
+    """
+    VooUnico e LimiteEndpoints da API em base_url neste processo
+
+    O limite é criado pelo primeiro cliente que informar uma taxa; os
+    seguintes usam o mesmo balde, qualquer que seja a taxa pedida.
+    """
+    url = urllib.parse.urlsplit(base_url)
+    chave = (url.hostname, url.port)
+    with _LOCK_COMPARTILHADOS:
+        voos = _VOOS.setdefault(chave, VooUnico())
+        limite = _LIMITES.get(chave)
+        if limite is None and taxa:
+            limite = _LIMITES[chave] = LimiteEndpoints(taxa, rajada)
+    return voos, limite
+
+
+class ClienteAPI:
+    """Conexões persistentes por thread com a API (http://host:porta)"""
+
+    def __init__(self, base_url: str, headers: Optional[Dict[str, str]] = None, timeout: float = 30,
+                 taxa: Optional[float] = None, rajada: Optional[float] = None, coalescer: bool = True):
+        """
+        Args:
+            taxa (float): Requisições por segundo por rota, somando todos os clientes
+                desta API no processo (None = sem limite)
+            rajada (float): Requisições seguidas antes do limite valer (padrão: taxa)
+            coalescer (bool): Juntar requisições idênticas simultâneas (VooUnico)
+        """
+        url = urllib.parse.urlsplit(base_url)
+        self.https = url.scheme == 'https'
+        self.host = url.hostname
+        self.port = url.port
+        self.prefixo = url.path.rstrip('/')
+        self.headers = dict(headers or {})
+        self.headers.setdefault('Accept-Encoding', 'gzip')
+        self.timeout = timeout
+        self._local = threading.local()
+        self._conexoes = []
+        self._lock = threading.Lock()
+        self.requisicoes = 0
+        self.conexoes_abertas = 0
+        self.coalescidas = 0
+        voos, self.limite = compartilhados(base_url, taxa, rajada)
+        self.voos = voos if coalescer else None
+
+    def _conexao(self) -> http.client.HTTPConnection:
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None:
+            classe = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conexao = classe(self.host, self.port, timeout=self.timeout)
+            self._local.conexao = conexao
+            with self._lock:
+                self._conexoes.append(conexao)
+                self.conexoes_abertas += 1
+        return conexao
+
+    def _descartar_conexao(self):
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is not None:
+            conexao.close()
+            self._local.conexao = None
+
+    @medido('http')
+    def get(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> bytes:
+        """
+        GET em endpoint (ex.: '/api/unified/operacoes') e retorna o corpo
+
+        Uma conexão keep-alive que o servidor fechou é refeita uma vez. Se a
+        mesma requisição (a menos do carimbo '_t'), com os mesmos cabeçalhos,
+        já está em andamento em outra thread, espera por ela em vez de repeti-la.
+        """
+        caminho = self.prefixo + endpoint
+        if params:
+            caminho += '?' + urllib.parse.urlencode(params)
+        if self.voos is None:
+            return self._get(endpoint, caminho)
+
+        chave_params = {k: v for k, v in (params or {}).items() if k not in PARAMETROS_IGNORADOS}
+        # Os cabeçalhos (Authorization, cookies) entram na chave: o VooUnico é
+        # do processo todo, e um cliente não pode receber a resposta de outra credencial
+        chave = (self.https, self.prefixo + endpoint + '?' + urllib.parse.urlencode(sorted(chave_params.items())),
+                 tuple(sorted((nome.lower(), valor) for nome, valor in self.headers.items())))
+        corpo, coalescida = self.voos.executar(chave, lambda: self._get(endpoint, caminho))
+        if coalescida:
+            with self._lock:
+                self.coalescidas += 1
+            contar(coalescidas=1)
+        return corpo
+
+    def _get(self, endpoint: str, caminho: str) -> bytes:
+        if self.limite is not None:
+            self.limite.aguardar(endpoint)
+
+        for tentativa in range(2):
+            conexao = self._conexao()
+            try:
+                conexao.request('GET', caminho, headers=self.headers)
+                resposta = conexao.getresponse()
+                corpo = resposta.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self._descartar_conexao()
+                if tentativa:
+                    raise
+                continue
+            except Exception:
+                self._descartar_conexao()
+                raise
+
+            with self._lock:
+                self.requisicoes += 1
+            contar(requisicoes=1, bytes=len(corpo))
+            if resposta.getheader('Content-Encoding') == 'gzip':
+                corpo = gzip.decompress(corpo)
+            if resposta.getheader('Connection', '').lower() == 'close':
+                self._descartar_conexao()
+            if resposta.status >= 400:
+                raise ErroAPI(resposta.status, endpoint)
+            return corpo
+
+    def get_json(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        return json.loads(self.get(endpoint, params).decode('utf-8'))
+
+    def fechar(self):
+        with self._lock:
+            for conexao in self._conexoes:
+                conexao.close()
+            self._conexoes.clear()
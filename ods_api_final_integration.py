@@ -20,19 +20,24 @@ Estrutura final na planilha:
 - Linha em branco entre períodos
 """
 
-import zipfile
-import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
-import shutil
 import os
+from ods_backup_store import ODSBackupStore
+from ods_export_manifest import gerar_manifesto
+from ods_instrumentation import contar, medido
+from ods_safe_writer import obter_fila
+from ods_stream_reader import posicao_linha
+from ods_verifier import imprimir_resultado, verificar_bloco
 from collections import defaultdict
+from ods_xml_backend import obter_backend
+
+XML = obter_backend()
 
 def criar_backup(arquivo_ods):
-    """Cria backup do arquivo ODS"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_path = f"{arquivo_ods}.backup_{timestamp}"
-    shutil.copy2(arquivo_ods, backup_path)
-    print(f"✅ Backup criado: {backup_path}")
+    """Cria backup do arquivo ODS no repositório deduplicado"""
+    manifesto = ODSBackupStore(arquivo_ods).snapshot(rotulo=os.path.basename(__file__))
+    backup_path = manifesto['path']
+    print(f"✅ Backup criado: {backup_path} ({manifesto['bytes_gravados']:,} bytes novos)")
     return backup_path
 
 def obter_dados_api_diretoria():
@@ -112,6 +117,7 @@ def obter_dados_fallback():
         "participacoes": []
     }
 
+@medido('periodos')
 def processar_dados_diretoria(dados_api):
     """
     Processa os dados da API conforme a lógica da aplicação React
@@ -187,9 +193,11 @@ def processar_dados_diretoria(dados_api):
     print(f"📊 {len(periodos_formatados)} períodos processados")
     total_servidores = sum(len(p['servidores']) for p in periodos_formatados)
     print(f"👥 {total_servidores} participações encontradas")
+    contar(participacoes=len(dados_api['participacoes']), periodos=len(periodos_formatados))
     
     return periodos_formatados
 
+@medido('formatar')
 def formatar_para_ods(periodos_formatados):
     """Formata os dados conforme a estrutura visual da diretoria"""
     print("📝 Formatando dados para inserção na planilha...")
@@ -234,20 +242,43 @@ def formatar_para_ods(periodos_formatados):
             'conteudo': ''
         })
     
+    contar(linhas=len(linhas_formatadas))
     return linhas_formatadas
 
 def inserir_dados_ods(arquivo_ods, linhas_formatadas, linha_inicio=55):
-    """Insere os dados formatados na planilha ODS"""
+    """
+    Insere os dados formatados na planilha ODS
+    
+    A inserção passa pela fila de escrita do arquivo: exportações concorrentes
+    para a mesma planilha são aplicadas juntas em uma única reescrita atômica,
+    sob lock, sem diretório temporário compartilhado.
+    """
     print("📋 Inserindo dados na planilha...")
     
-    # Extrair o arquivo ODS
-    with zipfile.ZipFile(arquivo_ods, 'r') as zip_ref:
-        zip_ref.extractall('temp_ods')
+    def registrar_manifesto(inseridas, content_xml):
+        # Manifesto para verificação rápida (CRC do content.xml + hash dos blocos),
+        # do content.xml que acabou de ser gravado e ainda sob o lock
+        gerar_manifesto(arquivo_ods, linhas_formatadas, content_xml=content_xml, linha_inicio=inseridas[1])
+        return inseridas
+    
+    fila = obter_fila(arquivo_ods)
+    linhas_inseridas, linha_planilha = fila.submeter(
+        lambda root: inserir_linhas_content_xml(root, linhas_formatadas, linha_inicio),
+        apos_gravar=registrar_manifesto
+    ).result()
     
-    # Carregar o content.xml
-    tree = ET.parse('temp_ods/content.xml')
-    root = tree.getroot()
+    print("💾 Planilha modificada salva")
     
+    return linhas_inseridas, linha_planilha
+
+@medido('xml')
+def inserir_linhas_content_xml(root, linhas_formatadas, linha_inicio=55):
+    """
+    Insere as linhas formatadas na primeira tabela da raiz do content.xml
+    
+    Returns:
+        tuple: (linhas inseridas, linha da planilha onde o bloco começa)
+    """
     # Namespace do OpenDocument
     ns = {
         'office': 'urn:oasis:names:tc:opendocument:xmlns:office:1.0',
@@ -267,91 +298,73 @@ def inserir_dados_ods(arquivo_ods, linhas_formatadas, linha_inicio=55):
     # Inserir as linhas formatadas
     linha_atual = linha_inicio
     linhas_inseridas = 0
+    primeira_linha = None
     
     for linha_data in linhas_formatadas:
         # Criar nova linha
-        nova_linha = ET.Element(f"{{{ns['table']}}}table-row")
+        nova_linha = XML.Element(f"{{{ns['table']}}}table-row")
         
         if linha_data['tipo'] == 'periodo':
             # Linha do período (mesclada em 6 colunas)
-            celula = ET.SubElement(nova_linha, f"{{{ns['table']}}}table-cell")
+            celula = XML.SubElement(nova_linha, f"{{{ns['table']}}}table-cell")
             celula.set(f"{{{ns['table']}}}number-columns-spanned", "6")
             
-            paragrafo = ET.SubElement(celula, f"{{{ns['text']}}}p")
+            paragrafo = XML.SubElement(celula, f"{{{ns['text']}}}p")
             paragrafo.text = linha_data['conteudo']
             
             # Adicionar células vazias para completar a mesclagem
             for _ in range(5):
-                ET.SubElement(nova_linha, f"{{{ns['table']}}}covered-table-cell")
+                XML.SubElement(nova_linha, f"{{{ns['table']}}}covered-table-cell")
         
         elif linha_data['tipo'] == 'cabecalho':
             # Cabeçalho da tabela
             for coluna in linha_data['colunas']:
-                celula = ET.SubElement(nova_linha, f"{{{ns['table']}}}table-cell")
-                paragrafo = ET.SubElement(celula, f"{{{ns['text']}}}p")
+                celula = XML.SubElement(nova_linha, f"{{{ns['table']}}}table-cell")
+                paragrafo = XML.SubElement(celula, f"{{{ns['text']}}}p")
                 paragrafo.text = coluna
         
         elif linha_data['tipo'] == 'servidor':
             # Dados do servidor
             for coluna in linha_data['colunas']:
-                celula = ET.SubElement(nova_linha, f"{{{ns['table']}}}table-cell")
-                paragrafo = ET.SubElement(celula, f"{{{ns['text']}}}p")
+                celula = XML.SubElement(nova_linha, f"{{{ns['table']}}}table-cell")
+                paragrafo = XML.SubElement(celula, f"{{{ns['text']}}}p")
                 paragrafo.text = coluna
         
         elif linha_data['tipo'] == 'separador':
             # Linha em branco
             for _ in range(6):
-                celula = ET.SubElement(nova_linha, f"{{{ns['table']}}}table-cell")
-                ET.SubElement(celula, f"{{{ns['text']}}}p")
+                celula = XML.SubElement(nova_linha, f"{{{ns['table']}}}table-cell")
+                XML.SubElement(celula, f"{{{ns['text']}}}p")
         
         # Inserir a linha na tabela
         primeira_tabela.insert(linha_atual, nova_linha)
+        if primeira_linha is None:
+            primeira_linha = nova_linha
         linha_atual += 1
         linhas_inseridas += 1
     
-    # Salvar o content.xml modificado
-    tree.write('temp_ods/content.xml', encoding='utf-8', xml_declaration=True)
-    
-    print("💾 Salvando planilha modificada...")
-    
-    # Recriar o arquivo ODS
-    with zipfile.ZipFile(arquivo_ods, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
-        for root_dir, dirs, files in os.walk('temp_ods'):
-            for file in files:
-                file_path = os.path.join(root_dir, file)
-                arc_name = os.path.relpath(file_path, 'temp_ods')
-                zip_ref.write(file_path, arc_name)
-    
-    # Limpar arquivos temporários
-    shutil.rmtree('temp_ods')
-    
-    return linhas_inseridas
+    contar(linhas=linhas_inseridas)
+    # 'linha_inicio' é índice entre os filhos da tabela (colunas inclusive): a
+    # linha da planilha onde o bloco começou é a que o verificador vai ler
+    return linhas_inseridas, (posicao_linha(primeira_tabela, primeira_linha) if primeira_linha is not None else None)
 
-def verificar_integracao(arquivo_ods):
-    """Verifica se a integração foi bem-sucedida"""
-    print("🔍 Verificando integração...")
+def verificar_integracao(arquivo_ods, linhas_formatadas, linha_inicio=None):
+    """
+    Verifica se a integração foi bem-sucedida
     
-    with zipfile.ZipFile(arquivo_ods, 'r') as zip_ref:
-        content = zip_ref.read('content.xml').decode('utf-8')
+    Confere o bloco inserido completo, célula por célula, em uma passada pela planilha.
+    Com 'linha_inicio' (a linha retornada por inserir_dados_ods), o bloco precisa
+    estar exatamente ali: uma cópia de uma exportação anterior não conta.
     
-    # Verificar se os dados foram inseridos
-    verificacoes = [
-        "CIDNO FABRÍCIO DOS SANTOS LIMA",
-        "DOUGLAS ALBERTO DOS SANTOS",
-        "ANTÔNIO IVANILDO CAETANO COSTA",
-        "Período: 03/10 a 06/10/2025",
-        "Período: 10/10 a 12/10/2025"
-    ]
+    Returns:
+        int: Quantidade de linhas do bloco conferidas (0 se houve divergência)
+    """
+    print("🔍 Verificando integração...")
     
-    encontrados = 0
-    for item in verificacoes:
-        if item in content:
-            print(f"  ✅ Encontrado: {item}")
-            encontrados += 1
-        else:
-            print(f"  ❌ Não encontrado: {item}")
+    resultado = verificar_bloco(arquivo_ods, linhas_formatadas, linha_inicio)
+    imprimir_resultado(resultado)
     
-    return encontrados
+    return resultado['linhas'] if resultado['ok'] else 0
 
 def main():
     """Função principal"""
@@ -387,11 +400,11 @@ def main():
         linhas_formatadas = formatar_para_ods(periodos_formatados)
         
         # Inserir na planilha
-        linhas_inseridas = inserir_dados_ods(arquivo_ods, linhas_formatadas)
+        linhas_inseridas, linha_planilha = inserir_dados_ods(arquivo_ods, linhas_formatadas)
         
         print("✅ Integração final concluída com sucesso!")
         print(f"📁 Backup salvo em: {backup_path}")
-        print(f"📊 {linhas_inseridas} linhas inseridas a partir da linha 55")
+        print(f"📊 {linhas_inseridas} linhas inseridas a partir da linha {linha_planilha}")
         print(f"🎯 {len(periodos_formatados)} períodos processados")
         
         print("\n📋 Períodos inseridos:")
@@ -401,9 +414,9 @@ def main():
             print(f"  • {periodo} - {qtd_servidores} servidores")
         
         # Verificar integração
-        encontrados = verificar_integracao(arquivo_ods)
+        encontrados = verificar_integracao(arquivo_ods, linhas_formatadas, linha_planilha)
         
-        print(f"\n🎉 Integração concluída! {encontrados} verificações bem-sucedidas.")
+        print(f"\n🎉 Integração concluída! {encontrados} linhas verificadas.")
         print("\n📋 Estrutura final na planilha:")
         print("  1. Período: XX/XX a XX/XX/XXXX (linha amarela, mesclada)")
         print("  2. Servidor | Matrícula | Nº Viagem | Conc? | Rev? | Obs. (cabeçalho)")
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Repositório de backups deduplicado para arquivos ODS
+Cada membro do ZIP (content.xml, styles.xml, imagens...) é guardado uma única
+vez, endereçado pelo hash SHA-256 do seu conteúdo. Um backup ("snapshot") é só
+um pequeno manifesto JSON apontando para esses objetos, então o custo de cada
+backup cai para o tamanho dos membros que realmente mudaram.
+
+Estrutura do repositório (por padrão em ".ods_backups" ao lado da planilha):
+    objects/ab/abcdef...   conteúdo bruto de cada membro, imutável
+    snapshots/<id>.json    manifesto de cada backup
+    repositorio.lock       lock do repositório: um backup (objetos + manifesto)
+                           e a coleta de lixo nunca rodam ao mesmo tempo
+
+Planilhas do mesmo diretório dividem o repositório (e os objetos iguais):
+listagem e retenção consideram só os backups da planilha do store ('origem');
+a coleta de lixo olha os de todas.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from ods_instrumentation import medido
+from ods_safe_writer import copiar_permissoes, lock_arquivo
+
+# ioctl FICLONE do Linux (_IOW(0x94, 9, int)) para cópias reflink (copy-on-write)
+FICLONE = 0x40049409
+
+DIRETORIO_PADRAO = '.ods_backups'
+
+
+def _escrever_atomico(caminho: str, dados: bytes):
+    """Grava em arquivo temporário no mesmo diretório e renomeia por cima"""
+    diretorio = os.path.dirname(caminho)
+    fd, temp_path = tempfile.mkstemp(dir=diretorio, prefix='.tmp_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(dados)
+        os.replace(temp_path, caminho)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def clonar_arquivo(origem: str, destino: str) -> str:
+    """
+    Clona um arquivo usando o método mais barato disponível
+
+    Tenta reflink (copy-on-write), depois hardlink e por último cópia comum.
+
+    Returns:
+        str: Método usado ('reflink', 'hardlink' ou 'copia')
+    """
+    try:
+        import fcntl
+        with open(origem, 'rb') as src, open(destino, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return 'reflink'
+    except (ImportError, OSError):
+        if os.path.exists(destino):
+            os.remove(destino)
+
+    try:
+        os.link(origem, destino)
+        return 'hardlink'
+    except OSError:
+        shutil.copy2(origem, destino)
+        return 'copia'
+
+
+class ODSBackupStore:
+    def __init__(self, ods_path: str, store_dir: Optional[str] = None,
+                 manter_ultimos: Optional[int] = 20, max_idade_dias: Optional[int] = 30):
+        """
+        Args:
+            ods_path (str): Planilha cujos backups serão guardados
+            store_dir (str): Diretório do repositório (padrão: .ods_backups ao lado da planilha)
+            manter_ultimos (int): Quantidade de backups mais recentes sempre mantidos (None = sem limite)
+            max_idade_dias (int): Backups além dos mais recentes e mais velhos que isso são
+                removidos na retenção (None = sem limite de idade)
+        """
+        self.ods_path = ods_path
+        if store_dir is None:
+            store_dir = os.path.join(os.path.dirname(os.path.abspath(ods_path)), DIRETORIO_PADRAO)
+        self.store_dir = store_dir
+        self.objects_dir = os.path.join(store_dir, 'objects')
+        self.snapshots_dir = os.path.join(store_dir, 'snapshots')
+        self.manter_ultimos = manter_ultimos
+        self.max_idade_dias = max_idade_dias
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _lock(self):
+        """Lock do repositório: sem ele a coleta de lixo poderia apagar objetos
+        de um backup em andamento, ainda sem manifesto que os referencie"""
+        return lock_arquivo(os.path.join(self.store_dir, 'repositorio'))
+
+    def _snapshot_path(self, snapshot_id: str) -> str:
+        return os.path.join(self.snapshots_dir, f"{snapshot_id}.json")
+
+    def _guardar_objeto(self, dados: bytes) -> Tuple[str, int]:
+        """Guarda um objeto se ainda não existir. Retorna (hash, bytes gravados)"""
+        digest = hashlib.sha256(dados).hexdigest()
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _escrever_atomico(path, dados)
+        return digest, len(dados)
+
+    @medido('backup')
+    def snapshot(self, rotulo: str = '') -> Dict:
+        """
+        Cria um backup da planilha atual
+
+        Args:
+            rotulo (str): Descrição livre gravada no manifesto
+
+        Returns:
+            dict: Manifesto do backup (inclui 'id', 'path' e 'bytes_gravados')
+        """
+        agora = datetime.now()
+        # Microssegundos + sufixo aleatório: execuções concorrentes não colidem
+        snapshot_id = f"{agora.strftime('%Y%m%d_%H%M%S_%f')}_{os.urandom(4).hex()}"
+
+        membros = []
+        bytes_gravados = 0
+        with self._lock():
+            with zipfile.ZipFile(self.ods_path, 'r') as zip_ref:
+                for info in zip_ref.infolist():
+                    digest, gravados = self._guardar_objeto(zip_ref.read(info.filename))
+                    bytes_gravados += gravados
+                    membros.append({
+                        'nome': info.filename,
+                        'hash': digest,
+                        'tamanho': info.file_size,
+                        'compress_type': info.compress_type,
+                        'date_time': list(info.date_time)
+                    })
+
+            manifesto = {
+                'id': snapshot_id,
+                'origem': os.path.abspath(self.ods_path),
+                'criado_em': agora.isoformat(),
+                'rotulo': rotulo,
+                'membros': membros
+            }
+            path = self._snapshot_path(snapshot_id)
+            _escrever_atomico(path, json.dumps(manifesto, ensure_ascii=False, indent=1).encode('utf-8'))
+
+            manifesto['path'] = path
+            manifesto['bytes_gravados'] = bytes_gravados
+
+            self._aplicar_retencao()
+        return manifesto
+
+    def listar(self, todas_origens: bool = False) -> List[Dict]:
+        """
+        Lista os manifestos de backup, do mais antigo para o mais recente
+
+        Args:
+            todas_origens (bool): Incluir os backups das outras planilhas do repositório
+        """
+        origem = os.path.abspath(self.ods_path)
+        snapshots = []
+        for nome in sorted(os.listdir(self.snapshots_dir)):
+            if not nome.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.snapshots_dir, nome), 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except FileNotFoundError:
+                # Removido pela retenção de outro processo depois do listdir
+                continue
+            if todas_origens or snapshot.get('origem') == origem:
+                snapshots.append(snapshot)
+        return snapshots
+
+    def carregar(self, snapshot_id: str) -> Dict:
+        """Carrega o manifesto de um backup"""
+        with open(self._snapshot_path(snapshot_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def restaurar(self, snapshot_id: str, destino: Optional[str] = None) -> str:
+        """
+        Reconstrói a planilha de um backup
+
+        Args:
+            snapshot_id (str): Identificador do backup
+            destino (str): Arquivo de saída (padrão: a própria planilha)
+
+        Returns:
+            str: Caminho do arquivo restaurado
+        """
+        destino = destino or self.ods_path
+        # Sob o lock da planilha (a mesma ordem dos escritores: planilha, depois
+        # repositório), uma exportação em andamento não é apagada pela restauração
+        # nem grava por cima dela; sob o do repositório, a retenção não apaga o
+        # backup no meio da leitura
+        with lock_arquivo(destino), self._lock():
+            manifesto = self.carregar(snapshot_id)
+
+            # mimetype precisa ser o primeiro membro e sem compressão
+            membros = sorted(manifesto['membros'], key=lambda m: m['nome'] != 'mimetype')
+
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(destino)), prefix='.tmp_')
+            os.close(fd)
+            try:
+                with zipfile.ZipFile(temp_path, 'w') as zip_ref:
+                    for membro in membros:
+                        info = zipfile.ZipInfo(membro['nome'], date_time=tuple(membro['date_time']))
+                        if membro['nome'] == 'mimetype':
+                            info.compress_type = zipfile.ZIP_STORED
+                        else:
+                            info.compress_type = membro['compress_type']
+                        with open(self._object_path(membro['hash']), 'rb') as f:
+                            zip_ref.writestr(info, f.read())
+                copiar_permissoes(destino, temp_path)
+                os.replace(temp_path, destino)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+        return destino
+
+    def materializar(self, snapshot_id: str, diretorio: str) -> Dict[str, int]:
+        """
+        Expõe os membros de um backup como arquivos soltos em um diretório
+
+        Usa reflink ou hardlink a partir dos objetos sempre que possível, então
+        não copia bytes. Arquivos ligados por hardlink compartilham o objeto:
+        substitua-os (os.replace) em vez de editá-los no lugar.
+
+        Returns:
+            dict: Contagem de membros por método de clonagem
+        """
+        metodos = {}
+        with self._lock():
+            manifesto = self.carregar(snapshot_id)
+            for membro in manifesto['membros']:
+                destino = os.path.join(diretorio, membro['nome'])
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                metodo = clonar_arquivo(self._object_path(membro['hash']), destino)
+                metodos[metodo] = metodos.get(metodo, 0) + 1
+        return metodos
+
+    def aplicar_retencao(self) -> int:
+        """
+        Remove backups fora da política de retenção e objetos não referenciados
+
+        Vale só para os backups desta planilha: os 'manter_ultimos' mais recentes
+        são sempre mantidos; dos demais, são removidos os mais velhos que
+        'max_idade_dias'. Sem limite de idade, tudo além dos 'manter_ultimos' é
+        removido.
+
+        Returns:
+            int: Quantidade de backups removidos
+        """
+        with self._lock():
+            return self._aplicar_retencao()
+
+    def _aplicar_retencao(self) -> int:
+        snapshots = self.listar()
+        if self.manter_ultimos is None or len(snapshots) <= self.manter_ultimos:
+            return 0
+
+        candidatos = snapshots[:len(snapshots) - self.manter_ultimos]
+        if self.max_idade_dias is not None:
+            limite = datetime.now() - timedelta(days=self.max_idade_dias)
+            candidatos = [s for s in candidatos if datetime.fromisoformat(s['criado_em']) < limite]
+
+        for snapshot in candidatos:
+            try:
+                os.remove(self._snapshot_path(snapshot['id']))
+            except FileNotFoundError:
+                pass
+
+        if candidatos:
+            self._coletar_lixo()
+        return len(candidatos)
+
+    def coletar_lixo(self) -> int:
+        """Remove objetos que nenhum backup referencia. Retorna bytes liberados"""
+        with self._lock():
+            return self._coletar_lixo()
+
+    def _coletar_lixo(self) -> int:
+        referenciados = set()
+        # Objetos são divididos entre as planilhas do repositório
+        for snapshot in self.listar(todas_origens=True):
+            referenciados.update(m['hash'] for m in snapshot['membros'])
+
+        liberados = 0
+        for prefixo in os.listdir(self.objects_dir):
+            prefixo_dir = os.path.join(self.objects_dir, prefixo)
+            for digest in os.listdir(prefixo_dir):
+                if digest not in referenciados:
+                    path = os.path.join(prefixo_dir, digest)
+                    try:
+                        tamanho = os.path.getsize(path)
+                        os.remove(path)
+                    except FileNotFoundError:
+                        # Outra coleta (sem o lock, ex.: versão antiga) chegou antes
+                        continue
+                    liberados += tamanho
+        return liberados
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Backups deduplicados de arquivos ODS')
+    parser.add_argument('--file', '-f', required=True, help='Caminho do arquivo ODS')
+    parser.add_argument('--store', help='Diretório do repositório de backups')
+    parser.add_argument('--manter', type=int, default=20, help='Backups recentes sempre mantidos')
+    parser.add_argument('--max-idade-dias', type=int, default=30, help='Idade máxima dos demais backups')
+    acao = parser.add_mutually_exclusive_group()
+    acao.add_argument('--listar', action='store_true', help='Listar backups')
+    acao.add_argument('--restaurar', metavar='ID', help='Restaurar um backup sobre a planilha')
+    acao.add_argument('--materializar', nargs=2, metavar=('ID', 'DIR'),
+                      help='Extrair os membros de um backup em um diretório (reflink/hardlink, sem copiar bytes)')
+
+    args = parser.parse_args()
+
+    store = ODSBackupStore(args.file, args.store, args.manter, args.max_idade_dias)
+
+    if args.listar:
+        for snapshot in store.listar():
+            print(f"💾 {snapshot['id']}  {snapshot['criado_em']}  {snapshot['rotulo']}")
+    elif args.restaurar:
+        store.restaurar(args.restaurar)
+        print(f"✅ Backup {args.restaurar} restaurado em {args.file}")
+    elif args.materializar:
+        snapshot_id, diretorio = args.materializar
+        metodos = store.materializar(snapshot_id, diretorio)
+        resumo = ', '.join(f"{quantidade} por {metodo}" for metodo, quantidade in sorted(metodos.items()))
+        print(f"✅ Backup {snapshot_id} extraído em {diretorio} ({resumo})")
+    else:
+        manifesto = store.snapshot()
+        print(f"✅ Backup criado: {manifesto['id']} ({manifesto['bytes_gravados']:,} bytes novos)")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,628 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks dos scripts ODS
+Mede, sobre o modelo real, o custo de cada etapa da exportação.
+
+Uso:
+    python ods_benchmark.py xml [--file ARQUIVO] [--linhas N] [--repeticoes N]
+    python ods_benchmark.py zip [--file ARQUIVO] [--linhas N] [--repeticoes N] [--threads N]
+    python ods_benchmark.py formatos [--file ARQUIVO] [--linhas N] [--repeticoes N]
+    python ods_benchmark.py daemon [--file ARQUIVO] [--repeticoes N]
+    python ods_benchmark.py startup [--repeticoes N]
+    python ods_benchmark.py blocos [--file ARQUIVO] [--tamanhos 10000,50000] [--repeticoes N]
+    python ods_benchmark.py api [--servidores N] [--latencia MS] [--jitter MS] [--erros F]
+                                [--desconexoes F] [--gzip [NIVEL]] [--sem-keepalive] [--repeticoes N]
+    python ods_benchmark.py concorrentes [--servidores N] [--exportacoes 4] [--limite-api RPS] [--rajada-api N]
+                                         [--latencia MS] ...
+    python ods_benchmark.py suite [--file ARQUIVO] [--tamanhos 100,1000,10000] [--repeticoes N]
+                                  [--baseline [ARQUIVO]] [--salvar-baseline] [--limite PCT]
+    python ods_benchmark.py comparar --atual ARQUIVO [--baseline ARQUIVO] [--limite PCT]
+
+suite e comparar (ods_benchmark_suite.py) gravam e leem benchmark-results/.
+"""
+
+import http.client
+import io
+import os
+import subprocess
+import sys
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from ods_mock_api import adicionar_opcoes_falhas, opcoes_falhas
+from ods_multi_sheet import exportar_folhas, linhas_do_periodo
+from ods_row_writers import ESCRITORES
+from ods_stream_reader import iterar_linhas as iterar_linhas_planilha
+from ods_stream_writer import NIVEIS, comprimir_deflate
+from ods_xml_backend import backends_disponiveis, obter_backend
+
+ARQUIVO_PADRAO = "Pedido Diária Padrao (3).ods"
+
+TABLE_NS = 'urn:oasis:names:tc:opendocument:xmlns:table:1.0'
+TEXT_NS = 'urn:oasis:names:tc:opendocument:xmlns:text:1.0'
+
+
+def medir(funcao: Callable[[], Any], repeticoes: int) -> float:
+    """Menor tempo, em ms, entre as repetições"""
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor * 1000
+
+
+def _inserir_linhas(backend, root, linhas: int):
+    # Mesma forma das linhas de servidor dos integradores: 6 células com um text:p
+    tabela = next(root.iter(f"{{{TABLE_NS}}}table"))
+    for i in range(linhas):
+        linha = backend.Element(f"{{{TABLE_NS}}}table-row")
+        for coluna in range(6):
+            celula = backend.SubElement(linha, f"{{{TABLE_NS}}}table-cell")
+            paragrafo = backend.SubElement(celula, f"{{{TEXT_NS}}}p")
+            paragrafo.text = f"SERVIDOR {i}" if coluna == 0 else str(i)
+        tabela.append(linha)
+
+
+def bench_xml_backends(ods_path: str = ARQUIVO_PADRAO, linhas: int = 500, repeticoes: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    Parse, alteração (inserção de linhas) e serialização do content.xml em cada backend
+
+    Returns:
+        dict: {backend: {'parse_ms', 'iterparse_ms', 'mutate_ms', 'serialize_ms'}}
+    """
+    with zipfile.ZipFile(ods_path, 'r') as zip_ref:
+        content_xml = zip_ref.read('content.xml')
+
+    resultados = {}
+    for nome, backend in backends_disponiveis().items():
+        def iterparse():
+            for _, elem in backend.iterparse(io.BytesIO(content_xml)):
+                elem.clear()
+
+        def mutate():
+            _inserir_linhas(backend, backend.fromstring(content_xml), linhas)
+
+        root = backend.fromstring(content_xml)
+        _inserir_linhas(backend, root, linhas)
+
+        parse_ms = medir(lambda: backend.fromstring(content_xml), repeticoes)
+        resultados[nome] = {
+            'parse_ms': parse_ms,
+            'iterparse_ms': medir(iterparse, repeticoes),
+            'mutate_ms': max(medir(mutate, repeticoes) - parse_ms, 0.0),
+            'serialize_ms': medir(lambda: backend.tostring(root), repeticoes),
+        }
+    return resultados
+
+
+def bench_compressao(ods_path: str = ARQUIVO_PADRAO, linhas: int = 50000, repeticoes: int = 3,
+                     threads: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Compressão de um content.xml grande (modelo + linhas inseridas) por nível
+
+    Compara o deflate em uma thread com o deflate em blocos no pool.
+
+    Returns:
+        dict: {nível: {'mb', '1_thread_ms', 'N_threads_ms', 'taxa', 'taxa_blocos'}}
+    """
+    backend = obter_backend()
+    with zipfile.ZipFile(ods_path, 'r') as zip_ref:
+        root = backend.fromstring(zip_ref.read('content.xml'))
+    _inserir_linhas(backend, root, linhas)
+    dados = backend.tostring(root)
+
+    threads = threads or os.cpu_count() or 1
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for nome, nivel in NIVEIS.items():
+            if nivel == 0:
+                resultados[nome] = {'mb': len(dados) / 1e6, '1_thread_ms': 0.0, f'{threads}_threads_ms': 0.0,
+                                    'taxa': 1.0, 'taxa_blocos': 1.0}
+                continue
+            simples = comprimir_deflate(dados, nivel)
+            blocos = comprimir_deflate(dados, nivel, executor)
+            # O resultado em blocos precisa descomprimir para o mesmo conteúdo
+            if zlib.decompress(blocos, -15) != dados:
+                raise RuntimeError(f"Deflate em blocos corrompeu o conteúdo no nível {nome}")
+            resultados[nome] = {
+                'mb': len(dados) / 1e6,
+                '1_thread_ms': medir(lambda: comprimir_deflate(dados, nivel), repeticoes),
+                f'{threads}_threads_ms': medir(lambda: comprimir_deflate(dados, nivel, executor), repeticoes),
+                'taxa': len(dados) / len(simples),
+                'taxa_blocos': len(dados) / len(blocos),
+            }
+    return resultados
+
+
+def dados_sinteticos(servidores: int, por_periodo: int = 20) -> Dict[str, Any]:
+    """Dados no formato {"periodos": [...]} com 'servidores' linhas de servidor"""
+    periodos = []
+    for inicio in range(0, servidores, por_periodo):
+        dia = inicio // por_periodo % 28 + 1
+        periodos.append({
+            'periodo': f"{dia:02d}/10 a {dia + 1:02d}/10/2025 #{inicio // por_periodo}",
+            'servidores': [
+                {'nome': f"SERVIDOR {i}", 'matricula': str(100000 + i),
+                 'nViagem': '', 'conc': '', 'rev': '', 'obs': ''}
+                for i in range(inicio, min(inicio + por_periodo, servidores))
+            ]
+        })
+    return {'periodos': periodos}
+
+
+def bench_formatos(ods_path: str = ARQUIVO_PADRAO, linhas: int = 50000, repeticoes: int = 3) -> Dict[str, Dict[str, float]]:
+    """
+    Vazão de escrita das mesmas linhas em cada formato de saída
+
+    'ods' é o caminho com o modelo (folha copiada do modelo + ZIP); os demais
+    são os escritores de ods_row_writers.
+
+    Returns:
+        dict: {formato: {'ms', 'linhas_por_s', 'mb_por_s', 'tamanho_kb'}}
+    """
+    dados = dados_sinteticos(linhas)
+    linhas_formatadas = [celulas for p in dados['periodos'] for celulas in linhas_do_periodo(p)]
+
+    escritores = dict(ESCRITORES)
+    escritores['ods'] = lambda rows, saida: exportar_folhas(ods_path, saida, [('Diretoria', lambda: dados)],
+                                                           resumo=False)
+    resultados = {}
+    for formato, escritor in escritores.items():
+        tamanho = 0
+
+        def executar():
+            nonlocal tamanho
+            saida = io.BytesIO()
+            escritor(linhas_formatadas, saida)
+            tamanho = saida.tell()
+
+        ms = medir(executar, repeticoes)
+        resultados[formato] = {
+            'ms': ms,
+            'linhas_por_s': len(linhas_formatadas) / (ms / 1000),
+            'mb_por_s': tamanho / 1e6 / (ms / 1000),
+            'tamanho_kb': tamanho / 1024,
+        }
+    return resultados
+
+
+def bench_daemon(ods_path: str = ARQUIVO_PADRAO, pedidos: int = 50, frios: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    Latência de uma exportação (dados mock, ODS) a frio e no serviço residente
+
+    A frio é um processo novo por exportação ('ods_export_daemon.py once'),
+    como hoje com main(); no serviço, pedidos HTTP em uma conexão keep-alive.
+
+    Returns:
+        dict: {'frio': {...}, 'residente': {...}} com 'p50_ms', 'p99_ms' e 'pedidos'
+    """
+    from ods_export_daemon import ServicoExportacao, criar_servidor, percentil
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ods_export_daemon.py')
+    frio = []
+    for _ in range(frios):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable, script, 'once', '--mock', '--file', ods_path],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        frio.append(time.perf_counter() - inicio)
+
+    servidor = criar_servidor(ServicoExportacao(ods_path), porta=0)
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    residente = []
+    try:
+        conexao = http.client.HTTPConnection('127.0.0.1', servidor.server_address[1])
+        for _ in range(pedidos):
+            inicio = time.perf_counter()
+            conexao.request('GET', '/export?mock=1')
+            resposta = conexao.getresponse()
+            resposta.read()
+            residente.append(time.perf_counter() - inicio)
+            if resposta.status != 200:
+                raise RuntimeError(f"Serviço respondeu HTTP {resposta.status}")
+        conexao.close()
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+    return {
+        nome: {'pedidos': len(valores), 'p50_ms': percentil(valores, 50) * 1000,
+               'p99_ms': percentil(valores, 99) * 1000}
+        for nome, valores in (('frio', frio), ('residente', residente))
+    }
+
+
+def _ler_blocos_dom(caminho: str) -> int:
+    # Referência: a planilha inteira em árvore, como o ODSModifier a carrega
+    backend = obter_backend()
+    with zipfile.ZipFile(caminho, 'r') as zip_ref:
+        root = backend.fromstring(zip_ref.read('content.xml'))
+    tabela = next(root.iter(f'{{{TABLE_NS}}}table'))
+    return sum(1 for _ in tabela.iter(f'{{{TABLE_NS}}}table-row'))
+
+
+def bench_blocos(ods_path: str = ARQUIVO_PADRAO, tamanhos: Iterable[int] = (10000, 50000),
+                 repeticoes: int = 3) -> Dict[str, Dict[str, float]]:
+    """
+    Leitura dos blocos da diretoria de volta (ods_diretoria_blocos.iterar_registros)
+
+    Para cada tamanho, grava uma planilha com o modelo e os servidores
+    sintéticos, lê os registros e mede tempo e pico de memória (tracemalloc),
+    ao lado de um parse da árvore inteira. O pico do streaming deve ficar
+    parado enquanto o do parse completo cresce com a planilha.
+
+    Returns:
+        dict: {servidores: {'linhas', 'ms', 'linhas_por_s', 'pico_kb', 'pico_dom_kb'}}
+    """
+    import tempfile
+    import tracemalloc
+
+    from ods_diretoria_blocos import iterar_registros
+
+    def pico_kb(funcao) -> float:
+        tracemalloc.start()
+        try:
+            funcao()
+            return tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+
+    # O modelo pode já trazer blocos preenchidos
+    do_modelo = sum(1 for _ in iterar_registros(ods_path))
+    resultados = {}
+    with tempfile.TemporaryDirectory() as diretorio:
+        for servidores in tamanhos:
+            caminho = os.path.join(diretorio, f'blocos_{servidores}.ods')
+            dados = dados_sinteticos(servidores)
+            with open(caminho, 'wb') as f:
+                exportar_folhas(ods_path, f, [('Diretoria', lambda: dados)], resumo=False)
+            del dados
+
+            lidos = sum(1 for _ in iterar_registros(caminho))
+            if lidos != servidores + do_modelo:
+                raise RuntimeError(f"Leitura devolveu {lidos - do_modelo} servidores de {servidores}")
+            linhas = sum(1 for _ in iterar_linhas_planilha(caminho))
+            ms = medir(lambda: sum(1 for _ in iterar_registros(caminho)), repeticoes)
+            resultados[f'{servidores:,}'] = {
+                'linhas': linhas,
+                'ms': ms,
+                'linhas_por_s': linhas / (ms / 1000),
+                'pico_kb': pico_kb(lambda: sum(1 for _ in iterar_registros(caminho))),
+                'pico_dom_kb': pico_kb(lambda: _ler_blocos_dom(caminho)),
+            }
+    return resultados
+
+
+def _integrador_urllib(url: str):
+    from ods_diretoria_api_integration import DiretoriaAPIIntegrator
+    return DiretoriaAPIIntegrator(ARQUIVO_PADRAO, url), None
+
+
+def _integrador_keepalive(url: str):
+    from ods_api_client import ClienteAPI
+    from ods_diretoria_api_integration import DiretoriaAPIIntegrator
+    cliente = ClienteAPI(url)
+    return DiretoriaAPIIntegrator(ARQUIVO_PADRAO, url, api_client=cliente), cliente
+
+
+def _integrador_async(url: str):
+    from ods_api_async import DiretoriaAPIIntegratorAsync
+    return DiretoriaAPIIntegratorAsync(ARQUIVO_PADRAO, url), None
+
+
+async def _processar_async(integrador, janela_id: int) -> Dict[str, Any]:
+    try:
+        return await integrador.processar_dados_diretoria(janela_id)
+    finally:
+        await integrador.api_client.fechar()
+
+
+# Cliente -> fábrica(url) que devolve (integrador, cliente a fechar ou None);
+# integradores assíncronos fecham o próprio cliente
+CLIENTES_API = {
+    'urllib': _integrador_urllib,
+    'keepalive': _integrador_keepalive,
+    'async': _integrador_async,
+}
+
+
+def bench_api(servidores: int = 200, repeticoes: int = 3, falhas: Optional[Dict[str, Any]] = None,
+              clientes: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Busca dos dados da diretoria pela API local (ods_mock_api), por cliente HTTP
+
+    Cada rodada sobe um servidor novo com a mesma semente, então todos os
+    clientes veem a mesma sequência de latências e falhas. 'linhas' abaixo do
+    esperado indica participações perdidas por erros sem nova tentativa.
+    'iguais' compara os períodos com os do primeiro cliente da lista.
+
+    Args:
+        falhas (dict): Argumentos de ods_mock_api.Falhas (latencia_ms, erros, gzip_nivel...)
+
+    Returns:
+        dict: {cliente: {'ms', 'requisicoes', 'conexoes', 'erros', 'kb_enviados', 'periodos', 'iguais'}}
+    """
+    import asyncio
+    import contextlib
+
+    from ods_mock_api import Falhas, iniciar_em_thread
+    from ods_workload import GeradorCarga
+
+    gerador = GeradorCarga(servidores=servidores)
+    resultados = {}
+    referencia = None
+    for nome in clientes or CLIENTES_API:
+        melhor = None
+        for _ in range(repeticoes):
+            servidor, url = iniciar_em_thread(gerador, Falhas(**(falhas or {})))
+            integrador, cliente = CLIENTES_API[nome](url)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    inicio = time.perf_counter()
+                    if asyncio.iscoroutinefunction(integrador.processar_dados_diretoria):
+                        dados = asyncio.run(_processar_async(integrador, 1))
+                    else:
+                        dados = integrador.processar_dados_diretoria(1)
+                    tempo = time.perf_counter() - inicio
+            finally:
+                if cliente is not None:
+                    cliente.fechar()
+                servidor.shutdown()
+                servidor.server_close()
+            if melhor is None or tempo < melhor[0]:
+                melhor = (tempo, servidor.estatisticas.como_dict(), dados)
+        tempo, estatisticas, dados = melhor
+        if referencia is None:
+            referencia = dados
+        resultados[nome] = {
+            'ms': tempo * 1000,
+            'requisicoes': estatisticas['requisicoes'],
+            'conexoes': estatisticas['conexoes'],
+            'erros': estatisticas['erros'] + estatisticas['desconexoes'],
+            'kb_enviados': estatisticas['bytes_enviados'] / 1024,
+            'periodos': len(dados['periodos']),
+            'iguais': dados == referencia,
+        }
+    return resultados
+
+
+def bench_concorrentes(servidores: int = 200, exportacoes: int = 4, taxa: Optional[float] = None,
+                       rajada: Optional[float] = None, falhas: Optional[Dict[str, Any]] = None,
+                       repeticoes: int = 3) -> Dict[str, Dict[str, float]]:
+    """
+    Várias exportações da mesma janela ao mesmo tempo contra a API local
+
+    Cada exportação tem o próprio integrador e ClienteAPI, como pedidos
+    paralelos no serviço residente. Compara requisições isoladas, coalescidas
+    (VooUnico) e, se 'taxa' for dada, coalescidas e limitadas por rota.
+
+    Returns:
+        dict: {modo: {'ms', 'requisicoes', 'coalescidas', 'pico_rps', 'periodos'}}
+    """
+    import contextlib
+
+    from ods_api_client import ClienteAPI
+    from ods_diretoria_api_integration import DiretoriaAPIIntegrator
+    from ods_mock_api import Falhas, iniciar_em_thread
+    from ods_workload import GeradorCarga
+
+    modos = {'isoladas': (False, None), 'coalescidas': (True, None)}
+    if taxa:
+        modos['limitadas'] = (True, taxa)
+    gerador = GeradorCarga(servidores=servidores)
+    resultados = {}
+    for nome, (coalescer, taxa_modo) in modos.items():
+        melhor = None
+        for _ in range(repeticoes):
+            servidor, url = iniciar_em_thread(gerador, Falhas(**(falhas or {})))
+            clientes = [ClienteAPI(url, taxa=taxa_modo, rajada=rajada, coalescer=coalescer)
+                        for _ in range(exportacoes)]
+            instantes: List[float] = []
+
+            def exportar(cliente):
+                integrador = DiretoriaAPIIntegrator(ARQUIVO_PADRAO, url, api_client=cliente)
+                get = cliente._get
+
+                def get_registrado(*args):
+                    instantes.append(time.perf_counter())
+                    return get(*args)
+                cliente._get = get_registrado
+                return integrador.processar_dados_diretoria(1)
+
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    inicio = time.perf_counter()
+                    with ThreadPoolExecutor(exportacoes) as executor:
+                        saidas = list(executor.map(exportar, clientes))
+                    tempo = time.perf_counter() - inicio
+            finally:
+                for cliente in clientes:
+                    cliente.fechar()
+                servidor.shutdown()
+                servidor.server_close()
+            # Maior número de requisições enviadas em uma janela de 1 s
+            instantes.sort()
+            pico, j = 0, 0
+            for i, instante in enumerate(instantes):
+                while instante - instantes[j] >= 1:
+                    j += 1
+                pico = max(pico, i - j + 1)
+            if melhor is None or tempo < melhor['ms'] / 1000:
+                melhor = {
+                    'ms': tempo * 1000,
+                    'requisicoes': servidor.estatisticas.como_dict()['requisicoes'],
+                    'coalescidas': sum(cliente.coalescidas for cliente in clientes),
+                    'pico_rps': pico,
+                    'periodos': len(saidas[0]['periodos']),
+                }
+        resultados[nome] = melhor
+    return resultados
+
+
+def _tempo_imports(argv: List[str]) -> float:
+    # Soma dos tempos cumulativos dos imports de primeiro nível (-X importtime), em ms
+    saida = subprocess.run([sys.executable, '-X', 'importtime'] + argv, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True).stderr
+    total = 0
+    for linha in saida.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, cumulativo, nome = linha[len('import time:'):].split('|')
+        if not nome.startswith('  '):
+            total += int(cumulativo)
+    return total / 1000
+
+
+def bench_startup(repeticoes: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    Custo de partida de cada subcomando do ods_cli.py
+
+    Mede os imports de cada subcomando (ods_cli.py --imports-only) descontando
+    os do interpretador vazio, e o tempo total do processo.
+
+    Returns:
+        dict: {subcomando: {'imports_ms', 'processo_ms'}}
+    """
+    from ods_cli import MODULOS
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ods_cli.py')
+    base_imports = min(_tempo_imports(['-c', 'pass']) for _ in range(repeticoes))
+    base_processo = medir(lambda: subprocess.run([sys.executable, '-c', 'pass'], check=True), repeticoes)
+
+    resultados = {}
+    for comando in MODULOS:
+        argv = [script, '--imports-only', comando]
+        resultados[comando] = {
+            'imports_ms': min(_tempo_imports(argv) for _ in range(repeticoes)) - base_imports,
+            'processo_ms': medir(lambda: subprocess.run([sys.executable] + argv, check=True), repeticoes) - base_processo,
+        }
+    return resultados
+
+
+def imprimir_tabela(titulo: str, resultados: Dict[str, Dict[str, float]]):
+    colunas = list(next(iter(resultados.values())).keys())
+    print(f"\n📊 {titulo}")
+    print(f"  {'':<10}" + ''.join(f"{c:>16}" for c in colunas))
+    for nome, valores in resultados.items():
+        print(f"  {nome:<10}" + ''.join(f"{valores[c]:>16.2f}" for c in colunas))
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmarks dos scripts ODS')
+    parser.add_argument('comando', choices=['xml', 'zip', 'formatos', 'daemon', 'startup', 'blocos', 'api', 'concorrentes', 'suite', 'comparar'],
+                        help='Benchmark a executar')
+    parser.add_argument('--file', '-f', default=ARQUIVO_PADRAO, help='Arquivo ODS de modelo')
+    parser.add_argument('--linhas', type=int, help='Linhas geradas (padrão: 500 em xml, 50000 em zip e formatos)')
+    parser.add_argument('--repeticoes', type=int, default=3, help='Repetições por medida (vale a menor)')
+    parser.add_argument('--threads', type=int, help='Threads de compressão em zip (padrão: núcleos)')
+    parser.add_argument('--tamanhos', help='Servidores por execução, separados por vírgula '
+                                           '(padrão: 100,1000,10000 na suite, 10000,50000 em blocos)')
+    parser.add_argument('--integradores', help='Integradores da suite, separados por vírgula (padrão: todos)')
+    parser.add_argument('--baseline', nargs='?', const='', help='Comparar com a baseline (padrão: a salva com --salvar-baseline)')
+    parser.add_argument('--salvar-baseline', action='store_true', help='Gravar o resultado da suite como nova baseline')
+    parser.add_argument('--limite', type=float, help='Piora em %% considerada regressão (padrão: 10)')
+    parser.add_argument('--atual', help='Resultado já gravado a comparar (comparar)')
+    parser.add_argument('--servidores', type=int, default=200, help='Servidores no conjunto sintético (api)')
+    parser.add_argument('--clientes', help=f"Clientes HTTP em api, separados por vírgula (padrão: {','.join(CLIENTES_API)})")
+    parser.add_argument('--semente', type=int, default=42, help='Semente das falhas da API local (api)')
+    parser.add_argument('--exportacoes', type=int, default=4, help='Exportações simultâneas (concorrentes)')
+    parser.add_argument('--limite-api', type=float, help='Requisições por segundo por rota (concorrentes)')
+    parser.add_argument('--rajada-api', type=float, help='Rajada do limite (concorrentes)')
+    adicionar_opcoes_falhas(parser)
+
+    args = parser.parse_args(argv)
+
+    if args.comando == 'comparar':
+        return _comparar(args)
+
+    if not os.path.exists(args.file):
+        print(f"❌ Arquivo não encontrado: {args.file}")
+        return 1
+
+    if args.comando == 'xml':
+        linhas = args.linhas or 500
+        resultados = bench_xml_backends(args.file, linhas, args.repeticoes)
+        imprimir_tabela(f"Backends de XML ({linhas} linhas inseridas, ms)", resultados)
+        if 'lxml' not in resultados:
+            print("  ℹ️ lxml não instalado: só o backend da biblioteca padrão foi medido")
+    elif args.comando == 'zip':
+        linhas = args.linhas or 50000
+        resultados = bench_compressao(args.file, linhas, args.repeticoes, args.threads)
+        imprimir_tabela(f"Compressão do content.xml ({linhas} linhas inseridas)", resultados)
+    elif args.comando == 'formatos':
+        linhas = args.linhas or 50000
+        resultados = bench_formatos(args.file, linhas, args.repeticoes)
+        imprimir_tabela(f"Escrita por formato ({linhas} servidores)", resultados)
+    elif args.comando == 'daemon':
+        resultados = bench_daemon(args.file, pedidos=max(args.repeticoes, 50), frios=args.repeticoes)
+        imprimir_tabela("Exportação a frio x serviço residente", resultados)
+    elif args.comando == 'startup':
+        resultados = bench_startup(args.repeticoes)
+        imprimir_tabela("Partida dos subcomandos do ods_cli.py (ms, além do interpretador vazio)", resultados)
+    elif args.comando == 'blocos':
+        tamanhos = [int(t) for t in args.tamanhos.split(',')] if args.tamanhos else (10000, 50000)
+        resultados = bench_blocos(args.file, tamanhos, args.repeticoes)
+        imprimir_tabela("Leitura dos blocos da diretoria (por servidores na planilha)", resultados)
+    elif args.comando == 'api':
+        resultados = bench_api(args.servidores, args.repeticoes, opcoes_falhas(args),
+                               args.clientes.split(',') if args.clientes else None)
+        imprimir_tabela(f"Busca da diretoria pela API local ({args.servidores} servidores)", resultados)
+    elif args.comando == 'concorrentes':
+        resultados = bench_concorrentes(args.servidores, args.exportacoes, args.limite_api, args.rajada_api,
+                                        opcoes_falhas(args), args.repeticoes)
+        imprimir_tabela(f"{args.exportacoes} exportações simultâneas pela API local "
+                        f"({args.servidores} servidores)", resultados)
+    elif args.comando == 'suite':
+        return _suite(args)
+    return 0
+
+
+def _suite(args) -> int:
+    import ods_benchmark_suite as suite
+
+    tamanhos = [int(t) for t in args.tamanhos.split(',')] if args.tamanhos else suite.TAMANHOS_PADRAO
+    integradores = args.integradores.split(',') if args.integradores else None
+    resultados = suite.executar_suite(args.file, tamanhos, args.repeticoes, integradores)
+
+    regressoes = 0
+    if args.baseline is not None:
+        caminho = args.baseline or suite.BASELINE_PADRAO
+        if not os.path.exists(caminho):
+            print(f"❌ Baseline não encontrada: {caminho}")
+            return 1
+        regressoes = suite.comparar(resultados, suite.carregar(caminho), args.limite or suite.LIMITE_REGRESSAO)
+        suite.imprimir_comparacao(resultados)
+
+    print(f"\n💾 Resultados salvos em: {suite.salvar(resultados)}")
+    if args.salvar_baseline:
+        print(f"📌 Baseline atualizada: {suite.salvar(resultados, suite.BASELINE_PADRAO)}")
+    return 1 if regressoes or resultados['summary']['failedTests'] else 0
+
+
+def _comparar(args) -> int:
+    import ods_benchmark_suite as suite
+
+    if not args.atual:
+        print("❌ Informe o resultado a comparar com --atual")
+        return 1
+    caminho = args.baseline or suite.BASELINE_PADRAO
+    for arquivo in (args.atual, caminho):
+        if not os.path.exists(arquivo):
+            print(f"❌ Arquivo não encontrado: {arquivo}")
+            return 1
+    resultados = suite.carregar(args.atual)
+    regressoes = suite.comparar(resultados, suite.carregar(caminho), args.limite or suite.LIMITE_REGRESSAO)
+    suite.imprimir_comparacao(resultados)
+    return 1 if regressoes else 0
+
+
+if __name__ == "__main__":
+    exit(main())
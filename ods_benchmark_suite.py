@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Suíte de benchmarks do pipeline de exportação
+Roda o pipeline completo de cada integrador (DiretoriaODSIntegrator,
+DiretoriaAPIIntegrator, SupabaseODSIntegrator e ods_api_final_integration)
+em vários tamanhos de dados, sobre cópias do modelo, e mede cada etapa pela
+instrumentação (ods_instrumentation).
+
+Os resultados vão para benchmark-results/performance-benchmark-<ms>.json, no
+mesmo formato dos benchmarks dos hooks de realtime (timestamp, configType,
+results, summary), com configType "ods-pipeline". Comparados a uma baseline,
+cada resultado ganha o bloco "improvement" e as regressões acima do limite
+marcam o teste como reprovado.
+
+Uso (pelo ods_benchmark.py):
+    python ods_benchmark.py suite [--tamanhos 100,1000,10000] [--baseline [ARQUIVO]] [--salvar-baseline]
+    python ods_benchmark.py comparar --atual ARQUIVO [--baseline ARQUIVO] [--limite 10]
+"""
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import ods_instrumentation
+from ods_api_client import ErroAPI
+from ods_workload import GeradorCarga
+
+DIRETORIO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark-results')
+BASELINE_PADRAO = os.path.join(DIRETORIO_RESULTADOS, 'ods-pipeline-baseline.json')
+CONFIG = 'ods-pipeline'
+TAMANHOS_PADRAO = (100, 1000, 10000)
+# Piora percentual a partir da qual o tempo total ou o pico de memória é regressão
+LIMITE_REGRESSAO = 10.0
+# Etapas mais curtas que isso (na baseline) são ruído demais para comparar
+MINIMO_ETAPA_MS = 1.0
+
+SEMENTE = 42
+
+
+# ---------------------------------------------------------------------------
+# Entradas: a mesma carga sintética (ods_workload) no formato de cada integrador
+# ---------------------------------------------------------------------------
+
+def entrada_diretoria(gerador: GeradorCarga) -> Dict[str, Any]:
+    """Dados já processados ({"periodos": [...]}) para o DiretoriaODSIntegrator"""
+    from ods_diretoria_api_integration import DiretoriaAPIIntegrator
+
+    integrador = DiretoriaAPIIntegrator('', 'http://memoria', api_client=ClienteMemoria(gerador))
+    with redirect_stdout(io.StringIO()):
+        return integrador.processar_dados_diretoria(1)
+
+
+class ClienteMemoria:
+    """
+    Respostas da API servidas de memória pelo gerador, no lugar do ClienteAPI
+
+    Mede só o pipeline: sem rede, cada get_json conta como uma requisição na
+    etapa 'http'.
+    """
+
+    def __init__(self, gerador: GeradorCarga):
+        self.gerador = gerador
+        self.requisicoes = 0
+
+    def get_json(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        with ods_instrumentation.etapa('http') as e:
+            self.requisicoes += 1
+            e.contar(requisicoes=1)
+            status, dados = self.gerador.responder(endpoint, {k: str(v) for k, v in (params or {}).items()})
+            if status >= 400:
+                raise ErroAPI(status, endpoint)
+            # Cópias: o integrador acrescenta campos em cada participação
+            return {**dados, 'data': [dict(item) for item in dados['data']]}
+
+
+# ---------------------------------------------------------------------------
+# Pipelines completos, como no main() de cada script
+# ---------------------------------------------------------------------------
+
+def _pipeline_diretoria(arquivo: str, dados: Dict[str, Any]):
+    from ods_diretoria_integration import DiretoriaODSIntegrator
+
+    integrador = DiretoriaODSIntegrator(arquivo)
+    integrador.get_diretoria_data_mock = lambda: dados
+    if not integrador.integrate_diretoria_data() or not integrador.verify_integration():
+        raise RuntimeError("integração ou verificação falhou")
+
+
+def _pipeline_api(arquivo: str, gerador: GeradorCarga):
+    from ods_diretoria_api_integration import DiretoriaAPIIntegrator
+
+    integrador = DiretoriaAPIIntegrator(arquivo, 'http://memoria', api_client=ClienteMemoria(gerador))
+    if not integrador.integrate_with_api():
+        raise RuntimeError("integração falhou")
+
+
+def _pipeline_supabase(arquivo: str, dados: List[Dict[str, Any]]):
+    from ods_supabase_integration import SupabaseODSIntegrator
+
+    integrador = SupabaseODSIntegrator(arquivo)
+    integrador.get_mock_supabase_data = lambda: dados
+    if not integrador.integrate_supabase_data():
+        raise RuntimeError("integração falhou")
+
+
+def _pipeline_api_final(arquivo: str, dados_api: Dict[str, Any]):
+    import ods_api_final_integration as final
+
+    final.criar_backup(arquivo)
+    periodos = final.processar_dados_diretoria(dados_api)
+    linhas = final.formatar_para_ods(periodos)
+    _, linha_inicio = final.inserir_dados_ods(arquivo, linhas)
+    if not final.verificar_integracao(arquivo, linhas, linha_inicio):
+        raise RuntimeError("verificação falhou")
+
+
+# integrador: (entrada a partir do gerador, fora da medida; pipeline(arquivo, entrada))
+PIPELINES: Dict[str, Tuple[Callable[[GeradorCarga], Any], Callable[[str, Any], None]]] = {
+    'DiretoriaODSIntegrator': (entrada_diretoria, _pipeline_diretoria),
+    'DiretoriaAPIIntegrator': (lambda gerador: gerador, _pipeline_api),
+    'SupabaseODSIntegrator': (lambda gerador: list(gerador.linhas_supabase(1)), _pipeline_supabase),
+    'ods_api_final_integration': (lambda gerador: gerador.dados_api_final(1), _pipeline_api_final),
+}
+
+
+# ---------------------------------------------------------------------------
+# Execução
+# ---------------------------------------------------------------------------
+
+def _rodar(pipeline, modelo: str, entrada: Any, memoria: bool = False) -> Tuple[float, int]:
+    """Uma execução sobre uma cópia nova do modelo: (ms, pico de memória em bytes)"""
+    import tracemalloc
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        arquivo = os.path.join(diretorio, os.path.basename(modelo))
+        shutil.copyfile(modelo, arquivo)
+        with redirect_stdout(io.StringIO()):
+            if memoria:
+                tracemalloc.start()
+            try:
+                inicio = time.perf_counter()
+                pipeline(arquivo, entrada)
+                ms = (time.perf_counter() - inicio) * 1000
+                pico = tracemalloc.get_traced_memory()[1] if memoria else 0
+            finally:
+                if memoria:
+                    tracemalloc.stop()
+    return ms, pico
+
+
+def medir_pipeline(implementacao: str, servidores: int, modelo: str, repeticoes: int = 3) -> Dict[str, Any]:
+    """
+    Mede o pipeline de um integrador com 'servidores' servidores sintéticos
+
+    A carga vem do ods_workload com semente fixa, então o mesmo tamanho gera
+    sempre os mesmos dados e os resultados são comparáveis entre execuções. Vale a execução mais rápida entre as repetições (e as etapas dela); o pico
+    de memória vem de uma execução extra com tracemalloc, que deixaria os
+    tempos mais lentos.
+    """
+    resultado = {
+        'testName': f"{implementacao} {servidores} servidores",
+        'implementation': implementacao,
+        'size': servidores,
+        'totalExecutionTime': None,
+        'memoryPeakUsage': None,
+        'eventProcessingRate': None,
+        'rows': None,
+        'stages': {},
+        'errors': [],
+        'warnings': [],
+        'passed': True,
+    }
+    preparar, pipeline = PIPELINES[implementacao]
+    try:
+        entrada = preparar(GeradorCarga(SEMENTE, servidores))
+        melhor = None
+        for _ in range(repeticoes):
+            ods_instrumentation.limpar()
+            ms, _ = _rodar(pipeline, modelo, entrada)
+            if melhor is None or ms < melhor[0]:
+                melhor = (ms, ods_instrumentation.resumo())
+        ms, etapas = melhor
+        _, pico = _rodar(pipeline, modelo, entrada, memoria=True)
+    except Exception as e:
+        resultado['errors'].append(f"{type(e).__name__}: {e}")
+        resultado['passed'] = False
+        return resultado
+
+    linhas = next((e['contagens'].get('linhas') for e in etapas if e['etapa'] == 'formatar'), None)
+    resultado.update({
+        'totalExecutionTime': round(ms, 3),
+        'memoryPeakUsage': pico,
+        'eventProcessingRate': round(linhas / (ms / 1000), 1) if linhas else None,
+        'rows': linhas,
+        'stages': {e['etapa']: round(e['proprio_ms'], 3) for e in etapas},
+    })
+    requisicoes = sum(e['contagens'].get('requisicoes', 0) for e in etapas)
+    if requisicoes:
+        resultado['requests'] = requisicoes
+    return resultado
+
+
+def executar_suite(modelo: str, tamanhos=TAMANHOS_PADRAO, repeticoes: int = 3,
+                   implementacoes: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Todos os integradores em todos os tamanhos, no formato de benchmark-results"""
+    ja_ativa = ods_instrumentation.ativo()
+    if not ja_ativa:
+        ods_instrumentation.ativar(None, memoria=False, resumo_ao_sair=False)
+    inicio = time.perf_counter()
+    try:
+        resultados = []
+        for implementacao in implementacoes or list(PIPELINES):
+            for servidores in tamanhos:
+                resultado = medir_pipeline(implementacao, servidores, modelo, repeticoes)
+                imprimir_resultado(resultado)
+                resultados.append(resultado)
+    finally:
+        if not ja_ativa:
+            ods_instrumentation.desativar()
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+        'configType': CONFIG,
+        'results': resultados,
+        'summary': _resumo(resultados, (time.perf_counter() - inicio) * 1000),
+    }
+
+
+def _resumo(resultados: List[Dict[str, Any]], execucao_ms: float) -> Dict[str, Any]:
+    aprovados = [r for r in resultados if r['passed']]
+    return {
+        'totalTests': len(resultados),
+        'passedTests': len(aprovados),
+        'failedTests': len(resultados) - len(aprovados),
+        'executionTime': round(execucao_ms),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Comparação com a baseline
+# ---------------------------------------------------------------------------
+
+def _variacao(base: Optional[float], atual: Optional[float]) -> Optional[float]:
+    """Redução percentual de 'base' para 'atual' (negativa = piorou)"""
+    if not base or atual is None:
+        return None
+    return round((base - atual) / base * 100, 1)
+
+
+def comparar(atual: Dict[str, Any], baseline: Dict[str, Any], limite: float = LIMITE_REGRESSAO) -> int:
+    """
+    Compara 'atual' com 'baseline' pelo testName, no próprio 'atual'
+
+    Cada resultado com par na baseline ganha 'improvement'; piora do tempo total
+    ou do pico de memória acima de 'limite' % reprova o teste, e piora das
+    etapas vira aviso.
+
+    Returns:
+        int: Quantidade de testes com regressão
+    """
+    base_por_nome = {r['testName']: r for r in baseline.get('results', [])}
+    regressoes = 0
+    ganhos, reducoes = [], []
+    for resultado in atual['results']:
+        # Um resultado já comparado antes perde o veredito da comparação anterior
+        resultado.pop('improvement', None)
+        resultado['warnings'] = [a for a in resultado['warnings'] if not a.startswith(('Regressão', 'Etapa '))]
+        resultado['passed'] = not resultado['errors']
+        base = base_por_nome.get(resultado['testName'])
+        if base is None or not resultado['passed'] or base.get('totalExecutionTime') is None:
+            continue
+        ganho = _variacao(base['totalExecutionTime'], resultado['totalExecutionTime'])
+        reducao = _variacao(base.get('memoryPeakUsage'), resultado['memoryPeakUsage'])
+        resultado['improvement'] = {'performanceGain': ganho, 'memoryReduction': reducao}
+        ganhos.append(ganho)
+        if reducao is not None:
+            reducoes.append(reducao)
+
+        regrediu = False
+        if ganho < -limite:
+            resultado['warnings'].append(f"Regressão de {-ganho:.1f}% no tempo total")
+            regrediu = True
+        if reducao is not None and reducao < -limite:
+            resultado['warnings'].append(f"Regressão de {-reducao:.1f}% no pico de memória")
+            regrediu = True
+        for nome, ms in resultado['stages'].items():
+            base_ms = base.get('stages', {}).get(nome)
+            if base_ms is None or base_ms < MINIMO_ETAPA_MS:
+                continue
+            variacao = _variacao(base_ms, ms)
+            if variacao < -limite:
+                resultado['warnings'].append(f"Etapa '{nome}' {-variacao:.1f}% mais lenta")
+        if regrediu:
+            resultado['passed'] = False
+            regressoes += 1
+
+    resumo = atual['summary']
+    resumo['passedTests'] = sum(1 for r in atual['results'] if r['passed'])
+    resumo['failedTests'] = len(atual['results']) - resumo['passedTests']
+    resumo['baseline'] = baseline.get('timestamp')
+    resumo['regressions'] = regressoes
+    resumo['averageImprovements'] = {
+        'performanceGain': round(sum(ganhos) / len(ganhos), 1) if ganhos else None,
+        'memoryReduction': round(sum(reducoes) / len(reducoes), 1) if reducoes else None,
+    }
+    return regressoes
+
+
+def salvar(resultados: Dict[str, Any], caminho: Optional[str] = None) -> str:
+    """Grava em benchmark-results/performance-benchmark-<ms>.json (ou em 'caminho')"""
+    if caminho is None:
+        caminho = os.path.join(DIRETORIO_RESULTADOS, f"performance-benchmark-{int(time.time() * 1000)}.json")
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, ensure_ascii=False, indent=2)
+    return caminho
+
+
+def carregar(caminho: str) -> Dict[str, Any]:
+    with open(caminho, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def imprimir_resultado(resultado: Dict[str, Any]):
+    if not resultado['passed'] and resultado['errors']:
+        print(f"❌ {resultado['testName']}: {'; '.join(resultado['errors'])}")
+        return
+    etapas = ' '.join(f"{nome}={ms:.1f}" for nome, ms in resultado['stages'].items())
+    print(f"⏱️  {resultado['testName']}: {resultado['totalExecutionTime']:.1f} ms, "
+          f"{resultado['memoryPeakUsage'] / 1024 / 1024:.1f} MB  [{etapas}]")
+
+
+def imprimir_comparacao(resultados: Dict[str, Any]):
+    print("\n📊 Comparação com a baseline")
+    for resultado in resultados['results']:
+        melhoria = resultado.get('improvement')
+        if melhoria is None:
+            continue
+        icone = '✅' if resultado['passed'] else '🔻'
+        memoria = '' if melhoria['memoryReduction'] is None else f", memória {melhoria['memoryReduction']:+.1f}%"
+        print(f"  {icone} {resultado['testName']}: tempo {melhoria['performanceGain']:+.1f}%{memoria}")
+        for aviso in resultado['warnings']:
+            print(f"     ⚠️ {aviso}")
+    resumo = resultados['summary']
+    print(f"\n🎯 {resumo['regressions']} regressões, {resumo['passedTests']}/{resumo['totalTests']} testes aprovados")
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ponto de entrada único dos scripts ODS
+Cada subcomando importa só os módulos de que precisa, na hora de rodar:
+ler uma célula não carrega o integrador da API, e exportar dados mock não
+carrega o cliente HTTP.
+
+Uso:
+    python ods_cli.py export [--source mock|api] [--janela N] [--out ARQUIVO|-] [--formato ods|xlsx|csv|fods] [--cache DIR]
+    python ods_cli.py export --retomavel [--janela N]   (continua uma exportação interrompida)
+    python ods_cli.py read --row N [--column N]
+    python ods_cli.py edit ...      (opções de ods_modifier_tool.py)
+    python ods_cli.py verify [--fast] [--id EXPORT_ID]
+    python ods_cli.py blocos ...    (opções de ods_diretoria_blocos.py)
+    python ods_cli.py reconcile ... (opções de ods_reconciliacao.py)
+    python ods_cli.py bench ...     (opções de ods_benchmark.py)
+
+Antes do subcomando, --instrumentar [ARQUIVO] mede cada etapa (linhas JSON em
+stderr ou no arquivo, resumo no fim) e --sem-tracemalloc tira a medição de
+memória, que deixa a execução mais lenta.
+
+O modelo padrão é a variável ODS_MODELO ou "Pedido Diária Padrao (3).ods" no
+diretório atual.
+"""
+
+import argparse
+import importlib
+import os
+import sys
+
+ARQUIVO_PADRAO = os.environ.get('ODS_MODELO', "Pedido Diária Padrao (3).ods")
+
+# Subcomandos que repassam as opções para o main() de outro script
+DELEGADOS = {
+    'edit': ('ods_modifier_tool', [], 'Editar células, desfazer e refazer (opções de ods_modifier_tool.py)'),
+    'verify': ('ods_export_manifest', ['verify'], 'Verificar a exportação pelo manifesto'),
+    'blocos': ('ods_diretoria_blocos', [], 'Índice e atualização por (período, matrícula) (opções de ods_diretoria_blocos.py)'),
+    'reconcile': ('ods_reconciliacao', [], 'Aplicar só as diferenças dos períodos novos (opções de ods_reconciliacao.py)'),
+    'bench': ('ods_benchmark', [], 'Benchmarks (opções de ods_benchmark.py)'),
+}
+
+# Módulos de cada subcomando; --imports-only carrega só eles (para medir a partida)
+MODULOS = {
+    'export': ['ods_diretoria_integration', 'ods_stream_writer'],
+    'read': ['ods_stream_reader'],
+    'edit': ['ods_modifier_tool'],
+    'verify': ['ods_export_manifest'],
+    'blocos': ['ods_diretoria_blocos'],
+    'reconcile': ['ods_reconciliacao'],
+    'bench': ['ods_benchmark'],
+}
+
+
+def _dados(args):
+    if args.source == 'mock':
+        from ods_diretoria_integration import DiretoriaODSIntegrator
+        integrador = DiretoriaODSIntegrator(args.file)
+        return integrador, integrador.get_diretoria_data_mock()
+
+    from ods_diretoria_api_integration import DiretoriaAPIIntegrator
+    cache_periodos = None
+    if args.cache:
+        from ods_period_cache import CachePeriodos
+        cache_periodos = CachePeriodos(args.cache)
+    integrador = DiretoriaAPIIntegrator(args.file, args.api, cache_periodos=cache_periodos)
+    janela_id = args.janela
+    if janela_id is None:
+        janelas = integrador.get_janelas_operacionais()
+        if not janelas:
+            raise ValueError("Nenhuma janela operacional ativa encontrada")
+        janela_id = janelas[0]['id']
+    return integrador, integrador.processar_dados_diretoria(janela_id)
+
+
+def _exportar_na_planilha(args) -> int:
+    # Mesmo fluxo dos scripts: backup, inserção no próprio arquivo e manifesto
+    if args.source == 'mock':
+        from ods_diretoria_integration import DiretoriaODSIntegrator
+        ok = DiretoriaODSIntegrator(args.file).integrate_diretoria_data()
+    else:
+        from ods_diretoria_api_integration import DiretoriaAPIIntegrator
+        ok = DiretoriaAPIIntegrator(args.file, args.api).integrate_with_api(args.janela, retomavel=args.retomavel)
+    return 0 if ok else 1
+
+
+def _exportar_para(args, saida) -> int:
+    if args.folhas:
+        from ods_multi_sheet import exportar_folhas, folhas_por_periodo
+        if args.folhas == 'janela':
+            if args.source == 'mock':
+                raise ValueError("Folhas por janela precisam da API (--source api)")
+            from ods_diretoria_api_integration import DiretoriaAPIIntegrator
+            integrador = DiretoriaAPIIntegrator(args.file, args.api)
+            resultado = integrador.export_multi_sheet(saida, by='janela', template_rows=args.template_rows)
+        else:
+            _, dados = _dados(args)
+            resultado = exportar_folhas(args.file, saida, folhas_por_periodo(dados), args.template_rows)
+        print(f"📑 {len(resultado['folhas'])} folhas exportadas", file=sys.stderr)
+        return 0
+
+    integrador, dados = _dados(args)
+    if args.cache:
+        import io
+        from ods_report_cache import CacheRelatorios, chave_relatorio, hash_arquivo
+
+        def gerar():
+            buffer = io.BytesIO()
+            _escrever_linhas(args, integrador, dados, buffer)
+            return buffer.getvalue()
+
+        cache = CacheRelatorios(args.cache)
+        chave = chave_relatorio(dados, hash_arquivo(args.file), args.formato)
+        saida.write(cache.obter_ou_gerar(chave, gerar))
+        acerto = "acerto" if cache.faltas == 0 else "gerado e guardado"
+        print(f"💾 Cache: {acerto} ({chave[:12]})", file=sys.stderr)
+        return 0
+
+    _escrever_linhas(args, integrador, dados, saida)
+    return 0
+
+
+def _escrever_linhas(args, integrador, dados, saida):
+    linhas = integrador.format_diretoria_data_for_ods(dados)
+    if args.formato == 'ods':
+        integrador.stream_modified_ods(integrador.insert_data_into_ods(linhas), saida)
+    else:
+        from ods_row_writers import ESCRITORES
+        ESCRITORES[args.formato](linhas, saida)
+    print(f"📊 {len(linhas)} linhas exportadas ({args.formato})", file=sys.stderr)
+
+
+def cmd_export(args) -> int:
+    if not os.path.exists(args.file):
+        print(f"❌ Arquivo não encontrado: {args.file}", file=sys.stderr)
+        return 1
+    if args.out is None:
+        return _exportar_na_planilha(args)
+    if args.retomavel:
+        print("❌ --retomavel só vale para a exportação na própria planilha (sem --out)", file=sys.stderr)
+        return 1
+
+    if args.formato is None:
+        extensao = os.path.splitext(args.out)[1].lstrip('.').lower()
+        args.formato = extensao if extensao in ('ods', 'xlsx', 'csv', 'fods') else 'ods'
+    if args.folhas and args.formato != 'ods':
+        print("❌ Exportação em várias folhas só existe em ODS", file=sys.stderr)
+        return 1
+
+    from contextlib import redirect_stdout
+    # As mensagens dos integradores vão para stderr: stdout pode ser o próprio arquivo
+    stdout = sys.stdout.buffer
+    with redirect_stdout(sys.stderr):
+        try:
+            if args.out == '-':
+                codigo = _exportar_para(args, stdout)
+                stdout.flush()
+                return codigo
+            from ods_safe_writer import escrita_atomica
+            with escrita_atomica(args.out) as f:
+                return _exportar_para(args, f)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+
+
+def cmd_read(args) -> int:
+    if not os.path.exists(args.file):
+        print(f"❌ Arquivo não encontrado: {args.file}")
+        return 1
+    from ods_stream_reader import ler_celula
+    conteudo = ler_celula(args.file, args.row, args.column)
+    if conteudo:
+        print(f"📖 Conteúdo da célula ({args.row}, {args.column}): '{conteudo}'")
+    else:
+        print(f"📖 Célula ({args.row}, {args.column}) está vazia ou não existe")
+    return 0
+
+
+def _com_arquivo_padrao(argv):
+    # Os scripts delegados exigem --file; aqui ele é opcional
+    if not any(a in ('--file', '-f') or a.startswith('--file=') for a in argv):
+        return ['--file', ARQUIVO_PADRAO] + argv
+    return argv
+
+
+def criar_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Scripts ODS da diretoria em um só comando')
+    sub = parser.add_subparsers(dest='comando', metavar='comando')
+
+    export = sub.add_parser('export', help='Exportar os dados da diretoria')
+    export.add_argument('--file', '-f', default=ARQUIVO_PADRAO, help='Arquivo ODS de modelo')
+    export.add_argument('--source', choices=['api', 'mock'], default='api', help='Origem dos dados (padrão: api)')
+    export.add_argument('--api', default='http://localhost:3000', help='URL base da API')
+    export.add_argument('--janela', type=int, help='Janela exportada (padrão: a primeira ativa)')
+    export.add_argument('--out', '-o', help="Arquivo de saída ou '-' para stdout (padrão: inserir no próprio modelo)")
+    export.add_argument('--formato', choices=['ods', 'xlsx', 'csv', 'fods'], help='Formato da saída (padrão: pela extensão)')
+    export.add_argument('--folhas', choices=['periodo', 'janela'], help='Uma folha por período ou por janela')
+    export.add_argument('--template-rows', type=int, help='Linhas do modelo (como no LibreOffice) no topo de cada folha')
+    export.add_argument('--cache', metavar='DIR', help='Reaproveitar relatórios e períodos já calculados guardados em DIR')
+    export.add_argument('--retomavel', action='store_true',
+                        help='Guardar o progresso em <arquivo>.export.jsonl e continuar uma exportação interrompida '
+                             '(só na própria planilha, sem --out)')
+    export.set_defaults(funcao=cmd_export)
+
+    read = sub.add_parser('read', help='Ler uma célula em streaming')
+    read.add_argument('--file', '-f', default=ARQUIVO_PADRAO, help='Arquivo ODS')
+    read.add_argument('--row', '-r', type=int, required=True, help='Linha (1-indexed)')
+    read.add_argument('--column', '-c', type=int, default=1, help='Coluna (1-indexed, padrão: 1)')
+    read.set_defaults(funcao=cmd_read)
+
+    for nome, (_, _, ajuda) in DELEGADOS.items():
+        sub.add_parser(nome, help=ajuda, add_help=False)
+
+    return parser
+
+
+def _opcoes_globais(argv):
+    # Ficam antes do subcomando, para valer também nos delegados
+    instrumentar, memoria = None, True
+    while argv and argv[0] in ('--instrumentar', '--sem-tracemalloc'):
+        opcao = argv.pop(0)
+        if opcao == '--sem-tracemalloc':
+            memoria = False
+        elif argv and not argv[0].startswith('-') and argv[0] not in MODULOS:
+            instrumentar = argv.pop(0)
+        else:
+            instrumentar = '-'
+    if instrumentar:
+        from ods_instrumentation import ativar
+        ativar(instrumentar, memoria=memoria)
+    return argv
+
+
+def main(argv=None) -> int:
+    argv = _opcoes_globais(sys.argv[1:] if argv is None else list(argv))
+
+    if argv[:1] == ['--imports-only']:
+        for modulo in MODULOS[argv[1]]:
+            importlib.import_module(modulo)
+        return 0
+
+    if argv and argv[0] in DELEGADOS:
+        modulo, prefixo, _ = DELEGADOS[argv[0]]
+        resto = argv[1:]
+        if argv[0] != 'bench' and '-h' not in resto and '--help' not in resto:
+            resto = _com_arquivo_padrao(resto)
+        return importlib.import_module(modulo).main(prefixo + resto) or 0
+
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+    if args.comando is None:
+        parser.print_help()
+        return 1
+    return args.funcao(args)
+
+
+if __name__ == "__main__":
+    exit(main())
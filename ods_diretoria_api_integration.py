@@ -6,21 +6,38 @@ Este script conecta com a API real da aplicação para obter dados dinâmicos
 """
 
 import zipfile
-import xml.etree.ElementTree as ET
 import os
-import shutil
 from datetime import datetime, timedelta
 import json
-from typing import List, Dict, Any, Optional
+from ods_backup_store import ODSBackupStore
+from ods_export_checkpoint import CheckpointExportacao, caminho_checkpoint
+from ods_export_manifest import carregar_manifesto, gerar_manifesto, hashes_por_bloco, verificar, verificar_completo
+from ods_instrumentation import contar, etapa, medido
+from ods_multi_sheet import exportar_folhas, folhas_por_periodo
+from ods_period_cache import periodos_da_janela
+from ods_safe_writer import escrita_atomica, lock_arquivo, obter_fila, substituir_content_xml
+from ods_stream_reader import contar_linhas
+from ods_stream_writer import transmitir_ods
+from typing import Callable, List, Dict, Any, Optional
 import urllib.request
 import urllib.parse
 import urllib.error
+from ods_xml_backend import obter_backend
+
+XML = obter_backend()
 
 class DiretoriaAPIIntegrator:
-    def __init__(self, ods_file_path: str, api_base_url: str = "http://localhost:3000"):
+    def __init__(self, ods_file_path: str, api_base_url: str = "http://localhost:3000", api_client=None,
+                 cache_periodos=None):
         self.ods_file_path = ods_file_path
         self.api_base_url = api_base_url
-        self.backup_path = f"{ods_file_path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.backup_path = None
+        # ClienteAPI com conexões persistentes; sem ele cada requisição usa o urllib
+        self.api_client = api_client
+        # CachePeriodos: só recalcula os servidores cujas datas mudaram
+        self.cache_periodos = cache_periodos
+        # CheckpointExportacao: operações e participações já buscadas nesta janela
+        self.checkpoint = None
         
         # Headers para autenticação (ajuste conforme necessário)
         self.headers = {
@@ -29,21 +46,27 @@ class DiretoriaAPIIntegrator:
         }
         
     def create_backup(self):
-        """Criar backup do arquivo original"""
-        shutil.copy2(self.ods_file_path, self.backup_path)
+        """Criar backup do arquivo original no repositório deduplicado"""
+        manifesto = ODSBackupStore(self.ods_file_path).snapshot(rotulo=self.__class__.__name__)
+        self.backup_path = manifesto['path']
         print(f"✅ Backup criado: {self.backup_path}")
         
     def make_api_request(self, endpoint: str, params: Optional[Dict] = None) -> Optional[Dict]:
         """Fazer requisição para a API"""
         try:
+            if self.api_client is not None:
+                return self.api_client.get_json(endpoint, params)
+                
             url = f"{self.api_base_url}{endpoint}"
             if params:
                 url += '?' + urllib.parse.urlencode(params)
                 
             req = urllib.request.Request(url, headers=self.headers)
             
-            with urllib.request.urlopen(req, timeout=30) as response:
-                data = json.loads(response.read().decode('utf-8'))
+            with etapa('http') as e, urllib.request.urlopen(req, timeout=30) as response:
+                corpo = response.read()
+                e.contar(requisicoes=1, bytes=len(corpo))
+                data = json.loads(corpo.decode('utf-8'))
                 return data
                 
         except urllib.error.URLError as e:
@@ -91,6 +114,10 @@ class DiretoriaAPIIntegrator:
             
     def get_participacoes_operacao(self, operacao_id: int) -> List[Dict]:
         """Obter participações de uma operação específica"""
+        return self._buscar_participacoes(operacao_id) or []
+        
+    def _buscar_participacoes(self, operacao_id: int) -> Optional[List[Dict]]:
+        # None quando a busca falhou: não vai para o checkpoint como "sem participações"
         params = {'_t': int(datetime.now().timestamp())}
         endpoint = f'/api/agendamento/operacoes/{operacao_id}/participacoes'
         
@@ -98,8 +125,7 @@ class DiretoriaAPIIntegrator:
         
         if data and data.get('success'):
             return data['data']
-        else:
-            return []
+        return None
             
     def calcular_periodos_consecutivos(self, datas: List[str]) -> List[Dict]:
         """Calcular períodos consecutivos baseado nas datas (lógica da TabelaOperacoesDiretoria)"""
@@ -143,19 +169,37 @@ class DiretoriaAPIIntegrator:
         
         return periodos
         
+    @medido('periodos')
     def processar_dados_diretoria(self, janela_id: int) -> Dict[str, Any]:
         """Processar dados da diretoria seguindo a lógica da TabelaOperacoesDiretoria"""
         print(f"🔄 Processando dados da diretoria para janela {janela_id}...")
         
-        # Obter operações planejadas
-        operacoes = self.get_operacoes_planejadas(janela_id)
+        checkpoint = self.checkpoint if self.checkpoint is not None and self.checkpoint.janela == janela_id else None
+        
+        # Obter operações planejadas (as do checkpoint, se a busca foi interrompida)
+        if checkpoint is not None and checkpoint.operacoes is not None:
+            operacoes = checkpoint.operacoes
+            print(f"⏯️ {len(checkpoint.participacoes)} de {len(operacoes)} operações já buscadas")
+        else:
+            operacoes = self.get_operacoes_planejadas(janela_id)
+            if operacoes and checkpoint is not None:
+                checkpoint.registrar_operacoes(operacoes)
         if not operacoes:
             return {"periodos": []}
             
         # Obter todas as participações
         todas_participacoes = []
         for operacao in operacoes:
-            participacoes = self.get_participacoes_operacao(operacao['id'])
+            if checkpoint is None:
+                participacoes = self.get_participacoes_operacao(operacao['id'])
+            elif operacao['id'] in checkpoint.participacoes:
+                participacoes = [dict(p) for p in checkpoint.participacoes[operacao['id']]]
+            else:
+                participacoes = self._buscar_participacoes(operacao['id'])
+                if participacoes is None:
+                    participacoes = []
+                else:
+                    checkpoint.registrar_participacoes(operacao['id'], participacoes)
             for p in participacoes:
                 p['operacao_id'] = operacao['id']
                 p['data_operacao'] = operacao.get('data_operacao') or operacao.get('dataOperacao')
@@ -185,6 +229,7 @@ class DiretoriaAPIIntegrator:
             
         # Calcular PORTARIA MOR para cada servidor
         portarias_mor = []
+        periodos_janela = periodos_da_janela(self.cache_periodos, janela_id)
         
         for servidor_id, dados in servidores_por_id.items():
             # Obter datas das operações
@@ -193,8 +238,8 @@ class DiretoriaAPIIntegrator:
             if not datas_operacao:
                 continue
                 
-            # Calcular períodos consecutivos
-            periodos = self.calcular_periodos_consecutivos(datas_operacao)
+            # Calcular períodos consecutivos (ou reaproveitar do cache)
+            periodos = periodos_janela.periodos(servidor_id, datas_operacao, self.calcular_periodos_consecutivos)
             
             for periodo in periodos:
                 # Calcular data de retorno (+1 dia após a última operação)
@@ -215,6 +260,9 @@ class DiretoriaAPIIntegrator:
                     }
                 })
                 
+        periodos_janela.salvar()
+        periodos_janela.relatar()
+                
         # Agrupar por período
         periodos_agrupados = {}
         for portaria in portarias_mor:
@@ -235,14 +283,16 @@ class DiretoriaAPIIntegrator:
         }
         
         print(f"📊 {len(resultado['periodos'])} períodos processados")
+        contar(participacoes=len(participacoes_confirmadas), periodos=len(resultado['periodos']))
         return resultado
         
     def extract_ods_content(self):
         """Extrair conteúdo XML do arquivo ODS"""
         with zipfile.ZipFile(self.ods_file_path, 'r') as zip_file:
             content_xml = zip_file.read('content.xml')
-            return ET.fromstring(content_xml)
+            return XML.fromstring(content_xml)
             
+    @medido('formatar')
     def format_diretoria_data_for_ods(self, diretoria_data: Dict[str, Any]) -> List[List[str]]:
         """Formatar dados da diretoria para inserção na planilha ODS"""
         formatted_rows = []
@@ -268,12 +318,15 @@ class DiretoriaAPIIntegrator:
             # Linha em branco entre períodos
             formatted_rows.append(["", "", "", "", "", ""])
             
+        contar(linhas=len(formatted_rows))
         return formatted_rows
         
-    def insert_data_into_ods(self, data_rows: List[List[str]], start_row: int = 15):
-        """Inserir dados formatados na planilha ODS"""
+    @medido('xml')
+    def insert_data_into_ods(self, data_rows: List[List[str]], start_row: int = 15, root=None):
+        """Inserir dados formatados na planilha ODS (ou na raiz do content.xml recebida)"""
         # Extrair conteúdo
-        root = self.extract_ods_content()
+        if root is None:
+            root = self.extract_ods_content()
         
         # Encontrar a planilha (sheet)
         namespaces = {
@@ -292,15 +345,15 @@ class DiretoriaAPIIntegrator:
         
         for row_data in data_rows:
             # Criar nova linha
-            new_row = ET.Element(f"{{{namespaces['table']}}}table-row")
+            new_row = XML.Element(f"{{{namespaces['table']}}}table-row")
             
             for cell_data in row_data:
                 # Criar nova célula
-                new_cell = ET.Element(f"{{{namespaces['table']}}}table-cell")
+                new_cell = XML.Element(f"{{{namespaces['table']}}}table-cell")
                 new_cell.set(f"{{{namespaces['table']}}}value-type", "string")
                 
                 # Criar parágrafo com texto
-                paragraph = ET.Element(f"{{{namespaces['text']}}}p")
+                paragraph = XML.Element(f"{{{namespaces['text']}}}p")
                 paragraph.text = str(cell_data)
                 new_cell.append(paragraph)
                 
@@ -310,34 +363,113 @@ class DiretoriaAPIIntegrator:
             sheet.append(new_row)
             current_row += 1
             
+        contar(linhas=len(data_rows))
         return root
         
     def save_modified_ods(self, modified_root):
         """Salvar planilha ODS modificada"""
-        # Criar arquivo temporário
-        temp_content = ET.tostring(modified_root, encoding='utf-8', xml_declaration=True)
-        
-        # Recriar arquivo ODS
-        with zipfile.ZipFile(self.ods_file_path, 'r') as original_zip:
-            with zipfile.ZipFile(f"{self.ods_file_path}.temp", 'w', zipfile.ZIP_DEFLATED) as new_zip:
-                # Copiar todos os arquivos exceto content.xml
-                for item in original_zip.infolist():
-                    if item.filename != 'content.xml':
-                        new_zip.writestr(item, original_zip.read(item.filename))
-                
-                # Adicionar content.xml modificado
-                new_zip.writestr('content.xml', temp_content)
+        with etapa('serializar') as e:
+            temp_content = XML.tostring(modified_root)
+            e.contar(bytes=len(temp_content))
+        
+        # Recriar arquivo ODS com lock e substituição atômica do original
+        substituir_content_xml(self.ods_file_path, temp_content)
+        
+    def insert_and_save(self, data_rows: List[List[str]], start_row: int = 15, export_id: Optional[str] = None,
+                        ao_inserir: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
+        """
+        Inserir as linhas e salvar a planilha em uma única reescrita
+
+        Leitura do content.xml, inserção e substituição do arquivo passam pela
+        fila de escrita da planilha, sob lock do começo ao fim: exportações
+        concorrentes não partem da mesma base nem sobrescrevem umas às outras.
+        O manifesto sai do content.xml gravado, ainda sob o lock, com a linha
+        onde o bloco começou ('linha_inicio') para a verificação conferir ali.
+
+        Args:
+            export_id (str): Identificador gravado no manifesto (padrão: um novo)
+            ao_inserir (callable): Chamada sob o lock com a linha onde o bloco
+                vai começar, antes da gravação (o checkpoint registra 'gravando')
+
+        Returns:
+            dict: Manifesto da exportação (gerar_manifesto)
+        """
+        def inserir(root):
+            # As linhas vão para o fim da tabela: o bloco começa logo depois da última
+            linha_inicio = contar_linhas(root) + 1
+            if ao_inserir is not None:
+                ao_inserir(linha_inicio)
+            self.insert_data_into_ods(data_rows, start_row, root=root)
+            return linha_inicio
+
+        fila = obter_fila(self.ods_file_path)
+        return fila.submeter(
+            inserir,
+            apos_gravar=lambda linha_inicio, content_xml: gerar_manifesto(self.ods_file_path, data_rows,
+                                                                          export_id=export_id,
+                                                                          content_xml=content_xml,
+                                                                          linha_inicio=linha_inicio)
+        ).result()
+        
+    def stream_modified_ods(self, modified_root, output) -> int:
+        """Gravar a planilha modificada direto em um stream (stdout, socket, BytesIO), sem tocar no original"""
+        return transmitir_ods(self.ods_file_path, output, root=modified_root)
+        
+    def export_multi_sheet(self, output, by: str = 'periodo', janela_id: Optional[int] = None,
+                           template_rows: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Exportar cada período (ou cada janela ativa) em uma folha própria, mais a folha "Resumo"
         
-        # Substituir arquivo original
-        os.replace(f"{self.ods_file_path}.temp", self.ods_file_path)
+        Args:
+            output: Caminho do novo arquivo ou stream com write()
+            by (str): 'periodo' (períodos da janela) ou 'janela' (uma folha por janela ativa)
+            janela_id (int): Janela exportada com by='periodo' (padrão: a primeira ativa)
+            template_rows (int): Linhas do modelo mantidas no topo de cada folha (padrão: todas)
+        """
+        if by == 'janela':
+            # Cada janela só é processada quando a folha dela for escrita
+            folhas = (
+                (janela.get('titulo') or f"Janela {janela['id']}",
+                 lambda janela=janela: self.processar_dados_diretoria(janela['id']))
+                for janela in self.get_janelas_operacionais()
+            )
+        else:
+            if janela_id is None:
+                janelas = self.get_janelas_operacionais()
+                if not janelas:
+                    raise ValueError("Nenhuma janela operacional ativa encontrada")
+                janela_id = janelas[0]['id']
+            folhas = folhas_por_periodo(self.processar_dados_diretoria(janela_id))
+            
+        if isinstance(output, str):
+            with escrita_atomica(output) as f:
+                return exportar_folhas(self.ods_file_path, f, folhas, template_rows)
+        return exportar_folhas(self.ods_file_path, output, folhas, template_rows)
         
-    def integrate_with_api(self, janela_id: Optional[int] = None, start_row: int = 20):
-        """Processo completo de integração com a API real"""
+    def integrate_with_api(self, janela_id: Optional[int] = None, start_row: int = 20, retomavel: bool = False):
+        """
+        Processo completo de integração com a API real
+
+        Com 'retomavel', o progresso fica em <planilha>.export.jsonl: uma
+        execução interrompida é continuada da última operação buscada, sem
+        refazer o backup nem a gravação já conferida.
+        """
+        checkpoint = None
         try:
             print("🔄 Iniciando integração com API da diretoria...")
             
-            # Criar backup
-            self.create_backup()
+            if retomavel:
+                checkpoint = CheckpointExportacao(caminho_checkpoint(self.ods_file_path))
+                if janela_id is None:
+                    janela_id = checkpoint.janela
+            
+            # Criar backup (uma vez por exportação, mesmo retomada)
+            backup = checkpoint.etapas.get('backup') if checkpoint is not None else None
+            if backup is not None and backup.get('janela') == janela_id and os.path.exists(backup['path']):
+                self.backup_path = backup['path']
+                print(f"⏭️ Backup já criado: {self.backup_path}")
+            else:
+                self.create_backup()
             
             # Se não foi especificada uma janela, usar a primeira ativa
             if janela_id is None:
@@ -348,6 +480,12 @@ class DiretoriaAPIIntegrator:
                 janela_id = janelas[0]['id']
                 print(f"🎯 Usando janela operacional: {janelas[0].get('titulo', janela_id)}")
             
+            if checkpoint is not None:
+                checkpoint.iniciar(janela_id)
+                if 'backup' not in checkpoint.etapas:
+                    checkpoint.registrar_etapa('backup', janela=janela_id, path=self.backup_path)
+                self.checkpoint = checkpoint
+            
             # Processar dados da diretoria
             diretoria_data = self.processar_dados_diretoria(janela_id)
             
@@ -359,24 +497,71 @@ class DiretoriaAPIIntegrator:
             print("📝 Formatando dados para inserção...")
             formatted_data = self.format_diretoria_data_for_ods(diretoria_data)
             
-            # Inserir dados na planilha
-            print("📋 Inserindo dados na planilha...")
-            modified_root = self.insert_data_into_ods(formatted_data, start_row)
-            
-            # Salvar planilha modificada
-            print("💾 Salvando planilha modificada...")
-            self.save_modified_ods(modified_root)
+            manifesto = self._gravacao_concluida(checkpoint, formatted_data) if checkpoint is not None else None
+            if manifesto is not None:
+                print("⏭️ Planilha já gravada e conferida pelo manifesto")
+            else:
+                # Inserir dados, salvar a planilha e o manifesto (fila de escrita, sob lock)
+                print("📋 Inserindo dados na planilha...")
+                if checkpoint is None:
+                    manifesto = self.insert_and_save(formatted_data, start_row)
+                else:
+                    # O id e a linha do bloco vão para o checkpoint antes da gravação,
+                    # sob o lock: uma retomada confere esta exportação, não uma igual
+                    export_id = os.urandom(16).hex()
+                    manifesto = self.insert_and_save(
+                        formatted_data, start_row, export_id=export_id,
+                        ao_inserir=lambda linha_inicio: checkpoint.registrar_etapa(
+                            'gravando', export_id=export_id, linha_inicio=linha_inicio))
+                    checkpoint.registrar_etapa('gravado', export_id=manifesto['export_id'],
+                                               linha_inicio=manifesto['linha_inicio'])
             
+            if checkpoint is not None:
+                checkpoint.concluir()
             print("✅ Integração com API concluída com sucesso!")
             print(f"📁 Backup salvo em: {self.backup_path}")
-            print(f"📊 {len(formatted_data)} linhas inseridas a partir da linha {start_row}")
+            print(f"📊 {len(formatted_data)} linhas inseridas a partir da linha {manifesto['linha_inicio']}")
             print(f"🎯 {len(diretoria_data['periodos'])} períodos processados")
             
             return True
             
         except Exception as e:
             print(f"❌ Erro durante a integração: {str(e)}")
+            if checkpoint is not None and os.path.exists(checkpoint.caminho):
+                print(f"⏯️ Progresso guardado em {checkpoint.caminho}: rode de novo para continuar")
             return False
+        finally:
+            self.checkpoint = None
+            
+    def _gravacao_concluida(self, checkpoint: CheckpointExportacao,
+                            formatted_data: List[List[str]]) -> Optional[Dict[str, Any]]:
+        """
+        A execução interrompida já gravou estas linhas na planilha?
+
+        Só vale a gravação desta exportação: o manifesto com o export_id do
+        checkpoint ou, se ela caiu antes do manifesto, o bloco exatamente na
+        linha registrada em 'gravando'. Um bloco igual em outro lugar (de
+        outra exportação) não conta.
+
+        Returns:
+            dict: Manifesto da gravação conferida, ou None para gravar de novo
+        """
+        etapa_gravacao = checkpoint.etapas.get('gravado') or checkpoint.etapas.get('gravando')
+        if etapa_gravacao is None or etapa_gravacao.get('linha_inicio') is None:
+            return None
+        export_id = etapa_gravacao['export_id']
+
+        if verificar(self.ods_file_path, export_id=export_id)['ok']:
+            return carregar_manifesto(self.ods_file_path, export_id)
+
+        # Caiu entre a gravação e o manifesto: confere o bloco na linha
+        # registrada, sob o lock, para o manifesto gravado ser o da planilha conferida
+        with lock_arquivo(self.ods_file_path):
+            esperado = {'blocos': hashes_por_bloco(formatted_data), 'linha_inicio': etapa_gravacao['linha_inicio']}
+            if verificar_completo(self.ods_file_path, esperado):
+                return gerar_manifesto(self.ods_file_path, formatted_data, export_id=export_id,
+                                       linha_inicio=etapa_gravacao['linha_inicio'])
+        return None
 
 def main():
     """Função principal"""
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Blocos da diretoria em uma planilha já gerada
+Os integradores escrevem, para cada período, um bloco:
+
+    Período: 03/10/2025 a 05/10/2025
+    Servidor | Matrícula | Nº Viagem | Conc? | Rev? | Obs.
+    FULANO   | 123456    |           |       |      |
+    ...
+    (linha em branco)
+
+iterar_registros lê esses blocos de volta, em streaming, como registros
+(período, servidor, matrícula, nViagem, conc, rev, obs).
+
+As colunas Nº Viagem, Conc?, Rev? e Obs. saem vazias e são preenchidas
+depois. Uma leitura monta o índice (período, matrícula) -> linha, e um
+arquivo de valores (CSV ou JSON lines) é cruzado com esse índice por hash:
+todas as células alteradas entram em uma única reescrita. Chaves repetidas na
+planilha (a mesma matrícula duas vezes no período) são ambíguas e não são
+atualizadas; a reescrita confere, sob o lock, que cada linha ainda é da
+matrícula indexada.
+
+Uso:
+    python ods_diretoria_blocos.py --file ARQUIVO ler [--saida registros.jsonl]
+    python ods_diretoria_blocos.py --file ARQUIVO indice
+    python ods_diretoria_blocos.py --file ARQUIVO atualizar --valores valores.csv [--journal] [--simular]
+
+Arquivo de valores: colunas 'periodo' e 'matricula' mais qualquer uma de
+nViagem, conc, rev, obs (ou os títulos da planilha: Nº Viagem, Conc?, Rev?,
+Obs.). Coluna ausente não é tocada; valor vazio limpa a célula.
+"""
+
+import csv
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from ods_instrumentation import contar, medido
+from ods_stream_reader import iterar_linhas
+
+PREFIXO_PERIODO = 'Período:'
+
+# Campo -> coluna (1-indexed) na linha do servidor
+COLUNA_MATRICULA = 2
+COLUNAS_EDITAVEIS = {'nViagem': 3, 'conc': 4, 'rev': 5, 'obs': 6}
+
+# Títulos da planilha aceitos no arquivo de valores
+SINONIMOS = {
+    'período': 'periodo', 'matrícula': 'matricula',
+    'nº viagem': 'nViagem', 'nviagem': 'nViagem', 'conc?': 'conc', 'rev?': 'rev', 'obs.': 'obs',
+}
+
+Chave = Tuple[str, str]
+
+
+def chave(periodo: Any, matricula: Any) -> Chave:
+    """(período, matrícula) sem espaços nas pontas; matrícula sempre texto"""
+    return str(periodo).strip(), str(matricula).strip()
+
+
+class RegistroServidor(NamedTuple):
+    """Uma linha de servidor lida de volta da planilha"""
+    periodo: str
+    servidor: str
+    matricula: str
+    nViagem: str
+    conc: str
+    rev: str
+    obs: str
+    linha: int
+    # Linha do "Período: ..." do bloco: separa blocos de mesmo período
+    linha_periodo: int
+
+
+def _celula(celulas: List[str], coluna: int) -> str:
+    return celulas[coluna - 1].strip() if len(celulas) >= coluna else ''
+
+
+def iterar_registros(ods_path: str) -> Iterator[RegistroServidor]:
+    """
+    Lê os blocos da diretoria de volta, uma linha de servidor por vez
+
+    Reconhece o layout de format_diretoria_data_for_ods: uma linha é de
+    servidor quando vem depois do cabeçalho (Servidor | Matrícula) de um bloco
+    e antes da próxima linha em branco ou de período. O parse é o de
+    ods_stream_reader, então a memória fica em uma linha qualquer que seja o
+    tamanho da planilha. Os textos saem sem espaços nas pontas.
+
+    Yields:
+        RegistroServidor: Na ordem da planilha
+    """
+    periodo = None
+    linha_periodo = 0
+    no_bloco = False
+    total = 0
+    for posicao, celulas in iterar_linhas(ods_path):
+        primeira = _celula(celulas, 1)
+        if primeira.startswith(PREFIXO_PERIODO):
+            periodo = primeira[len(PREFIXO_PERIODO):].strip()
+            linha_periodo = posicao
+            no_bloco = False
+        elif primeira == 'Servidor' and _celula(celulas, 2) == 'Matrícula':
+            no_bloco = periodo is not None
+        elif not any(c.strip() for c in celulas):
+            no_bloco = False
+        elif no_bloco:
+            total += 1
+            yield RegistroServidor(periodo, primeira, _celula(celulas, 2),
+                                   *(_celula(celulas, coluna) for coluna in COLUNAS_EDITAVEIS.values()),
+                                   linha=posicao, linha_periodo=linha_periodo)
+    contar(linhas=total)
+
+
+def periodos_da_planilha(ods_path: str) -> Dict[str, Any]:
+    """
+    Blocos da planilha no formato {"periodos": [...]} dos integradores
+
+    Um item por bloco, na ordem da planilha (o mesmo período pode aparecer
+    mais de uma vez). Monta tudo em memória; para planilhas grandes, prefira
+    iterar_registros.
+    """
+    periodos: Dict[int, Dict[str, Any]] = {}
+    for registro in iterar_registros(ods_path):
+        bloco = periodos.setdefault(registro.linha_periodo, {'periodo': registro.periodo, 'servidores': []})
+        bloco['servidores'].append({
+            'nome': registro.servidor, 'matricula': registro.matricula, 'nViagem': registro.nViagem,
+            'conc': registro.conc, 'rev': registro.rev, 'obs': registro.obs,
+        })
+    return {'periodos': list(periodos.values())}
+
+
+class IndiceServidores:
+    """(período, matrícula) -> linha da planilha, com os valores atuais das colunas editáveis"""
+
+    def __init__(self):
+        self.linhas: Dict[Chave, int] = {}
+        self.valores: Dict[Chave, Dict[str, str]] = {}
+        # Mesma matrícula duas vezes no período: o índice aponta para a última
+        # linha (o bloco mais recente) e as anteriores ficam aqui
+        self.duplicadas: List[Tuple[Chave, int]] = []
+
+    def __len__(self):
+        return len(self.linhas)
+
+    def __contains__(self, item):
+        return item in self.linhas
+
+    def linha(self, periodo: str, matricula: str) -> Optional[int]:
+        return self.linhas.get(chave(periodo, matricula))
+
+    @property
+    def ambiguas(self) -> set:
+        """Chaves com mais de uma linha na planilha"""
+        return {k for k, _ in self.duplicadas}
+
+    @classmethod
+    @medido('indice')
+    def construir(cls, ods_path: str) -> 'IndiceServidores':
+        """Índice montado em uma leitura da planilha"""
+        indice = cls()
+        for registro in iterar_registros(ods_path):
+            k = (registro.periodo, registro.matricula)
+            if k in indice.linhas:
+                indice.duplicadas.append((k, indice.linhas[k]))
+            indice.linhas[k] = registro.linha
+            indice.valores[k] = {campo: getattr(registro, campo) for campo in COLUNAS_EDITAVEIS}
+        return indice
+
+
+def _campo(nome: str) -> str:
+    nome = nome.strip()
+    return SINONIMOS.get(nome.lower(), nome)
+
+
+def ler_valores(caminho: str) -> Iterator[Dict[str, Any]]:
+    """
+    Registros do arquivo de valores, com os nomes de campo normalizados
+
+    '.jsonl'/'.json' é lido como JSON lines; o resto como CSV (';' ou ',',
+    deduzido do cabeçalho; BOM do Excel aceito).
+    """
+    if caminho.endswith(('.jsonl', '.json')):
+        with open(caminho, 'r', encoding='utf-8') as f:
+            for linha in f:
+                if linha.strip():
+                    yield {_campo(k): v for k, v in json.loads(linha).items()}
+        return
+
+    with open(caminho, 'r', encoding='utf-8-sig', newline='') as f:
+        cabecalho = f.readline()
+        f.seek(0)
+        delimitador = ';' if cabecalho.count(';') >= cabecalho.count(',') else ','
+        for registro in csv.DictReader(f, delimiter=delimitador):
+            yield {_campo(k): v for k, v in registro.items() if k is not None}
+
+
+def edicoes_por_chave(indice: IndiceServidores, valores: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Cruza os valores com o índice (hash join) e monta as edições de célula
+
+    Células que já têm o valor pedido ficam de fora, e chaves com mais de uma
+    linha na planilha não são atualizadas: não há como saber qual delas o
+    arquivo de valores quis dizer.
+
+    Returns:
+        dict: 'edicoes' [(row, column, texto)], 'linhas' (servidores alterados),
+        'inalteradas' (células já com o valor), 'sem_correspondencia' (chaves
+        do arquivo que não estão na planilha) e 'ambiguas' (chaves do arquivo
+        repetidas na planilha)
+    """
+    edicoes = []
+    linhas = set()
+    inalteradas = 0
+    sem_correspondencia = []
+    ambiguas = []
+    repetidas = indice.ambiguas
+    for registro in valores:
+        k = chave(registro.get('periodo', ''), registro.get('matricula', ''))
+        row = indice.linhas.get(k)
+        if row is None:
+            sem_correspondencia.append(k)
+            continue
+        if k in repetidas:
+            ambiguas.append(k)
+            continue
+        atuais = indice.valores[k]
+        for campo, coluna in COLUNAS_EDITAVEIS.items():
+            if campo not in registro:
+                continue
+            novo = '' if registro[campo] is None else str(registro[campo])
+            if novo == atuais[campo]:
+                inalteradas += 1
+                continue
+            edicoes.append((row, coluna, novo or None))
+            # Uma chave repetida no arquivo: vale a última
+            atuais[campo] = novo
+            linhas.add(row)
+    return {'edicoes': edicoes, 'linhas': len(linhas), 'inalteradas': inalteradas,
+            'sem_correspondencia': sem_correspondencia, 'ambiguas': ambiguas}
+
+
+def atualizar_por_chave(ods_path: str, valores: Iterable[Dict[str, Any]], journal: bool = False,
+                        simular: bool = False, indice: Optional[IndiceServidores] = None) -> Dict[str, Any]:
+    """
+    Preenche Nº Viagem, Conc?, Rev? e Obs. pela chave (período, matrícula)
+
+    Uma leitura para o índice e uma única reescrita com todas as células
+    alteradas (nenhuma, se nada mudou). O índice é lido sem o lock: a
+    reescrita confere, já sob ele, que cada linha editada ainda tem a
+    matrícula indexada, e sobe ValueError sem gravar nada se não tem.
+
+    Args:
+        valores: Registros com 'periodo', 'matricula' e os campos a preencher
+        journal (bool): Registrar as edições no diário (um grupo, desfeito de uma vez)
+        simular (bool): Só calcular as edições, sem gravar
+        indice (IndiceServidores): Índice já montado da planilha
+
+    Returns:
+        dict: O de edicoes_por_chave, mais 'gravado'
+    """
+    from ods_modifier_tool import ODSModifier
+
+    if indice is None:
+        indice = IndiceServidores.construir(ods_path)
+    resultado = edicoes_por_chave(indice, valores)
+    resultado['gravado'] = False
+    if resultado['edicoes'] and not simular:
+        matriculas = {row: k[1] for k, row in indice.linhas.items()}
+        esperados = {(row, COLUNA_MATRICULA): matriculas[row] for row, _, _ in resultado['edicoes']}
+        ODSModifier(ods_path, journal=journal).set_cells(resultado['edicoes'], esperados=esperados)
+        resultado['gravado'] = True
+    return resultado
+
+
+def _ler(args) -> int:
+    import sys
+
+    saida = open(args.saida, 'w', encoding='utf-8') if args.saida else sys.stdout
+    total = 0
+    try:
+        for registro in iterar_registros(args.file):
+            saida.write(json.dumps(registro._asdict(), ensure_ascii=False) + '\n')
+            total += 1
+        saida.flush()
+    except BrokenPipeError:
+        # Quem lia fechou a saída (ex.: '| head')
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    finally:
+        if args.saida:
+            saida.close()
+    if args.saida:
+        print(f"📝 {total:,} servidores lidos para {args.saida}")
+    return 0
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Blocos da diretoria em uma planilha gerada')
+    parser.add_argument('--file', '-f', required=True, help='Arquivo ODS')
+    sub = parser.add_subparsers(dest='comando', required=True)
+    ler = sub.add_parser('ler', help='Registros dos blocos em JSON lines')
+    ler.add_argument('--saida', '-o', help='Arquivo JSON lines (padrão: stdout)')
+    sub.add_parser('indice', help='Mostrar o índice (período, matrícula) -> linha')
+    atualizar = sub.add_parser('atualizar', help='Preencher as colunas pelo arquivo de valores')
+    atualizar.add_argument('--valores', '-v', required=True, help='CSV ou JSON lines com periodo, matricula e os campos')
+    atualizar.add_argument('--journal', '-j', action='store_true',
+                           help='Registrar no diário (<arquivo>.journal.jsonl) em vez de criar backup')
+    atualizar.add_argument('--simular', action='store_true', help='Só mostrar o que mudaria')
+    args = parser.parse_args(argv)
+
+    for caminho in [args.file] + ([args.valores] if args.comando == 'atualizar' else []):
+        if not os.path.exists(caminho):
+            print(f"❌ Arquivo não encontrado: {caminho}")
+            return 1
+
+    if args.comando == 'ler':
+        return _ler(args)
+
+    indice = IndiceServidores.construir(args.file)
+    if args.comando == 'indice':
+        for (periodo, matricula), row in indice.linhas.items():
+            print(f"{row:>7}  {periodo}  {matricula}")
+        print(f"📇 {len(indice)} servidores indexados")
+    for k, row in indice.duplicadas:
+        print(f"⚠️  Matrícula repetida no período (linhas {row} e {indice.linhas[k]}): {k[1]} em {k[0]}")
+    if args.comando == 'indice':
+        return 0
+
+    if not args.journal and not args.simular:
+        from ods_backup_store import ODSBackupStore
+        manifesto = ODSBackupStore(args.file).snapshot(rotulo='atualizar_por_chave')
+        print(f"📁 Backup criado: {os.path.basename(manifesto['path'])}")
+
+    resultado = atualizar_por_chave(args.file, ler_valores(args.valores), journal=args.journal,
+                                    simular=args.simular, indice=indice)
+    acao = 'seriam alteradas' if args.simular else 'alteradas'
+    print(f"✅ {len(resultado['edicoes'])} células {acao} em {resultado['linhas']} servidores "
+          f"({resultado['inalteradas']} já estavam com o valor)")
+    for periodo, matricula in resultado['sem_correspondencia'][:20]:
+        print(f"⚠️  Sem linha na planilha: matrícula {matricula} no período {periodo}")
+    if len(resultado['sem_correspondencia']) > 20:
+        print(f"⚠️  ... e mais {len(resultado['sem_correspondencia']) - 20} chaves sem linha")
+    for periodo, matricula in resultado['ambiguas'][:20]:
+        print(f"⚠️  Não atualizada (matrícula repetida no período): {matricula} no período {periodo}")
+    if len(resultado['ambiguas']) > 20:
+        print(f"⚠️  ... e mais {len(resultado['ambiguas']) - 20} chaves repetidas")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
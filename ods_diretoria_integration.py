@@ -6,28 +6,40 @@ Este script extrai dados dinâmicos da diretoria e os insere na planilha ODS
 """
 
 import zipfile
-import xml.etree.ElementTree as ET
 import os
-import shutil
 from datetime import datetime
 import json
-from typing import List, Dict, Any
+from ods_backup_store import ODSBackupStore
+from ods_export_manifest import gerar_manifesto
+from ods_instrumentation import contar, etapa, medido
+from ods_multi_sheet import exportar_folhas, folhas_por_periodo
+from ods_safe_writer import escrita_atomica, obter_fila, substituir_content_xml
+from ods_stream_reader import contar_linhas
+from ods_stream_writer import transmitir_ods
+from ods_verifier import imprimir_resultado, verificar_bloco
+from typing import List, Dict, Any, Optional
+from ods_xml_backend import obter_backend
+
+XML = obter_backend()
 
 class DiretoriaODSIntegrator:
     def __init__(self, ods_file_path: str):
         self.ods_file_path = ods_file_path
-        self.backup_path = f"{ods_file_path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.backup_path = None
+        self.last_formatted_rows = None
+        self.last_start_row = None
         
     def create_backup(self):
-        """Criar backup do arquivo original"""
-        shutil.copy2(self.ods_file_path, self.backup_path)
+        """Criar backup do arquivo original no repositório deduplicado"""
+        manifesto = ODSBackupStore(self.ods_file_path).snapshot(rotulo=self.__class__.__name__)
+        self.backup_path = manifesto['path']
         print(f"✅ Backup criado: {self.backup_path}")
         
     def extract_ods_content(self):
         """Extrair conteúdo XML do arquivo ODS"""
         with zipfile.ZipFile(self.ods_file_path, 'r') as zip_file:
             content_xml = zip_file.read('content.xml')
-            return ET.fromstring(content_xml)
+            return XML.fromstring(content_xml)
             
     def get_diretoria_data_mock(self) -> Dict[str, Any]:
         """Simular dados da diretoria (substitua por chamada real à API)"""
@@ -72,6 +84,7 @@ class DiretoriaODSIntegrator:
             ]
         }
         
+    @medido('formatar')
     def format_diretoria_data_for_ods(self, diretoria_data: Dict[str, Any]) -> List[List[str]]:
         """Formatar dados da diretoria para inserção na planilha ODS"""
         formatted_rows = []
@@ -97,12 +110,15 @@ class DiretoriaODSIntegrator:
             # Linha em branco entre períodos
             formatted_rows.append(["", "", "", "", "", ""])
             
+        contar(linhas=len(formatted_rows))
         return formatted_rows
         
-    def insert_data_into_ods(self, data_rows: List[List[str]], start_row: int = 15):
-        """Inserir dados formatados na planilha ODS"""
+    @medido('xml')
+    def insert_data_into_ods(self, data_rows: List[List[str]], start_row: int = 15, root=None):
+        """Inserir dados formatados na planilha ODS (ou na raiz do content.xml recebida)"""
         # Extrair conteúdo
-        root = self.extract_ods_content()
+        if root is None:
+            root = self.extract_ods_content()
         
         # Encontrar a planilha (sheet)
         namespaces = {
@@ -121,15 +137,15 @@ class DiretoriaODSIntegrator:
         
         for row_data in data_rows:
             # Criar nova linha
-            new_row = ET.Element(f"{{{namespaces['table']}}}table-row")
+            new_row = XML.Element(f"{{{namespaces['table']}}}table-row")
             
             for cell_data in row_data:
                 # Criar nova célula
-                new_cell = ET.Element(f"{{{namespaces['table']}}}table-cell")
+                new_cell = XML.Element(f"{{{namespaces['table']}}}table-cell")
                 new_cell.set(f"{{{namespaces['table']}}}value-type", "string")
                 
                 # Criar parágrafo com texto
-                paragraph = ET.Element(f"{{{namespaces['text']}}}p")
+                paragraph = XML.Element(f"{{{namespaces['text']}}}p")
                 paragraph.text = str(cell_data)
                 new_cell.append(paragraph)
                 
@@ -139,26 +155,62 @@ class DiretoriaODSIntegrator:
             sheet.append(new_row)
             current_row += 1
             
+        contar(linhas=len(data_rows))
         return root
         
     def save_modified_ods(self, modified_root):
         """Salvar planilha ODS modificada"""
-        # Criar arquivo temporário
-        temp_content = ET.tostring(modified_root, encoding='utf-8', xml_declaration=True)
-        
-        # Recriar arquivo ODS
-        with zipfile.ZipFile(self.ods_file_path, 'r') as original_zip:
-            with zipfile.ZipFile(f"{self.ods_file_path}.temp", 'w', zipfile.ZIP_DEFLATED) as new_zip:
-                # Copiar todos os arquivos exceto content.xml
-                for item in original_zip.infolist():
-                    if item.filename != 'content.xml':
-                        new_zip.writestr(item, original_zip.read(item.filename))
-                
-                # Adicionar content.xml modificado
-                new_zip.writestr('content.xml', temp_content)
+        with etapa('serializar') as e:
+            temp_content = XML.tostring(modified_root)
+            e.contar(bytes=len(temp_content))
+        
+        # Recriar arquivo ODS com lock e substituição atômica do original
+        substituir_content_xml(self.ods_file_path, temp_content)
+        
+    def insert_and_save(self, data_rows: List[List[str]], start_row: int = 15) -> Dict[str, Any]:
+        """
+        Inserir as linhas e salvar a planilha em uma única reescrita
+
+        Leitura do content.xml, inserção e substituição do arquivo passam pela
+        fila de escrita da planilha, sob lock do começo ao fim: exportações
+        concorrentes não partem da mesma base nem sobrescrevem umas às outras.
+        O manifesto sai do content.xml gravado, ainda sob o lock, com a linha
+        onde o bloco começou ('linha_inicio') para a verificação conferir ali.
+
+        Returns:
+            dict: Manifesto da exportação (gerar_manifesto)
+        """
+        def inserir(root):
+            # As linhas vão para o fim da tabela: o bloco começa logo depois da última
+            linha_inicio = contar_linhas(root) + 1
+            self.insert_data_into_ods(data_rows, start_row, root=root)
+            return linha_inicio
+
+        fila = obter_fila(self.ods_file_path)
+        return fila.submeter(
+            inserir,
+            apos_gravar=lambda linha_inicio, content_xml: gerar_manifesto(self.ods_file_path, data_rows,
+                                                                          content_xml=content_xml,
+                                                                          linha_inicio=linha_inicio)
+        ).result()
+        
+    def stream_modified_ods(self, modified_root, output) -> int:
+        """Gravar a planilha modificada direto em um stream (stdout, socket, BytesIO), sem tocar no original"""
+        return transmitir_ods(self.ods_file_path, output, root=modified_root)
         
-        # Substituir arquivo original
-        os.replace(f"{self.ods_file_path}.temp", self.ods_file_path)
+    def export_multi_sheet(self, output, template_rows: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Exportar cada período em uma folha própria, mais a folha "Resumo"
+        
+        Args:
+            output: Caminho do novo arquivo ou stream com write()
+            template_rows (int): Linhas do modelo mantidas no topo de cada folha (padrão: todas)
+        """
+        folhas = folhas_por_periodo(self.get_diretoria_data_mock())
+        if isinstance(output, str):
+            with escrita_atomica(output) as f:
+                return exportar_folhas(self.ods_file_path, f, folhas, template_rows)
+        return exportar_folhas(self.ods_file_path, output, folhas, template_rows)
         
     def integrate_diretoria_data(self, start_row: int = 15):
         """Processo completo de integração dos dados da diretoria"""
@@ -175,18 +227,16 @@ class DiretoriaODSIntegrator:
             # Formatar dados
             print("📝 Formatando dados para inserção...")
             formatted_data = self.format_diretoria_data_for_ods(diretoria_data)
+            self.last_formatted_rows = formatted_data
             
-            # Inserir dados na planilha
+            # Inserir dados, salvar a planilha e o manifesto (fila de escrita, sob lock)
             print("📋 Inserindo dados na planilha...")
-            modified_root = self.insert_data_into_ods(formatted_data, start_row)
-            
-            # Salvar planilha modificada
-            print("💾 Salvando planilha modificada...")
-            self.save_modified_ods(modified_root)
+            manifesto = self.insert_and_save(formatted_data, start_row)
+            self.last_start_row = manifesto['linha_inicio']
             
             print("✅ Integração concluída com sucesso!")
             print(f"📁 Backup salvo em: {self.backup_path}")
-            print(f"📊 {len(formatted_data)} linhas inseridas a partir da linha {start_row}")
+            print(f"📊 {len(formatted_data)} linhas inseridas a partir da linha {self.last_start_row}")
             
             return True
             
@@ -194,35 +244,31 @@ class DiretoriaODSIntegrator:
             print(f"❌ Erro durante a integração: {str(e)}")
             return False
             
-    def verify_integration(self):
-        """Verificar se a integração foi bem-sucedida"""
+    def verify_integration(self, expected_rows: Optional[List[List[str]]] = None,
+                           start_row: Optional[int] = None):
+        """
+        Verificar se o bloco inserido está na planilha, célula por célula
+
+        Sem argumentos, confere a última exportação na linha onde ela foi
+        gravada: um bloco igual de uma exportação anterior não conta.
+        """
         try:
-            root = self.extract_ods_content()
+            if expected_rows is None:
+                expected_rows = self.last_formatted_rows
+                start_row = self.last_start_row
+            if expected_rows is None:
+                print("⚠️ Verificação: nenhuma exportação feita para conferir")
+                return False
+                
+            resultado = verificar_bloco(self.ods_file_path, expected_rows, start_row)
+            imprimir_resultado(resultado)
             
-            namespaces = {
-                'table': 'urn:oasis:names:tc:opendocument:xmlns:table:1.0',
-                'text': 'urn:oasis:names:tc:opendocument:xmlns:text:1.0'
-            }
-            
-            # Encontrar todas as células com texto
-            cells = root.findall('.//text:p', namespaces)
-            
-            # Procurar por dados da diretoria
-            diretoria_found = False
-            for cell in cells:
-                if cell.text and "Período:" in cell.text:
-                    print(f"✅ Encontrado: {cell.text}")
-                    diretoria_found = True
-                elif cell.text and any(name in cell.text.upper() for name in ["CIDNO", "DOUGLAS", "MARIA"]):
-                    print(f"✅ Servidor encontrado: {cell.text}")
-                    diretoria_found = True
-                    
-            if diretoria_found:
+            if resultado['ok']:
                 print("✅ Verificação concluída: Dados da diretoria encontrados na planilha")
             else:
-                print("⚠️ Verificação: Nenhum dado da diretoria encontrado")
+                print("⚠️ Verificação: Dados da diretoria divergentes na planilha")
                 
-            return diretoria_found
+            return resultado['ok']
             
         except Exception as e:
             print(f"❌ Erro na verificação: {str(e)}")
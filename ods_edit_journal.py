@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Diário (journal) de edições de células para arquivos ODS
+Em vez de copiar a planilha inteira antes de cada edição, cada alteração é
+registrada como uma linha JSON em um arquivo ao lado da planilha
+("<arquivo>.journal.jsonl"), com o valor antigo e o novo da célula.
+
+Tipos de registro:
+    edit  -> célula (row, column) passou de 'old' para 'new'
+    undo  -> o grupo de edições 'ref' foi desfeito
+    redo  -> o grupo de edições 'ref' foi refeito
+
+Edições aplicadas juntas (mesma reescrita) compartilham o mesmo 'grupo' e são
+desfeitas/refeitas juntas.
+"""
+
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from ods_safe_writer import copiar_permissoes
+
+
+class ODSEditJournal:
+    def __init__(self, ods_path: str, journal_path: Optional[str] = None, compactar_a_cada: int = 1000):
+        """
+        Args:
+            ods_path (str): Planilha cujas edições são registradas
+            journal_path (str): Arquivo do diário (padrão: <planilha>.journal.jsonl)
+            compactar_a_cada (int): Compacta automaticamente quando o diário passa
+                dessa quantidade de registros e tem mais churn do que edições vivas
+        """
+        self.ods_path = ods_path
+        self.journal_path = journal_path or f"{ods_path}.journal.jsonl"
+        self.compactar_a_cada = compactar_a_cada
+        self._registros = None
+
+    def _carregar(self) -> List[Dict]:
+        if self._registros is None:
+            self._registros = []
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, 'r', encoding='utf-8') as f:
+                    for linha in f:
+                        linha = linha.strip()
+                        if linha:
+                            self._registros.append(json.loads(linha))
+        return self._registros
+
+    def recarregar(self):
+        """Descarta os registros em memória: a próxima leitura vem do arquivo (outro processo pode ter anexado)"""
+        self._registros = None
+
+    def _proximo_seq(self) -> int:
+        registros = self._carregar()
+        return registros[-1]['seq'] + 1 if registros else 1
+
+    def _anexar(self, registros: List[Dict]):
+        """Acrescenta registros ao final do diário (uma escrita, um fsync)"""
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            for registro in registros:
+                f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._carregar().extend(registros)
+
+    def registrar(self, edicoes: List[Tuple[int, int, Optional[str], Optional[str]]]) -> int:
+        """
+        Registra um grupo de edições já aplicadas na planilha
+
+        Args:
+            edicoes (list): Tuplas (row, column, valor_antigo, valor_novo)
+
+        Returns:
+            int: Identificador do grupo
+        """
+        seq = self._proximo_seq()
+        ts = datetime.now().isoformat()
+        registros = []
+        for i, (row, column, antigo, novo) in enumerate(edicoes):
+            registros.append({
+                'seq': seq + i,
+                'ts': ts,
+                'op': 'edit',
+                'grupo': seq,
+                'row': row,
+                'column': column,
+                'old': antigo,
+                'new': novo
+            })
+        self._anexar(registros)
+        self._talvez_compactar()
+        return seq
+
+    def _reproduzir(self, registros: Optional[List[Dict]] = None) -> Tuple[List[int], List[int], Dict[int, List[Dict]]]:
+        """Reproduz o diário e retorna (pilha de grupos aplicados, pilha de refazer, edições por grupo)"""
+        if registros is None:
+            registros = self._carregar()
+
+        grupos = {}
+        aplicados = []
+        desfeitos = []
+        for registro in registros:
+            if registro['op'] == 'edit':
+                if registro['grupo'] not in grupos:
+                    grupos[registro['grupo']] = []
+                    aplicados.append(registro['grupo'])
+                    # Uma edição nova invalida o que podia ser refeito
+                    desfeitos = []
+                grupos[registro['grupo']].append(registro)
+            elif registro['op'] == 'undo':
+                aplicados.remove(registro['ref'])
+                desfeitos.append(registro['ref'])
+            elif registro['op'] == 'redo':
+                desfeitos.remove(registro['ref'])
+                aplicados.append(registro['ref'])
+        return aplicados, desfeitos, grupos
+
+    def proximo_desfazer(self) -> Optional[List[Tuple[int, int, Optional[str]]]]:
+        """Edições (row, column, valor) que desfazem o último grupo, ou None"""
+        aplicados, _, grupos = self._reproduzir()
+        if not aplicados:
+            return None
+        edicoes = grupos[aplicados[-1]]
+        return [(e['row'], e['column'], e['old']) for e in reversed(edicoes)]
+
+    def proximo_refazer(self) -> Optional[List[Tuple[int, int, Optional[str]]]]:
+        """Edições (row, column, valor) que refazem o último grupo desfeito, ou None"""
+        _, desfeitos, grupos = self._reproduzir()
+        if not desfeitos:
+            return None
+        edicoes = grupos[desfeitos[-1]]
+        return [(e['row'], e['column'], e['new']) for e in edicoes]
+
+    def marcar_desfeito(self):
+        """Registra que o último grupo aplicado foi desfeito na planilha"""
+        aplicados, _, _ = self._reproduzir()
+        self._anexar([{'seq': self._proximo_seq(), 'ts': datetime.now().isoformat(),
+                       'op': 'undo', 'ref': aplicados[-1]}])
+
+    def marcar_refeito(self):
+        """Registra que o último grupo desfeito foi refeito na planilha"""
+        _, desfeitos, _ = self._reproduzir()
+        self._anexar([{'seq': self._proximo_seq(), 'ts': datetime.now().isoformat(),
+                       'op': 'redo', 'ref': desfeitos[-1]}])
+
+    def valores_atuais(self) -> Dict[Tuple[int, int], Optional[str]]:
+        """
+        Valor que cada célula do diário deveria ter agora na planilha
+
+        Antes de desfazer, refazer ou restaurar, as células são conferidas com
+        estes valores: se diferem, a planilha mudou por fora do diário (linhas
+        inseridas ou removidas deslocam as posições) e escrever seria às cegas.
+        """
+        registros = self._carregar()
+        _, _, grupos = self._reproduzir()
+        valores = {}
+        for registro in registros:
+            if registro['op'] == 'edit':
+                valores[(registro['row'], registro['column'])] = registro['new']
+            elif registro['op'] == 'undo':
+                for e in reversed(grupos[registro['ref']]):
+                    valores[(e['row'], e['column'])] = e['old']
+            else:
+                for e in grupos[registro['ref']]:
+                    valores[(e['row'], e['column'])] = e['new']
+        return valores
+
+    def edicoes_para_instante(self, instante: datetime) -> List[Tuple[int, int, Optional[str]]]:
+        """
+        Calcula as edições que levam a planilha de volta ao estado de um instante
+
+        Para cada célula alterada depois do instante, o valor correto é o valor
+        que ela tinha antes da primeira alteração posterior a ele.
+
+        Returns:
+            list: Tuplas (row, column, valor) a aplicar
+        """
+        registros = self._carregar()
+        _, _, grupos = self._reproduzir()
+        limite = instante.isoformat()
+
+        valores = {}
+        for registro in registros:
+            if registro['ts'] <= limite:
+                continue
+
+            if registro['op'] == 'edit':
+                mudancas = [(registro['row'], registro['column'], registro['old'])]
+            elif registro['op'] == 'undo':
+                # Antes do undo, a célula tinha o 'new' da última edição dela no grupo
+                mudancas = [(e['row'], e['column'], e['new']) for e in reversed(grupos[registro['ref']])]
+            else:
+                mudancas = [(e['row'], e['column'], e['old']) for e in grupos[registro['ref']]]
+
+            for row, column, antes in mudancas:
+                valores.setdefault((row, column), antes)
+
+        return [(row, column, valor) for (row, column), valor in sorted(valores.items())]
+
+    def compactar(self) -> int:
+        """
+        Reescreve o diário só com o que ainda pode ser desfeito ou refeito
+
+        Ramos desfeitos que não podem mais ser refeitos e os pares undo/redo
+        intermediários são descartados; restaurar para um instante em que um
+        desses ramos estava aplicado deixa de ser possível.
+
+        Returns:
+            int: Quantidade de registros removidos
+        """
+        registros = self._carregar()
+        aplicados, desfeitos, grupos = self._reproduzir()
+        # Horário do undo que deixou cada grupo desfeito (o último deles)
+        desfeito_em = {r['ref']: r['ts'] for r in registros if r['op'] == 'undo'}
+
+        novos = []
+        for grupo in aplicados + list(reversed(desfeitos)):
+            novos.extend(grupos[grupo])
+        # A pilha de refazer volta a ser desfeita, do topo para a base
+        for grupo in desfeitos:
+            novos.append({'seq': 0, 'ts': desfeito_em[grupo], 'op': 'undo', 'ref': grupo})
+
+        for i, registro in enumerate(novos, start=1):
+            registro['seq'] = i
+        # Grupos são renumerados pelo seq do primeiro registro
+        renumeracao = {}
+        for registro in novos:
+            if registro['op'] == 'edit' and registro['grupo'] not in renumeracao:
+                renumeracao[registro['grupo']] = registro['seq']
+        for registro in novos:
+            if registro['op'] == 'edit':
+                registro['grupo'] = renumeracao[registro['grupo']]
+            else:
+                registro['ref'] = renumeracao[registro['ref']]
+
+        diretorio = os.path.dirname(os.path.abspath(self.journal_path))
+        fd, temp_path = tempfile.mkstemp(dir=diretorio, prefix='.tmp_')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for registro in novos:
+                f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+        copiar_permissoes(self.journal_path, temp_path)
+        os.replace(temp_path, self.journal_path)
+
+        removidos = len(registros) - len(novos)
+        self._registros = novos
+        return removidos
+
+    def _talvez_compactar(self):
+        registros = self._carregar()
+        if len(registros) < self.compactar_a_cada:
+            return
+        aplicados, desfeitos, grupos = self._reproduzir()
+        vivos = sum(len(grupos[g]) for g in aplicados + desfeitos) + len(desfeitos)
+        if len(registros) > 2 * vivos:
+            self.compactar()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Checkpoint das exportações pela API
+Uma exportação grande passa a maior parte do tempo buscando as participações
+operação por operação. O progresso vai sendo registrado em um arquivo JSONL ao
+lado da planilha ("<arquivo>.export.jsonl"); se a execução cair (timeout,
+queda, deploy), a próxima continua da última operação concluída e pula as
+etapas de gravação já feitas e conferidas.
+
+Tipos de registro:
+    inicio         -> janela exportada e horário
+    operacoes      -> lista de operações planejadas da janela
+    participacoes  -> participações já buscadas da operação 'operacao'
+    etapa          -> etapa de saída concluída ('backup', 'gravando', 'gravado')
+
+O arquivo é removido quando a exportação termina. Um registro cortado no fim
+(queda no meio da escrita) é cortado do arquivo ao carregar; um checkpoint de outra janela ou mais
+velho que a validade é descartado e a exportação recomeça do zero.
+
+Uso:
+    python ods_cli.py export --retomavel [--janela N]
+"""
+
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Depois disso os dados já buscados podem estar desatualizados: recomeça
+VALIDADE_PADRAO = 12 * 3600
+
+
+def caminho_checkpoint(destino: str) -> str:
+    return f"{destino}.export.jsonl"
+
+
+class CheckpointExportacao:
+    """Progresso de uma exportação, em um arquivo de registros JSON por linha"""
+
+    def __init__(self, caminho: str, validade_s: float = VALIDADE_PADRAO):
+        """
+        Args:
+            caminho (str): Arquivo do checkpoint (ver caminho_checkpoint)
+            validade_s (float): Idade máxima de um checkpoint retomado, em segundos
+        """
+        self.caminho = caminho
+        self.validade_s = validade_s
+        self.janela = None
+        self.operacoes: Optional[List[Dict]] = None
+        self.participacoes: Dict[Any, List[Dict]] = {}
+        self.etapas: Dict[str, Dict[str, Any]] = {}
+        self.retomado = False
+        self._carregar()
+
+    def _carregar(self):
+        if not os.path.exists(self.caminho):
+            return
+        registros = []
+        validos = 0
+        with open(self.caminho, 'rb') as f:
+            for linha in f:
+                # Só a última linha pode estar cortada (sem o '\n' ou com JSON incompleto)
+                if not linha.endswith(b'\n'):
+                    break
+                try:
+                    registros.append(json.loads(linha.decode('utf-8')))
+                except ValueError:
+                    break
+                validos += len(linha)
+            cortado = f.seek(0, os.SEEK_END) > validos
+        if cortado and registros:
+            # Os próximos registros vão no fim do arquivo: o pedaço cortado sai antes
+            with open(self.caminho, 'r+b') as f:
+                f.truncate(validos)
+                f.flush()
+                os.fsync(f.fileno())
+        if not registros or registros[0].get('tipo') != 'inicio':
+            self.descartar()
+            return
+        idade = (datetime.now() - datetime.fromisoformat(registros[0]['em'])).total_seconds()
+        if idade > self.validade_s:
+            print(f"🗑️ Checkpoint de {registros[0]['em']} expirado: recomeçando a exportação")
+            self.descartar()
+            return
+
+        self.janela = registros[0]['janela']
+        for registro in registros[1:]:
+            if registro['tipo'] == 'operacoes':
+                self.operacoes = registro['dados']
+            elif registro['tipo'] == 'participacoes':
+                self.participacoes[registro['operacao']] = registro['dados']
+            elif registro['tipo'] == 'etapa':
+                self.etapas[registro['nome']] = registro
+
+    def _registrar(self, registro: Dict[str, Any]):
+        with open(self.caminho, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def descartar(self):
+        """Apaga o checkpoint e o estado carregado"""
+        if os.path.exists(self.caminho):
+            os.remove(self.caminho)
+        self.janela = None
+        self.operacoes = None
+        self.participacoes = {}
+        self.etapas = {}
+        self.retomado = False
+
+    def iniciar(self, janela_id):
+        """Retoma o checkpoint se ele é desta janela; senão começa um novo"""
+        if self.janela is not None and self.janela == janela_id:
+            self.retomado = True
+            print(f"⏯️ Retomando a exportação da janela {janela_id} ({self.caminho})")
+            return
+        if self.janela is not None:
+            print(f"🗑️ Checkpoint da janela {self.janela} descartado (exportando a janela {janela_id})")
+        self.descartar()
+        self.janela = janela_id
+        self._registrar({'tipo': 'inicio', 'janela': janela_id, 'em': datetime.now().isoformat()})
+
+    def registrar_operacoes(self, operacoes: List[Dict]):
+        self.operacoes = operacoes
+        self._registrar({'tipo': 'operacoes', 'dados': operacoes})
+
+    def registrar_participacoes(self, operacao_id, participacoes: List[Dict]):
+        self.participacoes[operacao_id] = participacoes
+        self._registrar({'tipo': 'participacoes', 'operacao': operacao_id, 'dados': participacoes})
+
+    def registrar_etapa(self, nome: str, **dados):
+        registro = {'tipo': 'etapa', 'nome': nome, 'em': datetime.now().isoformat(), **dados}
+        self.etapas[nome] = registro
+        self._registrar(registro)
+
+    def concluir(self):
+        """Exportação terminada: o checkpoint não é mais necessário"""
+        self.descartar()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serviço local de exportação ODS
+Um processo de longa duração que carrega o modelo uma vez (bytes e árvore do
+content.xml), mantém as conexões com a API abertas e responde às exportações
+com o arquivo gerado em memória, sem reimportar módulos nem reler o modelo a
+cada pedido.
+
+Uso:
+    python ods_export_daemon.py serve [--port 8765 | --socket /tmp/ods.sock] [--file MODELO] [--api URL] [--cache-dir DIR]
+                                      [--limite-api 10] [--rajada-api 20]
+    python ods_export_daemon.py once [--mock] [--formato ods] > saida.ods
+
+Endpoints:
+    GET /export?janela_id=N&formato=ods|xlsx|csv|fods&folhas=periodo|janela&mock=1
+    GET /stats     contagens, latência p50/p99, taxa de acerto do cache e requisições
+                   à API coalescidas ou atrasadas pelo limite
+"""
+
+import copy
+import hashlib
+import io
+import json
+import math
+import os
+import socketserver
+import sys
+import threading
+import time
+import zipfile
+from collections import deque
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from ods_api_client import ClienteAPI
+from ods_diretoria_api_integration import DiretoriaAPIIntegrator
+from ods_diretoria_integration import DiretoriaODSIntegrator
+from ods_multi_sheet import exportar_folhas, folhas_por_periodo
+from ods_period_cache import CachePeriodos
+from ods_report_cache import CacheRelatorios, chave_relatorio
+from ods_row_writers import ESCRITORES
+from ods_stream_writer import transmitir_ods
+from ods_xml_backend import obter_backend
+
+XML = obter_backend()
+
+ARQUIVO_PADRAO = "Pedido Diária Padrao (3).ods"
+PORTA_PADRAO = 8765
+
+TIPOS_CONTEUDO = {
+    'ods': 'application/vnd.oasis.opendocument.spreadsheet',
+    'fods': 'application/vnd.oasis.opendocument.spreadsheet',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def percentil(valores: List[float], p: float) -> Optional[float]:
+    """Percentil p (0-100) pelo método do posto mais próximo"""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posto = math.ceil(p / 100 * len(ordenados))
+    return ordenados[max(0, min(len(ordenados), posto) - 1)]
+
+
+class ModeloResidente:
+    """
+    Modelo ODS mantido em memória
+
+    Guarda os bytes do arquivo e a árvore do content.xml; cada exportação
+    trabalha em uma cópia da árvore. Se o arquivo mudar no disco, é recarregado.
+    """
+
+    def __init__(self, ods_path: str):
+        self.ods_path = ods_path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._carregar()
+
+    def _carregar(self):
+        mtime = os.stat(self.ods_path).st_mtime_ns
+        with open(self.ods_path, 'rb') as f:
+            dados = f.read()
+        with zipfile.ZipFile(io.BytesIO(dados), 'r') as zip_ref:
+            root = XML.fromstring(zip_ref.read('content.xml'))
+        self.dados, self.root, self.hash = dados, root, hashlib.sha256(dados).hexdigest()
+        self._mtime = mtime
+
+    def atualizar(self):
+        """Recarrega o modelo se o arquivo foi alterado desde a última leitura"""
+        mtime = os.stat(self.ods_path).st_mtime_ns
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._carregar()
+
+    def nova_raiz(self):
+        return copy.deepcopy(self.root)
+
+
+class ServicoExportacao:
+    """Exportações a partir do modelo residente e das conexões persistentes"""
+
+    def __init__(self, ods_path: str = ARQUIVO_PADRAO, api_base_url: str = "http://localhost:3000",
+                 cache: Optional[CacheRelatorios] = None, taxa_api: Optional[float] = None,
+                 rajada_api: Optional[float] = None, cache_periodos: Optional[CachePeriodos] = None):
+        self.modelo = ModeloResidente(ods_path)
+        self.cache = cache
+        self.cliente = ClienteAPI(api_base_url, headers={'User-Agent': 'ODS-Diretoria-Integration/1.0'},
+                                  taxa=taxa_api, rajada=rajada_api)
+        self.integrador = DiretoriaAPIIntegrator(ods_path, api_base_url, api_client=self.cliente,
+                                                 cache_periodos=cache_periodos)
+        self.mock = DiretoriaODSIntegrator(ods_path)
+        self._latencias = deque(maxlen=10000)
+        self._lock = threading.Lock()
+        self.pedidos = 0
+        self.erros = 0
+        self.bytes_enviados = 0
+        self.iniciado_em = time.time()
+
+    def dados_diretoria(self, janela_id: Optional[int], mock: bool) -> Dict[str, Any]:
+        if mock:
+            return self.mock.get_diretoria_data_mock()
+        if janela_id is None:
+            janelas = self.integrador.get_janelas_operacionais()
+            if not janelas:
+                raise ValueError("Nenhuma janela operacional ativa encontrada")
+            janela_id = janelas[0]['id']
+        return self.integrador.processar_dados_diretoria(janela_id)
+
+    def exportar(self, janela_id: Optional[int] = None, formato: str = 'ods',
+                 folhas: Optional[str] = None, mock: bool = False) -> Tuple[bytes, str]:
+        """
+        Gera a exportação em memória
+
+        Returns:
+            tuple: (bytes do arquivo, content-type)
+        """
+        if formato not in TIPOS_CONTEUDO:
+            raise ValueError(f"Formato não suportado: {formato}")
+        if folhas and formato != 'ods':
+            raise ValueError("Exportação em várias folhas só existe em ODS")
+        self.modelo.atualizar()
+
+        if folhas == 'janela' and not mock:
+            # Os dados de cada janela só são buscados durante a escrita: não há
+            # entrada conhecida de antemão para montar a chave do cache
+            saida = io.BytesIO()
+            folhas_iter = (
+                (janela.get('titulo') or f"Janela {janela['id']}",
+                 lambda janela=janela: self.integrador.processar_dados_diretoria(janela['id']))
+                for janela in self.integrador.get_janelas_operacionais()
+            )
+            exportar_folhas(self.modelo.dados, saida, folhas_iter, root=self.modelo.root)
+            return saida.getvalue(), TIPOS_CONTEUDO['ods']
+
+        dados = self.dados_diretoria(janela_id, mock)
+        if self.cache is None:
+            return self._gerar(dados, formato, folhas), TIPOS_CONTEUDO[formato]
+        chave = chave_relatorio(dados, self.modelo.hash, formato, folhas=folhas)
+        return self.cache.obter_ou_gerar(chave, lambda: self._gerar(dados, formato, folhas)), TIPOS_CONTEUDO[formato]
+
+    def _gerar(self, dados: Dict[str, Any], formato: str, folhas: Optional[str]) -> bytes:
+        saida = io.BytesIO()
+        if folhas:
+            exportar_folhas(self.modelo.dados, saida, folhas_por_periodo(dados), root=self.modelo.root)
+            return saida.getvalue()
+
+        linhas = self.integrador.format_diretoria_data_for_ods(dados)
+        if formato == 'ods':
+            root = self.integrador.insert_data_into_ods(linhas, root=self.modelo.nova_raiz())
+            transmitir_ods(self.modelo.dados, saida, root=root)
+        else:
+            ESCRITORES[formato](linhas, saida)
+        return saida.getvalue()
+
+    def registrar(self, segundos: float, tamanho: int, ok: bool):
+        with self._lock:
+            self.pedidos += 1
+            if ok:
+                self._latencias.append(segundos)
+                self.bytes_enviados += tamanho
+            else:
+                self.erros += 1
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            latencias = list(self._latencias)
+            pedidos, erros, enviados = self.pedidos, self.erros, self.bytes_enviados
+        return {
+            'pedidos': pedidos,
+            'erros': erros,
+            'bytes_enviados': enviados,
+            'p50_ms': None if not latencias else percentil(latencias, 50) * 1000,
+            'p99_ms': None if not latencias else percentil(latencias, 99) * 1000,
+            'modelo_sha256': self.modelo.hash,
+            'requisicoes_api': self.cliente.requisicoes,
+            'conexoes_api': self.cliente.conexoes_abertas,
+            'coalescidas_api': self.cliente.coalescidas,
+            'limite_api': None if self.cliente.limite is None else self.cliente.limite.estatisticas(),
+            'ativo_ha_s': time.time() - self.iniciado_em,
+            'cache': None if self.cache is None else self.cache.estatisticas(),
+            'cache_periodos': (None if self.integrador.cache_periodos is None
+                               else self.integrador.cache_periodos.estatisticas()),
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    servico: ServicoExportacao = None
+    protocol_version = 'HTTP/1.1'
+
+    def address_string(self):
+        # Em socket Unix o endereço do cliente é uma string vazia
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _responder(self, status: int, corpo: bytes, tipo: str, extras: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(corpo)))
+        for nome, valor in (extras or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _json(self, status: int, dados: Dict[str, Any]):
+        self._responder(status, json.dumps(dados, ensure_ascii=False).encode('utf-8'), 'application/json')
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if url.path == '/stats':
+            self._json(200, self.servico.estatisticas())
+            return
+        if url.path != '/export':
+            self._json(404, {'erro': 'não encontrado'})
+            return
+
+        inicio = time.perf_counter()
+        try:
+            formato = params.get('formato', 'ods')
+            corpo, tipo = self.servico.exportar(
+                janela_id=int(params['janela_id']) if params.get('janela_id') else None,
+                formato=formato,
+                folhas=params.get('folhas'),
+                mock=params.get('mock') in ('1', 'true'),
+            )
+        except ValueError as e:
+            self.servico.registrar(time.perf_counter() - inicio, 0, False)
+            self._json(400, {'erro': str(e)})
+            return
+        except Exception as e:
+            self.servico.registrar(time.perf_counter() - inicio, 0, False)
+            self._json(500, {'erro': str(e)})
+            return
+
+        self.servico.registrar(time.perf_counter() - inicio, len(corpo), True)
+        self._responder(200, corpo, tipo, {
+            'Content-Disposition': f'attachment; filename="diretoria.{formato}"'
+        })
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def criar_servidor(servico: ServicoExportacao, porta: int = PORTA_PADRAO, socket_path: Optional[str] = None):
+    """Servidor HTTP em 127.0.0.1:porta ou no socket Unix informado"""
+    handler = type('Handler', (_Handler,), {'servico': servico})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        return ThreadingUnixHTTPServer(socket_path, handler)
+    return ThreadingHTTPServer(('127.0.0.1', porta), handler)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serviço local de exportação ODS')
+    parser.add_argument('comando', choices=['serve', 'once'], help='serve: serviço residente; once: uma exportação a frio')
+    parser.add_argument('--file', '-f', default=ARQUIVO_PADRAO, help='Arquivo ODS de modelo')
+    parser.add_argument('--api', default='http://localhost:3000', help='URL base da API')
+    parser.add_argument('--port', type=int, default=PORTA_PADRAO, help='Porta em 127.0.0.1')
+    parser.add_argument('--socket', help='Socket Unix no lugar da porta TCP')
+    parser.add_argument('--janela', type=int, help='Janela exportada (once)')
+    parser.add_argument('--formato', default='ods', choices=sorted(TIPOS_CONTEUDO), help='Formato (once)')
+    parser.add_argument('--mock', action='store_true', help='Usar os dados mock (once)')
+    parser.add_argument('--cache-dir', help='Guardar os relatórios prontos e os períodos também em disco neste diretório')
+    parser.add_argument('--cache-mb', type=int, default=64, help='Limite do cache em memória, em MB (0 desliga)')
+    parser.add_argument('--limite-api', type=float, help='Requisições por segundo à API, por rota (padrão: sem limite)')
+    parser.add_argument('--rajada-api', type=float, help='Requisições seguidas antes do limite valer (padrão: o limite)')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"❌ Arquivo não encontrado: {args.file}", file=sys.stderr)
+        return 1
+
+    cache = None
+    if args.cache_mb or args.cache_dir:
+        cache = CacheRelatorios(args.cache_dir, max_memoria=args.cache_mb * 1024 * 1024)
+    servico = ServicoExportacao(args.file, args.api, cache=cache, taxa_api=args.limite_api,
+                                rajada_api=args.rajada_api,
+                                cache_periodos=CachePeriodos(args.cache_dir) if args.cache_dir else None)
+
+    if args.comando == 'once':
+        # As mensagens dos integradores vão para stderr: stdout leva só o arquivo
+        with redirect_stdout(sys.stderr):
+            corpo, _ = servico.exportar(args.janela, args.formato, mock=args.mock)
+        sys.stdout.buffer.write(corpo)
+        return 0
+
+    servidor = criar_servidor(servico, args.port, args.socket)
+    endereco = args.socket or f"http://127.0.0.1:{args.port}"
+    print(f"🚀 Serviço de exportação ativo em {endereco} (modelo {servico.modelo.hash[:12]})")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Encerrando serviço")
+    finally:
+        servidor.server_close()
+        servico.cliente.fechar()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
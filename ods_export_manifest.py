@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Manifesto de verificação das exportações ODS
+Depois de gravar a planilha, o escritor registra em um pequeno JSON ao lado
+dela ("<arquivo>.manifest.json") o manifesto da exportação: o id, a
+quantidade de linhas, a linha onde o bloco começou, o hash de cada bloco de
+período e o CRC do content.xml lido do diretório central do ZIP.
+
+O arquivo guarda os manifestos por export_id (os MAX_MANIFESTOS mais
+recentes): quando a fila de escrita junta N exportações em uma reescrita,
+cada uma continua verificável pelo próprio id.
+
+Verificação rápida: abrir o ZIP lê só o diretório central, então comparar o
+CRC e o tamanho do content.xml com o manifesto leva microssegundos. Se não
+conferir (outro escritor mexeu no arquivo, por exemplo), cai para a
+verificação completa, que percorre a planilha uma vez recalculando os hashes
+dos blocos.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from ods_instrumentation import medido
+from ods_safe_writer import copiar_permissoes, lock_arquivo
+from ods_stream_reader import iterar_linhas
+from ods_verifier import linhas_para_celulas
+
+PREFIXO_PERIODO = 'Período:'
+
+# Manifestos mais antigos que isso saem do arquivo ao gravar um novo
+MAX_MANIFESTOS = 50
+
+
+def caminho_manifesto(ods_path: str) -> str:
+    return f"{ods_path}.manifest.json"
+
+
+def _hash_linha(hasher, celulas):
+    hasher.update(json.dumps(list(celulas), ensure_ascii=False).encode('utf-8'))
+    hasher.update(b'\n')
+
+
+def hashes_por_bloco(linhas_formatadas: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Divide as linhas exportadas em blocos de período e calcula o hash de cada um
+
+    Um bloco começa na linha "Período: ..." e vai até a linha antes do próximo
+    período (inclui o cabeçalho, os servidores e a linha em branco).
+    """
+    blocos = []
+    for celulas in linhas_para_celulas(linhas_formatadas):
+        if not blocos or (celulas and celulas[0].startswith(PREFIXO_PERIODO)):
+            blocos.append({'cabeca': list(celulas), 'linhas': 0, 'hasher': hashlib.sha256()})
+        _hash_linha(blocos[-1]['hasher'], celulas)
+        blocos[-1]['linhas'] += 1
+
+    return [
+        {'cabeca': b['cabeca'], 'linhas': b['linhas'], 'hash': b['hasher'].hexdigest()}
+        for b in blocos
+    ]
+
+
+def _info_content_xml(ods_path: str, content_xml: Optional[bytes] = None) -> Dict[str, int]:
+    if content_xml is not None:
+        # Os mesmos valores que o diretório central guarda para esses bytes
+        return {'crc': zlib.crc32(content_xml), 'tamanho': len(content_xml)}
+    # ZipFile só lê o diretório central; nada é descomprimido
+    with zipfile.ZipFile(ods_path, 'r') as zip_ref:
+        info = zip_ref.getinfo('content.xml')
+    return {'crc': info.CRC, 'tamanho': info.file_size}
+
+
+def _carregar_todos(ods_path: str) -> Dict[str, Any]:
+    caminho = caminho_manifesto(ods_path)
+    if not os.path.exists(caminho):
+        return {'ultima': None, 'exportacoes': {}}
+    with open(caminho, 'r', encoding='utf-8') as f:
+        dados = json.load(f)
+    if 'exportacoes' not in dados:
+        # Arquivo de antes dos manifestos por id: um manifesto só
+        return {'ultima': dados['export_id'], 'exportacoes': {dados['export_id']: dados}}
+    return dados
+
+
+def _gravar(ods_path: str, manifesto: Dict[str, Any], ultima: bool = True):
+    """Grava o manifesto no arquivo, ao lado dos das outras exportações (chamar sob o lock da planilha)"""
+    dados = _carregar_todos(ods_path)
+    exportacoes = dados['exportacoes']
+    exportacoes[manifesto['export_id']] = manifesto
+    if ultima:
+        dados['ultima'] = manifesto['export_id']
+    if len(exportacoes) > MAX_MANIFESTOS:
+        antigas = sorted(exportacoes, key=lambda i: exportacoes[i]['criado_em'])[:len(exportacoes) - MAX_MANIFESTOS]
+        for export_id in antigas:
+            if export_id != dados['ultima']:
+                del exportacoes[export_id]
+
+    destino = caminho_manifesto(ods_path)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(destino)), prefix='.tmp_')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, ensure_ascii=False, indent=1)
+    copiar_permissoes(destino, temp_path)
+    os.replace(temp_path, destino)
+
+
+@medido('manifesto')
+def gerar_manifesto(ods_path: str, linhas_formatadas: List[Any], export_id: Optional[str] = None,
+                    content_xml: Optional[bytes] = None, linha_inicio: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Grava o manifesto da exportação que acabou de ser escrita em ods_path
+
+    Chamado de dentro da escrita travada (apos_gravar de reescrever_ods ou da
+    fila), com o content.xml que foi gravado: outro escritor não tem como
+    mexer no arquivo entre a gravação e o manifesto.
+
+    Args:
+        ods_path (str): Planilha já gravada
+        linhas_formatadas (list): Linhas que a exportação inseriu
+        export_id (str): Identificador da exportação (padrão: 128 bits aleatórios em hex)
+        content_xml (bytes): content.xml gravado (padrão: CRC lido do diretório central)
+        linha_inicio (int): Linha da planilha (1-indexed) onde o bloco foi gravado
+
+    Returns:
+        dict: O manifesto gravado
+    """
+    manifesto = {
+        'export_id': export_id or os.urandom(16).hex(),
+        'criado_em': datetime.now().isoformat(),
+        'row_count': len(linhas_formatadas),
+        'linha_inicio': linha_inicio,
+        'blocos': hashes_por_bloco(linhas_formatadas),
+        'content_xml': _info_content_xml(ods_path, content_xml)
+    }
+    _gravar(ods_path, manifesto)
+    return manifesto
+
+
+def carregar_manifesto(ods_path: str, export_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Manifesto da exportação 'export_id' (padrão: a última gravada), ou None"""
+    dados = _carregar_todos(ods_path)
+    return dados['exportacoes'].get(export_id or dados['ultima'])
+
+
+def verificar_rapido(ods_path: str, manifesto: Optional[Dict[str, Any]] = None) -> bool:
+    """Confere só o CRC e o tamanho do content.xml no diretório central do ZIP"""
+    manifesto = manifesto or carregar_manifesto(ods_path)
+    if manifesto is None:
+        return False
+    return _info_content_xml(ods_path) == manifesto['content_xml']
+
+
+def verificar_completo(ods_path: str, manifesto: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    Procura a sequência de blocos do manifesto na planilha, em uma passada
+
+    Cada candidato (linha igual à cabeça do primeiro bloco) mantém só um hash
+    incremental, então a memória não depende do tamanho dos blocos. Com
+    'linha_inicio' no manifesto, só vale a sequência que começa nessa linha:
+    um bloco igual gravado por outra exportação não conta.
+    """
+    manifesto = manifesto or carregar_manifesto(ods_path)
+    if manifesto is None:
+        return False
+    blocos = manifesto['blocos']
+    if not blocos:
+        return True
+
+    primeira_cabeca = tuple(blocos[0]['cabeca'])
+    linha_inicio = manifesto.get('linha_inicio')
+    candidatos = []
+    for posicao, celulas in iterar_linhas(ods_path):
+        if linha_inicio is not None and posicao > linha_inicio and not candidatos:
+            return False
+        if tuple(celulas) == primeira_cabeca and (linha_inicio is None or posicao == linha_inicio):
+            candidatos.append({'bloco': 0, 'lidas': 0, 'hasher': hashlib.sha256()})
+
+        sobreviventes = []
+        for candidato in candidatos:
+            bloco = blocos[candidato['bloco']]
+            _hash_linha(candidato['hasher'], celulas)
+            candidato['lidas'] += 1
+            if candidato['lidas'] < bloco['linhas']:
+                sobreviventes.append(candidato)
+                continue
+            if candidato['hasher'].hexdigest() != bloco['hash']:
+                continue
+            if candidato['bloco'] + 1 == len(blocos):
+                return True
+            candidato.update({'bloco': candidato['bloco'] + 1, 'lidas': 0, 'hasher': hashlib.sha256()})
+            sobreviventes.append(candidato)
+        candidatos = sobreviventes
+
+    return False
+
+
+def verificar(ods_path: str, rapido: bool = True, export_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Verifica uma exportação registrada no manifesto
+
+    Com 'rapido', tenta primeiro o CRC do diretório central e só percorre a
+    planilha se ele não conferir. Quando a verificação completa confirma os
+    blocos, o CRC do manifesto é atualizado para a próxima verificação rápida.
+
+    Args:
+        export_id (str): Exportação conferida (padrão: a última gravada)
+
+    Returns:
+        dict: 'ok', 'modo' ('rapido', 'completo' ou 'sem_manifesto') e 'export_id'
+    """
+    manifesto = carregar_manifesto(ods_path, export_id)
+    if manifesto is None:
+        return {'ok': False, 'modo': 'sem_manifesto', 'export_id': export_id}
+
+    if rapido and verificar_rapido(ods_path, manifesto):
+        return {'ok': True, 'modo': 'rapido', 'export_id': manifesto['export_id']}
+
+    # Sob o lock: o CRC atualizado é o da planilha que acabou de ser conferida
+    with lock_arquivo(ods_path):
+        ok = verificar_completo(ods_path, manifesto)
+        if ok:
+            manifesto['content_xml'] = _info_content_xml(ods_path)
+            _gravar(ods_path, manifesto, ultima=False)
+    return {'ok': ok, 'modo': 'completo', 'export_id': manifesto['export_id']}
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Verificação de exportações ODS pelo manifesto')
+    parser.add_argument('comando', choices=['verify'], help='Ação')
+    parser.add_argument('--file', '-f', required=True, help='Caminho do arquivo ODS')
+    parser.add_argument('--fast', action='store_true', help='Conferir primeiro só o CRC do diretório central')
+    parser.add_argument('--id', dest='export_id', help='Exportação conferida (padrão: a última gravada)')
+
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.file):
+        print(f"❌ Arquivo não encontrado: {args.file}")
+        return 1
+
+    resultado = verificar(args.file, rapido=args.fast, export_id=args.export_id)
+    if resultado['modo'] == 'sem_manifesto':
+        alvo = f" da exportação {args.export_id}" if args.export_id else ""
+        print(f"❌ Manifesto{alvo} não encontrado: {caminho_manifesto(args.file)}")
+    elif resultado['ok']:
+        print(f"✅ Exportação {resultado['export_id']} confere (verificação {resultado['modo']})")
+    else:
+        print(f"❌ Exportação {resultado['export_id']} não confere (verificação {resultado['modo']})")
+    return 0 if resultado['ok'] else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Instrumentação das etapas da exportação
+Mede cada etapa do pipeline (HTTP, cálculo dos períodos, montagem do XML,
+serialização, zip): tempo de relógio e de CPU, pico de memória pelo
+tracemalloc e contagens (linhas, requisições, bytes). Cada etapa concluída
+vira uma linha JSON; no fim sai uma tabela de resumo por etapa.
+
+A CPU é a da thread que executou a etapa (time.thread_time): etapas de
+exportações concorrentes não somam a CPU umas das outras, e o trabalho que a
+etapa entrega a outras threads (compressão paralela) fica de fora. O pico do
+tracemalloc é do processo inteiro, então só é medido em etapas que rodaram
+sem etapa aberta em outra thread; nas demais, 'pico_kb' fica de fora.
+
+Desligada por padrão: etapa() devolve um contexto vazio compartilhado e
+contar() retorna na primeira linha, então o custo é uma checagem de flag.
+
+Ligar:
+    ODS_INSTRUMENTAR=1 python script.py            JSON lines em stderr
+    ODS_INSTRUMENTAR=etapas.jsonl python script.py  JSON lines no arquivo
+    python ods_cli.py --instrumentar [ARQUIVO] export ...
+    ODS_INSTRUMENTAR_MEMORIA=0                      sem tracemalloc (tempos mais fiéis)
+
+Uso no código:
+    with etapa('xml') as e:
+        ...
+        e.contar(linhas=len(linhas))
+
+    @medido('periodos')
+    def processar(...): ...
+"""
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, TextIO
+
+_ativo = False
+_memoria = False
+_saida: Optional[TextIO] = None
+_lock = threading.Lock()
+_local = threading.local()
+_registros: List[Dict[str, Any]] = []
+# Etapas abertas por thread (ident) e quantas vezes uma etapa abriu com outra
+# thread no meio de uma etapa: o pico de memória dessas etapas não é só delas
+_abertas: Dict[int, int] = {}
+_sobreposicoes = 0
+
+
+class _EtapaNula:
+    """Contexto usado com a instrumentação desligada"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def contar(self, **contagens):
+        pass
+
+
+_NULA = _EtapaNula()
+
+
+class _Etapa:
+    __slots__ = ('nome', 'atributos', 'contagens', 'pai', '_inicio', '_cpu', '_mem_inicio',
+                 '_pico_filhos', '_wall_filhos', '_sobreposicoes')
+
+    def __init__(self, nome: str, atributos: Dict[str, Any]):
+        self.nome = nome
+        self.atributos = atributos
+        self.contagens: Dict[str, int] = {}
+        self.pai: Optional['_Etapa'] = None
+        self._wall_filhos = 0.0
+        self._pico_filhos = 0
+
+    def contar(self, **contagens):
+        for nome, valor in contagens.items():
+            self.contagens[nome] = self.contagens.get(nome, 0) + valor
+
+    def __enter__(self):
+        pilha = _pilha()
+        self.pai = pilha[-1] if pilha else None
+        pilha.append(self)
+        self._mem_inicio = None
+        if _memoria:
+            import tracemalloc
+            global _sobreposicoes
+            eu = threading.get_ident()
+            with _lock:
+                sozinha = all(thread == eu for thread in _abertas)
+                if not sozinha:
+                    _sobreposicoes += 1
+                _abertas[eu] = _abertas.get(eu, 0) + 1
+                self._sobreposicoes = _sobreposicoes
+            if sozinha:
+                # reset_peak zera o pico do processo: com etapas abertas em outra
+                # thread, apagaria o delas (e o desta mediria o delas)
+                atual, pico = tracemalloc.get_traced_memory()
+                if self.pai is not None:
+                    # reset_peak apaga o pico do pai: guarda-o antes
+                    self.pai._pico_filhos = max(self.pai._pico_filhos, pico)
+                tracemalloc.reset_peak()
+                self._mem_inicio = atual
+        self._cpu = time.thread_time()
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, exc, tb):
+        wall = time.perf_counter() - self._inicio
+        cpu = time.thread_time() - self._cpu
+        pilha = _pilha()
+        if pilha and pilha[-1] is self:
+            pilha.pop()
+
+        registro = {
+            'etapa': self.nome,
+            'pai': self.pai.nome if self.pai is not None else None,
+            'wall_ms': round(wall * 1000, 3),
+            'proprio_ms': round((wall - self._wall_filhos) * 1000, 3),
+            'cpu_ms': round(cpu * 1000, 3),
+        }
+        if _memoria:
+            import tracemalloc
+            eu = threading.get_ident()
+            with _lock:
+                _abertas[eu] -= 1
+                if not _abertas[eu]:
+                    del _abertas[eu]
+                sozinha = self._sobreposicoes == _sobreposicoes
+            if sozinha and self._mem_inicio is not None:
+                _, pico = tracemalloc.get_traced_memory()
+                pico = max(pico, self._pico_filhos)
+                registro['pico_kb'] = round((pico - self._mem_inicio) / 1024, 1)
+                if self.pai is not None:
+                    self.pai._pico_filhos = max(self.pai._pico_filhos, pico)
+        if self.pai is not None:
+            self.pai._wall_filhos += wall
+        registro.update(self.contagens)
+        registro.update(self.atributos)
+        if tipo is not None:
+            registro['erro'] = tipo.__name__
+        _emitir(registro)
+        return False
+
+
+def _pilha() -> List[_Etapa]:
+    pilha = getattr(_local, 'pilha', None)
+    if pilha is None:
+        pilha = _local.pilha = []
+    return pilha
+
+
+def _emitir(registro: Dict[str, Any]):
+    linha = json.dumps(registro, ensure_ascii=False, default=str)
+    with _lock:
+        _registros.append(registro)
+        if _saida is not None:
+            _saida.write(linha + '\n')
+            _saida.flush()
+
+
+def ativo() -> bool:
+    return _ativo
+
+
+def etapa(nome: str, **atributos):
+    """Contexto que mede uma etapa; atributos extras vão para a linha JSON"""
+    if not _ativo:
+        return _NULA
+    return _Etapa(nome, atributos)
+
+
+def contar(**contagens):
+    """Soma contagens (linhas=..., bytes=...) à etapa em andamento nesta thread"""
+    if not _ativo:
+        return
+    pilha = _pilha()
+    if pilha:
+        pilha[-1].contar(**contagens)
+
+
+def medido(nome: str):
+    """Decorador: mede cada chamada da função como a etapa 'nome'"""
+    def decorador(funcao: Callable) -> Callable:
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            if not _ativo:
+                return funcao(*args, **kwargs)
+            with _Etapa(nome, {}):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+
+def ativar(saida: Optional[str] = '-', memoria: bool = True, resumo_ao_sair: bool = True):
+    """
+    Liga a instrumentação
+
+    Args:
+        saida (str): Arquivo onde acrescentar as linhas JSON ('-' = stderr; None =
+            só guardar os registros, para quem lê registros() e resumo())
+        memoria (bool): Medir o pico de memória com tracemalloc (deixa tudo mais lento)
+        resumo_ao_sair (bool): Imprimir o resumo em stderr quando o processo terminar
+    """
+    global _ativo, _memoria, _saida
+    if _ativo:
+        return
+    if saida is None:
+        _saida = None
+    elif saida not in ('-', '1'):
+        _saida = open(saida, 'a', encoding='utf-8')
+    else:
+        _saida = sys.stderr
+    if memoria:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+    _memoria = memoria
+    _ativo = True
+    if resumo_ao_sair:
+        atexit.register(imprimir_resumo)
+
+
+def desativar():
+    global _ativo, _memoria, _saida
+    _ativo = False
+    if _memoria:
+        import tracemalloc
+        tracemalloc.stop()
+    _memoria = False
+    if _saida is not None and _saida is not sys.stderr:
+        _saida.close()
+    _saida = None
+
+
+def limpar():
+    """Descarta os registros acumulados (entre rodadas de um benchmark)"""
+    with _lock:
+        _registros.clear()
+
+
+def registros() -> List[Dict[str, Any]]:
+    with _lock:
+        return list(_registros)
+
+
+def resumo() -> List[Dict[str, Any]]:
+    """Totais por etapa, na ordem em que cada etapa apareceu pela primeira vez"""
+    por_etapa: Dict[str, Dict[str, Any]] = {}
+    for registro in registros():
+        total = por_etapa.setdefault(registro['etapa'], {
+            'etapa': registro['etapa'], 'vezes': 0, 'wall_ms': 0.0, 'proprio_ms': 0.0,
+            'cpu_ms': 0.0, 'pico_kb': None, 'contagens': {},
+        })
+        total['vezes'] += 1
+        for campo in ('wall_ms', 'proprio_ms', 'cpu_ms'):
+            total[campo] += registro[campo]
+        if 'pico_kb' in registro:
+            total['pico_kb'] = max(total['pico_kb'] or 0, registro['pico_kb'])
+        for nome, valor in registro.items():
+            if nome not in ('etapa', 'pai', 'wall_ms', 'proprio_ms', 'cpu_ms', 'pico_kb', 'erro') \
+                    and isinstance(valor, int) and not isinstance(valor, bool):
+                total['contagens'][nome] = total['contagens'].get(nome, 0) + valor
+    return list(por_etapa.values())
+
+
+def imprimir_resumo(arquivo: Optional[TextIO] = None):
+    """Tabela com o total de cada etapa (proprio = sem as etapas internas)"""
+    linhas = resumo()
+    if not linhas:
+        return
+    arquivo = arquivo or sys.stderr
+    print("\n⏱️  Etapas (ms)", file=arquivo)
+    print(f"  {'etapa':<14}{'vezes':>6}{'wall':>11}{'proprio':>11}{'cpu':>11}{'pico KB':>11}  contagens",
+          file=arquivo)
+    for total in linhas:
+        pico = '' if total['pico_kb'] is None else f"{total['pico_kb']:.1f}"
+        contagens = ' '.join(f"{k}={v}" for k, v in total['contagens'].items())
+        print(f"  {total['etapa']:<14}{total['vezes']:>6}{total['wall_ms']:>11.2f}{total['proprio_ms']:>11.2f}"
+              f"{total['cpu_ms']:>11.2f}{pico:>11}  {contagens}", file=arquivo)
+
+
+if os.environ.get('ODS_INSTRUMENTAR'):
+    ativar(os.environ['ODS_INSTRUMENTAR'], memoria=os.environ.get('ODS_INSTRUMENTAR_MEMORIA', '1') != '0')
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+API local no lugar do Next.js
+Atende os endpoints /api/... que os integradores consultam com os dados do
+gerador de carga (ods_workload), para rodar o pipeline completo sem a
+aplicação no ar.
+
+Para testes de carga, cada resposta pode ter latência (com jitter), falhar
+com HTTP 500/503, derrubar a conexão sem responder ou vir comprimida em gzip.
+As falhas são sorteadas com a semente, então se repetem entre execuções.
+O /__stats conta requisições, conexões abertas, falhas e bytes, para medir
+o efeito do pooling e das novas tentativas do cliente.
+
+Uso:
+    python ods_mock_api.py [--port 3001] [--servidores 200] [--janelas 1] [--semente 42]
+                           [--latencia 20] [--jitter 10] [--erros 0.02] [--desconexoes 0.01]
+                           [--gzip] [--sem-keepalive]
+    python ods_cli.py export --source api --api http://127.0.0.1:3001 [...]
+
+Endpoints:
+    GET /api/supervisor/janelas-operacionais
+    GET /api/unified/operacoes?janela_id=N
+    GET /api/agendamento/operacoes/<id>/participacoes
+    GET /__stats
+"""
+
+import gzip
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from ods_workload import GeradorCarga, adicionar_opcoes_escala, gerador_dos_args
+
+PORTA_PADRAO = 3001
+# Respostas menores que isso não compensam o gzip
+MINIMO_GZIP = 256
+
+
+class Falhas:
+    """Latência, erros, desconexões e compressão das respostas"""
+
+    def __init__(self, latencia_ms: float = 0, jitter_ms: float = 0, erros: float = 0,
+                 desconexoes: float = 0, gzip_nivel: Optional[int] = None, keepalive: bool = True,
+                 semente: int = 42):
+        """
+        Args:
+            latencia_ms (float): Atraso de cada resposta
+            jitter_ms (float): Variação uniforme de até ± jitter_ms sobre a latência
+            erros (float): Fração das requisições respondidas com 500 ou 503
+            desconexoes (float): Fração das requisições em que a conexão cai sem resposta
+            gzip_nivel (int): Comprimir as respostas com esse nível quando o cliente
+                aceitar gzip (None = nunca)
+            keepalive (bool): False responde com 'Connection: close'
+            semente (int): Semente do sorteio das falhas e do jitter
+        """
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self.erros = erros
+        self.desconexoes = desconexoes
+        self.gzip_nivel = gzip_nivel
+        self.keepalive = keepalive
+        self._rng = random.Random(f"{semente}:falhas")
+        self._lock = threading.Lock()
+
+    def sortear(self):
+        """(atraso em segundos, falha): falha é 'desconexao', 500, 503 ou None"""
+        with self._lock:
+            atraso = self.latencia_ms + (self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0)
+            sorteio = self._rng.random()
+        falha = None
+        if sorteio < self.desconexoes:
+            falha = 'desconexao'
+        elif sorteio < self.desconexoes + self.erros:
+            # Metade de cada: o sorteio já é uniforme dentro da faixa de erros
+            falha = 500 if sorteio < self.desconexoes + self.erros / 2 else 503
+        return max(0.0, atraso) / 1000, falha
+
+
+class Estatisticas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requisicoes = 0
+        self.conexoes = 0
+        self.erros = 0
+        self.desconexoes = 0
+        self.bytes_enviados = 0
+        self.bytes_sem_compressao = 0
+
+    def somar(self, **valores):
+        with self._lock:
+            for nome, valor in valores.items():
+                setattr(self, nome, getattr(self, nome) + valor)
+
+    def como_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return {nome: getattr(self, nome) for nome in ('requisicoes', 'conexoes', 'erros', 'desconexoes',
+                                                           'bytes_enviados', 'bytes_sem_compressao')}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    gerador: GeradorCarga = None
+    falhas: Falhas = None
+    estatisticas: Estatisticas = None
+    lock: threading.Lock = None
+    protocol_version = 'HTTP/1.1'
+    # Cabeçalhos e corpo saem em dois write(): com Nagle, o keep-alive esperaria
+    # o ACK atrasado do cliente (~40 ms) a cada resposta
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.estatisticas.somar(conexoes=1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status: int, dados: Dict[str, Any]):
+        corpo = json.dumps(dados, ensure_ascii=False).encode('utf-8')
+        tamanho_original = len(corpo)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if (self.falhas.gzip_nivel is not None and len(corpo) >= MINIMO_GZIP
+                and 'gzip' in self.headers.get('Accept-Encoding', '')):
+            corpo = gzip.compress(corpo, self.falhas.gzip_nivel)
+            self.send_header('Content-Encoding', 'gzip')
+        if status == 503:
+            self.send_header('Retry-After', '1')
+        if not self.falhas.keepalive:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+        self.estatisticas.somar(bytes_enviados=len(corpo), bytes_sem_compressao=tamanho_original)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/__stats':
+            self._json(200, self.estatisticas.como_dict())
+            return
+
+        self.estatisticas.somar(requisicoes=1)
+        atraso, falha = self.falhas.sortear()
+        if atraso:
+            time.sleep(atraso)
+        if falha == 'desconexao':
+            # Fecha sem responder: o cliente vê RemoteDisconnected/ConnectionReset
+            self.estatisticas.somar(desconexoes=1)
+            self.close_connection = True
+            return
+        if falha is not None:
+            self.estatisticas.somar(erros=1)
+            self._json(falha, {'success': False, 'error': 'falha injetada'})
+            return
+
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        # O gerador guarda caches (operações, índice da janela): uma consulta por vez
+        with self.lock:
+            status, dados = self.gerador.responder(url.path, params)
+        self._json(status, dados)
+
+
+def criar_servidor(gerador: GeradorCarga, porta: int = PORTA_PADRAO,
+                   falhas: Optional[Falhas] = None) -> ThreadingHTTPServer:
+    """
+    Servidor em 127.0.0.1:porta (porta 0 = uma livre, em servidor.server_address)
+
+    As contagens ficam em servidor.estatisticas.
+    """
+    estatisticas = Estatisticas()
+    handler = type('Handler', (_Handler,), {
+        'gerador': gerador,
+        'falhas': falhas or Falhas(),
+        'estatisticas': estatisticas,
+        'lock': threading.Lock(),
+    })
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), handler)
+    servidor.daemon_threads = True
+    servidor.estatisticas = estatisticas
+    return servidor
+
+
+def iniciar_em_thread(gerador: GeradorCarga, falhas: Optional[Falhas] = None):
+    """Sobe o servidor numa porta livre em segundo plano; devolve (servidor, url base)"""
+    servidor = criar_servidor(gerador, 0, falhas)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}"
+
+
+def servir(gerador: GeradorCarga, porta: int = PORTA_PADRAO, falhas: Optional[Falhas] = None) -> int:
+    servidor = criar_servidor(gerador, porta, falhas)
+    falhas = servidor.RequestHandlerClass.falhas
+    print(f"🚀 API local em http://127.0.0.1:{servidor.server_address[1]} "
+          f"({gerador.num_servidores} servidores, {gerador.num_janelas} janelas, semente {gerador.semente})")
+    if falhas.latencia_ms or falhas.jitter_ms or falhas.erros or falhas.desconexoes:
+        print(f"🐢 Latência {falhas.latencia_ms:g}±{falhas.jitter_ms:g} ms, erros {falhas.erros:.1%}, "
+              f"desconexões {falhas.desconexoes:.1%}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n👋 Encerrando API local: {servidor.estatisticas.como_dict()}")
+    finally:
+        servidor.server_close()
+    return 0
+
+
+def adicionar_opcoes_falhas(parser):
+    parser.add_argument('--latencia', type=float, default=0, help='Latência de cada resposta, em ms')
+    parser.add_argument('--jitter', type=float, default=0, help='Variação da latência (±ms)')
+    parser.add_argument('--erros', type=float, default=0, help='Fração de respostas 500/503')
+    parser.add_argument('--desconexoes', type=float, default=0, help='Fração de conexões derrubadas sem resposta')
+    parser.add_argument('--gzip', type=int, nargs='?', const=6, help='Comprimir respostas (nível, padrão 6)')
+    parser.add_argument('--sem-keepalive', action='store_true', help="Responder com 'Connection: close'")
+
+
+def opcoes_falhas(args) -> Dict[str, Any]:
+    """Argumentos de Falhas a partir das opções de adicionar_opcoes_falhas (e --semente)"""
+    return {'latencia_ms': args.latencia, 'jitter_ms': args.jitter, 'erros': args.erros,
+            'desconexoes': args.desconexoes, 'gzip_nivel': args.gzip,
+            'keepalive': not args.sem_keepalive, 'semente': args.semente}
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='API local com dados sintéticos')
+    adicionar_opcoes_escala(parser)
+    adicionar_opcoes_falhas(parser)
+    parser.add_argument('--port', type=int, default=PORTA_PADRAO, help='Porta em 127.0.0.1')
+    args = parser.parse_args(argv)
+    return servir(gerador_dos_args(args), args.port, Falhas(**opcoes_falhas(args)))
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -5,29 +5,38 @@ Ferramenta determinística para modificação de arquivos ODS
 Permite adicionar texto em qualquer linha/coluna específica
 """
 
+import copy
 import zipfile
-import xml.etree.ElementTree as ET
 import os
-import shutil
 from tempfile import TemporaryDirectory
 import argparse
 from datetime import datetime
+from ods_backup_store import ODSBackupStore
+from ods_edit_journal import ODSEditJournal
+from ods_safe_writer import escrita_atomica, lock_arquivo
+from ods_stream_reader import ATTR_COLS_REPEATED, TAG_COVERED, celula_na_coluna, celulas_da_linha, ler_celula
+from ods_stream_writer import ODSZipStream, nivel_do_membro, obter_executor
+from ods_xml_backend import obter_backend
+
+XML = obter_backend()
 
 class ODSModifier:
-    def __init__(self, ods_path):
+    def __init__(self, ods_path, journal=False, compressao='default'):
         self.ods_path = ods_path
+        # Nível do deflate ao regravar: 'stored', 'fastest', 'default', 'smallest' ou 0-9
+        self.compressao = compressao
         self.namespaces = {
             'office': 'urn:oasis:names:tc:opendocument:xmlns:office:1.0',
             'table': 'urn:oasis:names:tc:opendocument:xmlns:table:1.0',
             'text': 'urn:oasis:names:tc:opendocument:xmlns:text:1.0'
         }
+        # Com o diário ativo, cada edição vira um registro pequeno no lugar de um backup completo
+        self.journal = ODSEditJournal(ods_path) if journal else None
     
     def create_backup(self):
-        """Cria backup do arquivo original"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = f"{self.ods_path}.backup_{timestamp}"
-        shutil.copy2(self.ods_path, backup_path)
-        return backup_path
+        """Cria backup do arquivo original no repositório deduplicado"""
+        manifesto = ODSBackupStore(self.ods_path).snapshot(rotulo='ODSModifier')
+        return manifesto['path']
     
     def add_text_to_cell(self, text, row, column=1, create_backup=True):
         """
@@ -37,16 +46,40 @@ class ODSModifier:
             text (str): Texto a ser adicionado
             row (int): Linha (1-indexed)
             column (int): Coluna (1-indexed)
-            create_backup (bool): Se deve criar backup
+            create_backup (bool): Se deve criar backup (ignorado com o diário ativo)
         
         Returns:
             str: Caminho do backup criado (se aplicável)
         """
         backup_path = None
-        if create_backup:
+        if create_backup and self.journal is None:
             backup_path = self.create_backup()
             print(f"📁 Backup criado: {os.path.basename(backup_path)}")
         
+        self.set_cells([(row, column, text)])
+        
+        return backup_path
+    
+    def set_cells(self, edicoes, registrar=True, esperados=None):
+        """
+        Aplica várias edições em uma única reescrita do arquivo
+        
+        Args:
+            edicoes (list): Tuplas (row, column, texto); texto None limpa a célula
+            registrar (bool): Se deve registrar as edições no diário (quando ativo)
+            esperados (dict): {(row, column): valor} conferido sob o lock antes de
+                editar; uma célula diferente cancela tudo com ValueError
+        
+        Returns:
+            list: Valores anteriores de cada célula, na mesma ordem
+        """
+        with lock_arquivo(self.ods_path):
+            if self.journal is not None:
+                self.journal.recarregar()
+            return self._set_cells(edicoes, registrar, esperados)
+    
+    def _set_cells(self, edicoes, registrar=True, esperados=None):
+        """set_cells com o lock do arquivo já tomado; 'esperados' é conferido antes de editar"""
         with TemporaryDirectory() as temp_dir:
             # Extrair arquivo ODS
             with zipfile.ZipFile(self.ods_path, 'r') as zip_ref:
@@ -54,17 +87,81 @@ class ODSModifier:
             
             # Modificar content.xml
             content_xml_path = os.path.join(temp_dir, 'content.xml')
-            self._modify_content_xml(content_xml_path, text, row, column)
+            antigos = self._modify_cells_xml(content_xml_path, edicoes, esperados)
             
             # Recriar arquivo ODS
             self._recreate_ods(temp_dir)
         
-        return backup_path
+        # Ainda sob o lock: o diário fica na ordem em que as edições chegaram à planilha
+        if self.journal is not None and registrar:
+            self.journal.registrar([
+                (row, column, antigo, text)
+                for (row, column, text), antigo in zip(edicoes, antigos)
+            ])
+        
+        return antigos
+    
+    def _pelo_diario(self, calcular, marcar=None, registrar=False):
+        """
+        Aplica edições calculadas pelo diário, sob o lock e conferindo antes
+
+        Cada célula alvo precisa ter o valor que o diário diz que ela tem agora;
+        se não tem (linhas inseridas ou removidas por fora do diário deslocaram
+        as posições, por exemplo), nada é gravado e sobe ValueError.
+
+        Args:
+            calcular: Função do diário que devolve as edições (row, column, valor)
+            marcar: Registro no diário depois de gravar (undo/redo), ainda sob o lock
+
+        Returns:
+            list: As edições aplicadas (o que 'calcular' devolveu, se não há nada a aplicar)
+        """
+        with lock_arquivo(self.ods_path):
+            self.journal.recarregar()
+            edicoes = calcular()
+            if not edicoes:
+                return edicoes
+            atuais = self.journal.valores_atuais()
+            esperados = {(row, column): atuais.get((row, column)) for row, column, _ in edicoes}
+            self._set_cells(edicoes, registrar=registrar, esperados=esperados)
+            if marcar is not None:
+                marcar()
+            return edicoes
+    
+    def undo(self):
+        """Desfaz o último grupo de edições registrado no diário"""
+        return self._pelo_diario(self.journal.proximo_desfazer, self.journal.marcar_desfeito) is not None
+    
+    def redo(self):
+        """Refaz o último grupo de edições desfeito"""
+        return self._pelo_diario(self.journal.proximo_refazer, self.journal.marcar_refeito) is not None
+    
+    def restore_to(self, instante):
+        """
+        Volta as células editadas ao estado que tinham em um instante
+        
+        A restauração é registrada como um novo grupo, então pode ser desfeita.
+        
+        Returns:
+            int: Quantidade de células restauradas
+        """
+        edicoes = self._pelo_diario(lambda: self.journal.edicoes_para_instante(instante), registrar=True)
+        return len(edicoes)
     
     def _modify_content_xml(self, content_xml_path, text, row, column):
         """Modifica o content.xml"""
-        tree = ET.parse(content_xml_path)
-        root = tree.getroot()
+        return self._modify_cells_xml(content_xml_path, [(row, column, text)])[0]
+    
+    def _modify_cells_xml(self, content_xml_path, edicoes, esperados=None):
+        """
+        Aplica as edições no content.xml e retorna os valores anteriores
+
+        'esperados' ({(row, column): valor}) é conferido antes de qualquer
+        alteração (sem espaços nas pontas); uma célula com outro valor cancela
+        tudo com ValueError.
+        """
+        with open(content_xml_path, 'rb') as f:
+            root = XML.fromstring(f.read())
         
         # Encontrar a tabela
         spreadsheet = root.find('.//office:body/office:spreadsheet', self.namespaces)
@@ -75,99 +172,187 @@ class ODSModifier:
         if table is None:
             raise ValueError("Tabela não encontrada")
         
-        # Garantir linhas suficientes
         rows = table.findall('table:table-row', self.namespaces)
-        while len(rows) < row:
-            new_row = ET.SubElement(table, f"{{{self.namespaces['table']}}}table-row")
-            rows.append(new_row)
         
-        # Pegar linha alvo
-        target_row_element = rows[row - 1]
+        divergentes = []
+        for (row, column), valor in sorted((esperados or {}).items()):
+            atual = self._texto_atual(rows[row - 1], column) if row <= len(rows) else None
+            if (atual or '').strip() != (valor or '').strip():
+                divergentes.append(f"({row}, {column}) esperado {valor!r}, encontrado {atual!r}")
+        if divergentes:
+            raise ValueError("A planilha mudou desde a leitura (linhas inseridas ou removidas?); "
+                             "nada foi gravado: " + '; '.join(divergentes[:5])
+                             + (f" e mais {len(divergentes) - 5}" if len(divergentes) > 5 else ''))
         
-        # Garantir células suficientes
-        cells = target_row_element.findall('table:table-cell', self.namespaces)
-        while len(cells) < column:
-            new_cell = ET.SubElement(target_row_element, f"{{{self.namespaces['table']}}}table-cell")
-            cells.append(new_cell)
+        antigos = []
         
-        # Modificar célula alvo
-        target_cell = cells[column - 1]
-        
-        # Limpar conteúdo existente
-        for child in list(target_cell):
-            target_cell.remove(child)
-        
-        # Adicionar novo texto
-        p_element = ET.SubElement(target_cell, f"{{{self.namespaces['text']}}}p")
-        p_element.text = text
-        
-        # Salvar XML modificado
-        tree.write(content_xml_path, encoding='utf-8', xml_declaration=True)
-    
-    def _recreate_ods(self, temp_dir):
-        """Recria o arquivo ODS"""
-        with zipfile.ZipFile(self.ods_path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
-            for root_dir, dirs, files in os.walk(temp_dir):
-                for file in files:
-                    file_path = os.path.join(root_dir, file)
-                    arc_name = os.path.relpath(file_path, temp_dir)
-                    zip_ref.write(file_path, arc_name)
-    
-    def read_cell(self, row, column=1):
-        """Lê o conteúdo de uma célula específica"""
-        with TemporaryDirectory() as temp_dir:
-            with zipfile.ZipFile(self.ods_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
-            
-            content_xml_path = os.path.join(temp_dir, 'content.xml')
-            tree = ET.parse(content_xml_path)
-            root = tree.getroot()
-            
-            spreadsheet = root.find('.//office:body/office:spreadsheet', self.namespaces)
-            if spreadsheet is None:
-                return None
-            
-            table = spreadsheet.find('.//table:table', self.namespaces)
-            if table is None:
-                return None
-            
-            rows = table.findall('table:table-row', self.namespaces)
-            if len(rows) < row:
-                return None
+        for row, column, text in edicoes:
+            # Garantir linhas suficientes
+            while len(rows) < row:
+                new_row = XML.SubElement(table, f"{{{self.namespaces['table']}}}table-row")
+                rows.append(new_row)
             
+            # Pegar linha alvo
             target_row_element = rows[row - 1]
-            cells = target_row_element.findall('table:table-cell', self.namespaces)
             
-            if len(cells) < column:
-                return None
+            # Célula alvo pela coluna lógica (a mesma do índice e de read_cell)
+            target_cell = self._celula_da_coluna(target_row_element, row, column)
             
-            target_cell = cells[column - 1]
+            # Guardar valor anterior (mesma regra de read_cell)
             p_elements = target_cell.findall('text:p', self.namespaces)
+            antigos.append(p_elements[0].text if p_elements and p_elements[0].text else None)
             
-            if p_elements and p_elements[0].text:
-                return p_elements[0].text
+            # Limpar conteúdo existente
+            for child in list(target_cell):
+                target_cell.remove(child)
             
+            # Adicionar novo texto
+            if text is not None:
+                p_element = XML.SubElement(target_cell, f"{{{self.namespaces['text']}}}p")
+                p_element.text = text
+        
+        # Conferir pela leitura que o índice usa, antes de gravar: cada texto
+        # tem que aparecer na coluna pedida (a última edição de cada célula)
+        for (row, column), text in {(r, c): t for r, c, t in edicoes}.items():
+            celulas = celulas_da_linha(rows[row - 1])
+            lido = celulas[column - 1] if len(celulas) >= column else ''
+            if lido != (text or ''):
+                raise ValueError(f"Célula ({row}, {column}) lida como {lido!r} depois da edição "
+                                 f"(esperado {text!r})")
+        
+        # Salvar XML modificado
+        with open(content_xml_path, 'wb') as f:
+            f.write(XML.tostring(root))
+        
+        return antigos
+    
+    def _texto_atual(self, row_element, column):
+        """Texto da célula pela regra de read_cell (primeiro text:p), sem alterar a linha"""
+        celula, _ = celula_na_coluna(row_element, column)
+        if celula is None:
             return None
+        p_elements = celula.findall('text:p', self.namespaces)
+        return p_elements[0].text if p_elements and p_elements[0].text else None
+    
+    def _celula_da_coluna(self, row_element, row, column):
+        """
+        Célula da coluna lógica 'column', sozinha em um elemento
 
-def main():
+        Uma célula com table:number-columns-repeated (as vazias que o
+        LibreOffice agrupa) é dividida em antes/alvo/depois; se a linha é mais
+        curta, recebe as células que faltam.
+        """
+        tag_cell = f"{{{self.namespaces['table']}}}table-cell"
+        celula, deslocamento = celula_na_coluna(row_element, column)
+        
+        if celula is None:
+            faltando = column - deslocamento - 1
+            if faltando:
+                vazias = XML.SubElement(row_element, tag_cell)
+                if faltando > 1:
+                    vazias.set(ATTR_COLS_REPEATED, str(faltando))
+            return XML.SubElement(row_element, tag_cell)
+        
+        if celula.tag == TAG_COVERED:
+            raise ValueError(f"Célula ({row}, {column}) está coberta por uma mesclagem")
+        
+        repeticoes = int(celula.get(ATTR_COLS_REPEATED, '1'))
+        if repeticoes == 1:
+            return celula
+        
+        indice = list(row_element).index(celula)
+        pedacos = []
+        for quantidade in (deslocamento, 1, repeticoes - deslocamento - 1):
+            if not quantidade:
+                pedacos.append(None)
+                continue
+            pedaco = copy.deepcopy(celula)
+            if quantidade > 1:
+                pedaco.set(ATTR_COLS_REPEATED, str(quantidade))
+            else:
+                del pedaco.attrib[ATTR_COLS_REPEATED]
+            pedacos.append(pedaco)
+        
+        row_element.remove(celula)
+        for pedaco in reversed([p for p in pedacos if p is not None]):
+            row_element.insert(indice, pedaco)
+        return pedacos[1]
+    
+    def _recreate_ods(self, temp_dir):
+        """Recria o arquivo ODS (substituição atômica; mimetype primeiro e sem compressão)"""
+        membros = []
+        for root_dir, dirs, files in os.walk(temp_dir):
+            for file in files:
+                file_path = os.path.join(root_dir, file)
+                arc_name = os.path.relpath(file_path, temp_dir).replace(os.sep, '/')
+                membros.append(arc_name)
+        membros.sort(key=lambda nome: nome != 'mimetype')
+        
+        def ler(arc_name):
+            with open(os.path.join(temp_dir, arc_name), 'rb') as f:
+                return f.read()
+        
+        # Todos os membros são comprimidos ao mesmo tempo no pool de threads
+        with escrita_atomica(self.ods_path) as f:
+            zip_stream = ODSZipStream(f)
+            zip_stream.adicionar_varios(
+                [(nome, ler(nome), nivel_do_membro(nome, padrao=self.compressao)) for nome in membros],
+                obter_executor()
+            )
+            zip_stream.fechar()
+    
+    def read_cell(self, row, column=1):
+        """Lê o conteúdo de uma célula específica (parse em streaming, para na linha alvo)"""
+        return ler_celula(self.ods_path, row, column)
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Ferramenta para modificar arquivos ODS')
     parser.add_argument('--file', '-f', required=True, help='Caminho do arquivo ODS')
-    parser.add_argument('--text', '-t', required=True, help='Texto a ser adicionado')
-    parser.add_argument('--row', '-r', type=int, required=True, help='Linha (1-indexed)')
+    parser.add_argument('--text', '-t', help='Texto a ser adicionado')
+    parser.add_argument('--row', '-r', type=int, help='Linha (1-indexed)')
     parser.add_argument('--column', '-c', type=int, default=1, help='Coluna (1-indexed, padrão: 1)')
     parser.add_argument('--no-backup', action='store_true', help='Não criar backup')
     parser.add_argument('--read', action='store_true', help='Apenas ler a célula especificada')
+    parser.add_argument('--journal', '-j', action='store_true',
+                        help='Registrar a edição no diário (<arquivo>.journal.jsonl) em vez de criar backup')
+    parser.add_argument('--undo', action='store_true', help='Desfazer a última edição do diário')
+    parser.add_argument('--redo', action='store_true', help='Refazer a última edição desfeita')
+    parser.add_argument('--restore-to', metavar='ISO', help='Restaurar as células editadas ao estado de um instante (ISO 8601)')
+    parser.add_argument('--compact', action='store_true', help='Compactar o diário')
+    parser.add_argument('--compression', choices=['stored', 'fastest', 'default', 'smallest'], default='default',
+                        help='Compressão ao regravar o arquivo (padrão: default)')
+    
+    args = parser.parse_args(argv)
     
-    args = parser.parse_args()
+    usa_diario = args.undo or args.redo or args.restore_to or args.compact
+    if not usa_diario and (args.row is None or (not args.read and args.text is None)):
+        parser.error('--row e --text são obrigatórios para editar (--row para --read)')
     
     if not os.path.exists(args.file):
         print(f"❌ Arquivo não encontrado: {args.file}")
         return 1
     
-    modifier = ODSModifier(args.file)
+    modifier = ODSModifier(args.file, journal=args.journal or usa_diario, compressao=args.compression)
     
     try:
-        if args.read:
+        if args.undo:
+            if modifier.undo():
+                print("↩️  Última edição desfeita")
+            else:
+                print("⚠️  Nada para desfazer")
+        elif args.redo:
+            if modifier.redo():
+                print("↪️  Edição refeita")
+            else:
+                print("⚠️  Nada para refazer")
+        elif args.restore_to:
+            restauradas = modifier.restore_to(datetime.fromisoformat(args.restore_to))
+            print(f"⏪ {restauradas} células restauradas para {args.restore_to}")
+        elif args.compact:
+            with lock_arquivo(args.file):
+                removidos = modifier.journal.compactar()
+            print(f"🗜️  Diário compactado: {removidos} registros removidos")
+        elif args.read:
             content = modifier.read_cell(args.row, args.column)
             if content:
                 print(f"📖 Conteúdo da célula ({args.row}, {args.column}): '{content}'")
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Exportação em várias folhas
+Em vez de um único bloco longo na primeira tabela, cada período (ou cada
+janela) vira uma folha própria, copiada da primeira tabela do modelo, e uma
+folha "Resumo" no fim lista as folhas com suas contagens.
+
+O content.xml é escrito em streaming: cada folha é montada só quando chega a
+vez dela, serializada e descartada, então a memória é a de uma folha por vez.
+Com folhas por janela, os dados da janela também só são buscados nessa hora.
+"""
+
+import copy
+import re
+import zipfile
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from ods_instrumentation import contar, medido
+from ods_stream_reader import celulas_da_linha
+from ods_stream_writer import NIVEL_PADRAO, ODSZipStream, abrir_modelo
+from ods_xml_backend import ODF_NAMESPACES, obter_backend
+
+XML = obter_backend()
+
+OFFICE_NS = ODF_NAMESPACES['office']
+TABLE_NS = ODF_NAMESPACES['table']
+TEXT_NS = ODF_NAMESPACES['text']
+
+TAG_BODY = f"{{{OFFICE_NS}}}body"
+TAG_SPREADSHEET = f"{{{OFFICE_NS}}}spreadsheet"
+TAG_TABLE = f"{{{TABLE_NS}}}table"
+TAG_COLUMN = f"{{{TABLE_NS}}}table-column"
+TAG_ROW = f"{{{TABLE_NS}}}table-row"
+TAG_CELL = f"{{{TABLE_NS}}}table-cell"
+TAG_P = f"{{{TEXT_NS}}}p"
+ATTR_NAME = f"{{{TABLE_NS}}}name"
+ATTR_ROWS_REPEATED = f"{{{TABLE_NS}}}number-rows-repeated"
+
+NOME_RESUMO = 'Resumo'
+# Limite do Excel; o LibreOffice aceita mais, mas assim a planilha abre nos dois
+MAX_NOME_FOLHA = 31
+# Linhas de uma folha no LibreOffice e no Excel: o que passa disso é descartado ao abrir
+MAX_LINHAS_FOLHA = 1048576
+
+# (nome da folha, função que devolve os dados {"periodos": [...]} dela)
+Folha = Tuple[str, Callable[[], Dict[str, Any]]]
+
+
+def linhas_do_periodo(periodo_data: Dict[str, Any]) -> Iterator[List[str]]:
+    """Linhas de um período no mesmo formato de format_diretoria_data_for_ods"""
+    yield [f"Período: {periodo_data['periodo']}", "", "", "", "", ""]
+    yield ["Servidor", "Matrícula", "Nº Viagem", "Conc?", "Rev?", "Obs."]
+    for servidor in periodo_data["servidores"]:
+        yield [
+            servidor["nome"],
+            servidor["matricula"],
+            servidor["nViagem"],
+            servidor["conc"],
+            servidor["rev"],
+            servidor["obs"]
+        ]
+    yield ["", "", "", "", "", ""]
+
+
+def nome_folha(texto: str, usados: set) -> str:
+    """Nome válido e único de folha (sem []*?:/\\ e com no máximo 31 caracteres)"""
+    base = re.sub(r"[\[\]*?:/\\']", '-', texto).strip() or 'Folha'
+    base = base[:MAX_NOME_FOLHA]
+    nome = base
+    contador = 2
+    while nome.lower() in usados:
+        sufixo = f" ({contador})"
+        nome = base[:MAX_NOME_FOLHA - len(sufixo)] + sufixo
+        contador += 1
+    usados.add(nome.lower())
+    return nome
+
+
+def folhas_por_periodo(diretoria_data: Dict[str, Any]) -> Iterator[Folha]:
+    """Uma folha por período dos dados já processados"""
+    for periodo_data in diretoria_data["periodos"]:
+        yield periodo_data['periodo'], (lambda p=periodo_data: {"periodos": [p]})
+
+
+def _nova_linha(celulas: List[str]):
+    linha = XML.Element(TAG_ROW)
+    for texto in celulas:
+        celula = XML.SubElement(linha, TAG_CELL, {f"{{{TABLE_NS}}}value-type": "string"})
+        paragrafo = XML.SubElement(celula, TAG_P)
+        paragrafo.text = str(texto)
+    return linha
+
+
+def _uris(root) -> set:
+    uris = set()
+    for elem in root.iter():
+        for nome in [elem.tag, *elem.attrib]:
+            if isinstance(nome, str) and nome.startswith('{'):
+                uris.add(nome[1:].split('}', 1)[0])
+    return uris
+
+
+def _nsmap(root) -> Dict[str, str]:
+    # ElementTree não guarda as declarações do original: declara no elemento
+    # raiz todos os namespaces que o documento usa
+    prefixos = {uri: prefixo for prefixo, uri in ODF_NAMESPACES.items()}
+    nsmap = {}
+    for uri in sorted(_uris(root)):
+        if uri == 'http://www.w3.org/XML/1998/namespace':
+            continue
+        prefixo = prefixos.get(uri) or f"ns{len(nsmap)}"
+        nsmap[prefixo] = uri
+    return nsmap
+
+
+def _tabela_modelo(spreadsheet, linhas_modelo: Optional[int]):
+    """
+    Cópia da primeira tabela do modelo, a base de cada folha
+
+    Linhas contam como no LibreOffice (table:number-rows-repeated expandido):
+    ficam as 'linhas_modelo' primeiras, nunca além do limite da folha. As
+    linhas vazias do fim (entre elas o preenchimento até a última linha da
+    folha que o LibreOffice grava) saem, para os dados entrarem logo depois
+    do conteúdo do modelo.
+    """
+    tabela = spreadsheet.find(TAG_TABLE)
+    if tabela is None:
+        raise ValueError("Planilha não encontrada no arquivo ODS")
+    modelo = copy.deepcopy(tabela)
+    limite = MAX_LINHAS_FOLHA if linhas_modelo is None else min(linhas_modelo, MAX_LINHAS_FOLHA)
+
+    posicao = 0
+    mantidas = []
+    for linha in [filho for filho in modelo if filho.tag == TAG_ROW]:
+        if posicao >= limite:
+            modelo.remove(linha)
+            continue
+        repeticoes = int(linha.get(ATTR_ROWS_REPEATED, '1'))
+        if posicao + repeticoes > limite:
+            repeticoes = limite - posicao
+            if repeticoes > 1:
+                linha.set(ATTR_ROWS_REPEATED, str(repeticoes))
+            else:
+                del linha.attrib[ATTR_ROWS_REPEATED]
+        posicao += repeticoes
+        mantidas.append(linha)
+
+    while mantidas and not celulas_da_linha(mantidas[-1]):
+        modelo.remove(mantidas.pop())
+    return modelo
+
+
+def _tabela_resumo(resumo: List[List[str]]):
+    tabela = XML.Element(TAG_TABLE, {ATTR_NAME: NOME_RESUMO})
+    XML.SubElement(tabela, TAG_COLUMN, {f"{{{TABLE_NS}}}number-columns-repeated": "4"})
+    for celulas in resumo:
+        tabela.append(_nova_linha(celulas))
+    return tabela
+
+
+def escrever_content_xml(root, saida, folhas: Iterable[Folha], linhas_modelo: Optional[int] = None,
+                         resumo: bool = True) -> Dict[str, Any]:
+    """
+    Escreve em 'saida' o content.xml com uma folha por item de 'folhas'
+
+    Tudo que vem antes e depois das tabelas no modelo (estilos, expressões
+    nomeadas etc.) é mantido; as tabelas do modelo dão lugar às folhas novas.
+
+    Returns:
+        dict: 'folhas' (nome, períodos, servidores e linhas de cada folha)
+    """
+    body = root.find(TAG_BODY)
+    spreadsheet = body.find(TAG_SPREADSHEET) if body is not None else None
+    if spreadsheet is None:
+        raise ValueError("Planilha não encontrada no arquivo ODS")
+    modelo = _tabela_modelo(spreadsheet, linhas_modelo)
+
+    estatisticas = []
+    usados = {NOME_RESUMO.lower()} if resumo else set()
+    with XML.xmlfile(saida) as xf:
+        xf.write_declaration()
+        with xf.element(root.tag, dict(root.attrib), nsmap=_nsmap(root)):
+            for filho in root:
+                if filho is not body:
+                    xf.write(filho)
+                    continue
+                with xf.element(body.tag, dict(body.attrib)):
+                    with xf.element(spreadsheet.tag, dict(spreadsheet.attrib)):
+                        antes = True
+                        for item in spreadsheet:
+                            if item.tag == TAG_TABLE:
+                                if antes:
+                                    antes = False
+                                    for titulo, carregar in folhas:
+                                        estatisticas.append(
+                                            _escrever_folha(xf, modelo, nome_folha(titulo, usados), carregar())
+                                        )
+                                    if resumo:
+                                        xf.write(_tabela_resumo(_linhas_resumo(estatisticas)))
+                                continue
+                            xf.write(item)
+    return {'folhas': estatisticas}
+
+
+def _escrever_folha(xf, modelo, nome: str, dados: Dict[str, Any]) -> Dict[str, Any]:
+    tabela = copy.deepcopy(modelo)
+    tabela.set(ATTR_NAME, nome)
+    # Logo depois da última linha do modelo: o que vem depois das linhas na
+    # tabela (expressões nomeadas, formatações condicionais) fica no fim
+    filhos = list(tabela)
+    posicao = max((i + 1 for i, filho in enumerate(filhos) if filho.tag in (TAG_ROW, TAG_COLUMN)), default=0)
+    linhas = 0
+    servidores = 0
+    for periodo_data in dados["periodos"]:
+        servidores += len(periodo_data["servidores"])
+        for celulas in linhas_do_periodo(periodo_data):
+            tabela.insert(posicao, _nova_linha(celulas))
+            posicao += 1
+            linhas += 1
+    xf.write(tabela)
+    return {'nome': nome, 'periodos': len(dados["periodos"]), 'servidores': servidores, 'linhas': linhas}
+
+
+def _linhas_resumo(estatisticas: List[Dict[str, Any]]) -> List[List[str]]:
+    linhas = [["Folha", "Períodos", "Servidores", "Linhas"]]
+    for folha in estatisticas:
+        linhas.append([folha['nome'], str(folha['periodos']), str(folha['servidores']), str(folha['linhas'])])
+    linhas.append(["Total",
+                   str(sum(f['periodos'] for f in estatisticas)),
+                   str(sum(f['servidores'] for f in estatisticas)),
+                   str(sum(f['linhas'] for f in estatisticas))])
+    return linhas
+
+
+@medido('folhas')
+def exportar_folhas(modelo: Union[str, bytes], saida: BinaryIO, folhas: Iterable[Folha],
+                    linhas_modelo: Optional[int] = None, resumo: bool = True,
+                    nivel: int = NIVEL_PADRAO, root=None) -> Dict[str, Any]:
+    """
+    Grava em 'saida' um ODS com uma folha por item de 'folhas' (e o resumo)
+
+    Args:
+        modelo: Caminho do ODS modelo ou seus bytes
+        saida: Objeto com write(); não precisa suportar seek()
+        folhas: (nome, função que devolve os dados) de cada folha, consumidos em ordem
+        linhas_modelo (int): Linhas da tabela do modelo mantidas no topo de cada
+            folha, contadas como no LibreOffice (padrão: todas, menos as vazias do fim)
+        resumo (bool): Acrescentar a folha "Resumo" no fim
+        root: content.xml do modelo já lido (não é alterado); padrão: lido do modelo
+
+    Returns:
+        dict: 'folhas' com as contagens de cada folha e 'bytes' gravados
+    """
+    with abrir_modelo(modelo) as origem:
+        with zipfile.ZipFile(origem, 'r') as zip_modelo:
+            itens = zip_modelo.infolist()
+            if root is None:
+                root = XML.fromstring(zip_modelo.read('content.xml'))
+            zip_stream = ODSZipStream(saida)
+
+            mimetype = next((i for i in itens if i.filename == 'mimetype'), None)
+            if mimetype is not None:
+                zip_stream.adicionar('mimetype', zip_modelo.read(mimetype), nivel=0, momento=mimetype.date_time)
+
+            resultado = None
+            for item in itens:
+                if item.filename == 'mimetype':
+                    continue
+                if item.filename == 'content.xml':
+                    with zip_stream.membro('content.xml', nivel) as membro:
+                        resultado = escrever_content_xml(root, membro, folhas, linhas_modelo, resumo)
+                    # A árvore do modelo não é mais necessária
+                    root = None
+                else:
+                    zip_stream.copiar(origem, item)
+
+            resultado['bytes'] = zip_stream.fechar()
+    contar(folhas=len(resultado['folhas']), bytes=resultado['bytes'])
+    return resultado
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache dos períodos de PORTARIA MOR por servidor
+Os períodos de um servidor só mudam quando mudam as datas das operações em
+que ele está confirmado. Cada servidor de uma janela fica guardado com a
+impressão digital (SHA-256) do seu conjunto de datas; na próxima execução,
+só quem teve a impressão alterada é recalculado.
+
+Estrutura do diretório (o mesmo --cache dos relatórios):
+    periodos/<janela>.json   {servidor: {"impressao": ..., "periodos": [[inicio, fim, dias], ...]}}
+
+O mtime de cada arquivo marca o último uso; arquivos de janelas que não são
+abertas há mais de max_idade_s (janelas encerradas, chaves antigas) são
+apagados na primeira janela aberta pelo cache.
+
+Uso:
+    cache = CachePeriodos('.ods_cache')
+    with cache.janela(janela_id) as janela:
+        periodos = janela.periodos(servidor_id, datas, integrador.calcular_periodos_consecutivos)
+    janela.relatar()
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional
+
+from ods_instrumentation import contar
+from ods_safe_writer import escrita_atomica
+
+SUBDIRETORIO = 'periodos'
+
+# Mudou calcular_periodos_consecutivos? Aumente: as entradas antigas são ignoradas
+VERSAO_PERIODOS = 1
+
+MAX_IDADE_PADRAO = 30 * 24 * 3600
+
+
+def impressao_datas(datas: List[str]) -> str:
+    """SHA-256 das datas ordenadas (repetições contam: mudam os períodos)"""
+    return hashlib.sha256('\n'.join(sorted(datas)).encode('utf-8')).hexdigest()
+
+
+class PeriodosJanela:
+    """Períodos dos servidores de uma janela durante uma execução"""
+
+    def __init__(self, caminho: Optional[str], entradas: Dict[str, Dict[str, Any]],
+                 cache: Optional['CachePeriodos'] = None):
+        self.caminho = caminho
+        self._entradas = entradas
+        self._cache = cache
+        self._vistos = set()
+        self._alterado = False
+        self.recalculados = 0
+        self.reaproveitados = 0
+
+    def periodos(self, servidor_id, datas: List[str],
+                 calcular: Callable[[List[str]], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Períodos do cache se as datas do servidor não mudaram; senão calcular(datas)"""
+        chave = str(servidor_id)
+        impressao = impressao_datas(datas)
+        self._vistos.add(chave)
+        entrada = self._entradas.get(chave)
+        if entrada is not None and entrada['impressao'] == impressao:
+            self.reaproveitados += 1
+            return [{'inicio': date.fromisoformat(inicio), 'fim': date.fromisoformat(fim), 'dias': dias}
+                    for inicio, fim, dias in entrada['periodos']]
+
+        periodos = calcular(datas)
+        self.recalculados += 1
+        self._entradas[chave] = {
+            'impressao': impressao,
+            'periodos': [[p['inicio'].isoformat(), p['fim'].isoformat(), p['dias']] for p in periodos],
+        }
+        self._alterado = True
+        return periodos
+
+    def salvar(self):
+        """Grava os períodos da janela (se algo mudou) e soma as contagens no cache"""
+        if self._cache is not None:
+            self._cache._somar(self.recalculados, self.reaproveitados)
+        if self.caminho is None:
+            return
+        # Servidores que saíram da janela não ficam no arquivo
+        removidos = set(self._entradas) - self._vistos
+        for chave in removidos:
+            del self._entradas[chave]
+        if self._alterado or removidos:
+            os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+            with escrita_atomica(self.caminho) as f:
+                f.write(json.dumps({'versao': VERSAO_PERIODOS, 'servidores': self._entradas},
+                                   ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    def relatar(self):
+        """Mostra e registra na instrumentação quantos servidores vieram do cache (se há cache)"""
+        if self._cache is None:
+            return
+        print(f"♻️ {self.reaproveitados} servidores reaproveitados do cache, {self.recalculados} recalculados")
+        contar(reaproveitados=self.reaproveitados, recalculados=self.recalculados)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, tb):
+        if tipo is None:
+            self.salvar()
+        return False
+
+
+class CachePeriodos:
+    """Períodos por (janela, servidor) em disco, um arquivo JSON por janela"""
+
+    def __init__(self, diretorio: str, max_idade_s: float = MAX_IDADE_PADRAO):
+        """
+        Args:
+            diretorio (str): Diretório do cache (os períodos ficam em diretorio/periodos)
+            max_idade_s (float): Arquivos sem uso há mais tempo que isso são apagados
+        """
+        self.diretorio = os.path.join(diretorio, SUBDIRETORIO)
+        self.max_idade_s = max_idade_s
+        self._lock = threading.Lock()
+        self._podado = False
+        self.recalculados = 0
+        self.reaproveitados = 0
+
+    def _caminho(self, janela) -> str:
+        nome = re.sub(r'[^\w.-]', '_', str(janela))
+        return os.path.join(self.diretorio, f"{nome}.json")
+
+    def janela(self, janela) -> 'PeriodosJanela':
+        """Períodos guardados da janela; gravados por salvar() ou ao sair do bloco 'with' sem erro"""
+        with self._lock:
+            if not self._podado:
+                self._podado = True
+                self.podar()
+        caminho = self._caminho(janela)
+        entradas = {}
+        try:
+            with open(caminho, 'rb') as f:
+                dados = json.loads(f.read().decode('utf-8'))
+            if dados.get('versao') == VERSAO_PERIODOS:
+                entradas = dados['servidores']
+            # Mesmo sem mudanças (nada é regravado), o arquivo continua em uso
+            os.utime(caminho)
+        except (FileNotFoundError, ValueError, KeyError):
+            # Sem cache ou cache ilegível: tudo é recalculado e o arquivo refeito
+            pass
+        return PeriodosJanela(caminho, entradas, self)
+
+    def podar(self) -> int:
+        """
+        Apaga os arquivos de janelas sem uso há mais de max_idade_s
+
+        Returns:
+            int: Quantidade de arquivos apagados
+        """
+        limite = time.time() - self.max_idade_s
+        removidos = 0
+        try:
+            nomes = os.listdir(self.diretorio)
+        except FileNotFoundError:
+            return 0
+        for nome in nomes:
+            if not nome.endswith('.json'):
+                continue
+            caminho = os.path.join(self.diretorio, nome)
+            try:
+                if os.stat(caminho).st_mtime < limite:
+                    os.remove(caminho)
+                    removidos += 1
+            except FileNotFoundError:
+                # Outro processo podou antes
+                continue
+        return removidos
+
+    def _somar(self, recalculados: int, reaproveitados: int):
+        with self._lock:
+            self.recalculados += recalculados
+            self.reaproveitados += reaproveitados
+
+    def estatisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {'recalculados': self.recalculados, 'reaproveitados': self.reaproveitados}
+
+
+def periodos_da_janela(cache: Optional[CachePeriodos], janela) -> PeriodosJanela:
+    """cache.janela(janela), ou um PeriodosJanela que só calcula quando não há cache"""
+    if cache is None:
+        return PeriodosJanela(None, {})
+    return cache.janela(janela)
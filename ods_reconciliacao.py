@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reconciliação da planilha com os períodos recalculados
+Quando as participações mudam, regenerar a planilha apaga o que foi
+preenchido à mão (Nº Viagem, Conc?, Rev?, Obs.). Aqui os blocos já gravados
+(lidos em streaming por ods_diretoria_blocos) são comparados com os períodos
+novos, e só as diferenças são aplicadas:
+
+    inserir    servidor novo no período (linha nova)
+    remover    servidor que saiu do período
+    mover      servidor que continua no período mas mudou de posição
+    renomear   mesma matrícula com outro nome
+
+Dentro de um período as linhas são casadas pela matrícula; as que ficam no
+lugar formam a maior subsequência crescente, então o número de movimentos é
+o mínimo. Linhas mantidas ou movidas são os mesmos elementos da planilha,
+com as colunas preenchidas intactas. Períodos novos viram blocos novos e
+períodos que sumiram têm o bloco removido.
+
+Tudo entra em uma única reescrita do arquivo; blocos sem mudança não são
+tocados.
+
+Uso:
+    python ods_reconciliacao.py --file ARQUIVO [--api URL] [--janela N] [--simular]
+    python ods_reconciliacao.py --file ARQUIVO --dados periodos.json [--simular]
+    python ods_reconciliacao.py --file ARQUIVO --mock [--simular]
+"""
+
+import bisect
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ods_diretoria_blocos import RegistroServidor, iterar_registros
+from ods_instrumentation import contar, medido
+from ods_multi_sheet import linhas_do_periodo
+from ods_safe_writer import reescrever_ods
+from ods_stream_reader import TAG_CELL, TAG_P, TAG_ROW, TAG_TABLE, TABLE_NS, celulas_da_linha
+from ods_xml_backend import obter_backend
+
+XML = obter_backend()
+
+
+def iterar_blocos(ods_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Blocos da planilha com suas linhas de servidor (memória de um bloco)
+
+    Yields:
+        dict: 'periodo', 'linha_periodo' e 'registros' (RegistroServidor)
+    """
+    bloco = None
+    for registro in iterar_registros(ods_path):
+        if bloco is None or registro.linha_periodo != bloco['linha_periodo']:
+            if bloco is not None:
+                yield bloco
+            bloco = {'periodo': registro.periodo, 'linha_periodo': registro.linha_periodo, 'registros': []}
+        bloco['registros'].append(registro)
+    if bloco is not None:
+        yield bloco
+
+
+def _chaves(valores: List[str]) -> List[Tuple[str, int]]:
+    # Valor repetido (matrícula no período, período na planilha): a n-ésima
+    # ocorrência casa com a n-ésima
+    vistas: Dict[str, int] = {}
+    chaves = []
+    for valor in valores:
+        vistas[valor] = vistas.get(valor, 0) + 1
+        chaves.append((valor, vistas[valor]))
+    return chaves
+
+
+def _maior_subsequencia_crescente(valores: List[int]) -> set:
+    """Índices de uma maior subsequência estritamente crescente (O(n log n))"""
+    caudas: List[int] = []
+    indices_caudas: List[int] = []
+    anterior = [-1] * len(valores)
+    for i, valor in enumerate(valores):
+        pos = bisect.bisect_left(caudas, valor)
+        if pos == len(caudas):
+            caudas.append(valor)
+            indices_caudas.append(i)
+        else:
+            caudas[pos] = valor
+            indices_caudas[pos] = i
+        anterior[i] = indices_caudas[pos - 1] if pos else -1
+    mantidos = set()
+    i = indices_caudas[-1] if indices_caudas else -1
+    while i != -1:
+        mantidos.add(i)
+        i = anterior[i]
+    return mantidos
+
+
+def diferenca_periodo(atuais: List[RegistroServidor], novos: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Edições mínimas que levam as linhas de um bloco aos servidores novos
+
+    Returns:
+        dict: 'ordem' (para cada servidor novo, a linha atual reaproveitada ou
+        None), 'inserir' [{'posicao', 'servidor'}], 'remover' [RegistroServidor],
+        'mover' [{'registro', 'posicao'}], 'renomear' [{'registro', 'nome'}] e
+        'mantidos' (linhas que ficam onde estão)
+    """
+    chaves_atuais = _chaves([r.matricula for r in atuais])
+    chaves_novas = _chaves([str(s['matricula']).strip() for s in novos])
+    posicao_nova = {k: i for i, k in enumerate(chaves_novas)}
+
+    # Linhas presentes nos dois lados, na ordem atual, com a posição nova
+    comuns = [(i, posicao_nova[k]) for i, k in enumerate(chaves_atuais) if k in posicao_nova]
+    ficam = _maior_subsequencia_crescente([nova for _, nova in comuns])
+
+    ordem: List[Optional[RegistroServidor]] = [None] * len(novos)
+    mover, renomear = [], []
+    for j, (i, nova) in enumerate(comuns):
+        registro = atuais[i]
+        ordem[nova] = registro
+        if j not in ficam:
+            mover.append({'registro': registro, 'posicao': nova})
+        nome = str(novos[nova]['nome']).strip()
+        if nome != registro.servidor:
+            renomear.append({'registro': registro, 'nome': nome})
+
+    casados = {i for i, _ in comuns}
+    return {
+        'ordem': ordem,
+        'inserir': [{'posicao': p, 'servidor': novos[p]} for p, registro in enumerate(ordem) if registro is None],
+        'remover': [r for i, r in enumerate(atuais) if i not in casados],
+        'mover': mover,
+        'renomear': renomear,
+        'mantidos': len(ficam),
+    }
+
+
+@medido('reconciliar')
+def planejar(ods_path: str, diretoria_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compara os blocos da planilha com os períodos novos
+
+    O k-ésimo bloco de um período na planilha corresponde ao k-ésimo período
+    com esse texto nos dados (normalmente há um só). A ordem dos blocos na
+    planilha não muda; períodos novos entram depois do bloco do período que
+    os precede nos dados.
+
+    Returns:
+        dict: 'blocos' (um por bloco da planilha: 'periodo', 'linha_periodo',
+        'linhas', 'acao' 'manter' | 'editar' | 'remover' e a diferença),
+        'novos' [{'periodo_data', 'apos'}] (apos = linha_periodo do bloco
+        anterior, ou None) e 'resumo' com as contagens
+    """
+    novos_por_chave: Dict[Tuple[str, int], Tuple[int, Dict[str, Any]]] = {}
+    for i, (periodo, k) in enumerate(_chaves([str(p['periodo']).strip() for p in diretoria_data['periodos']])):
+        novos_por_chave[(periodo, k)] = (i, diretoria_data['periodos'][i])
+
+    blocos = []
+    linha_do_novo: Dict[int, int] = {}
+    ocorrencias: Dict[str, int] = {}
+    for bloco in iterar_blocos(ods_path):
+        ocorrencias[bloco['periodo']] = ocorrencias.get(bloco['periodo'], 0) + 1
+        casado = novos_por_chave.get((bloco['periodo'], ocorrencias[bloco['periodo']]))
+        plano = {'periodo': bloco['periodo'], 'linha_periodo': bloco['linha_periodo'],
+                 'linhas': [r.linha for r in bloco['registros']],
+                 'matriculas': [r.matricula for r in bloco['registros']]}
+        if casado is None or not casado[1]['servidores']:
+            plano.update(acao='remover', remover=bloco['registros'])
+        else:
+            linha_do_novo[casado[0]] = bloco['linha_periodo']
+            diferenca = diferenca_periodo(bloco['registros'], casado[1]['servidores'])
+            mudou = diferenca['inserir'] or diferenca['remover'] or diferenca['mover'] or diferenca['renomear']
+            plano.update(diferenca, acao='editar' if mudou else 'manter')
+        blocos.append(plano)
+
+    novos = []
+    apos = None
+    for i, periodo_data in enumerate(diretoria_data['periodos']):
+        if i in linha_do_novo:
+            apos = linha_do_novo[i]
+        elif periodo_data['servidores']:
+            novos.append({'periodo_data': periodo_data, 'apos': apos})
+
+    resumo = {
+        'blocos_mantidos': sum(1 for b in blocos if b['acao'] == 'manter'),
+        'blocos_editados': sum(1 for b in blocos if b['acao'] == 'editar'),
+        'blocos_removidos': sum(1 for b in blocos if b['acao'] == 'remover'),
+        'blocos_novos': len(novos),
+        'inseridos': sum(len(b.get('inserir', [])) for b in blocos)
+                     + sum(len(n['periodo_data']['servidores']) for n in novos),
+        'removidos': sum(len(b.get('remover', [])) for b in blocos),
+        'movidos': sum(len(b.get('mover', [])) for b in blocos),
+        'renomeados': sum(len(b.get('renomear', [])) for b in blocos),
+    }
+    contar(**resumo)
+    return {'blocos': blocos, 'novos': novos, 'resumo': resumo}
+
+
+def tem_mudancas(plano: Dict[str, Any]) -> bool:
+    return bool(plano['novos']) or any(b['acao'] != 'manter' for b in plano['blocos'])
+
+
+def _linha_xml(celulas: List[str]):
+    linha = XML.Element(TAG_ROW)
+    for texto in celulas:
+        celula = XML.SubElement(linha, TAG_CELL, {f"{{{TABLE_NS}}}value-type": "string"})
+        XML.SubElement(celula, TAG_P).text = str(texto)
+    return linha
+
+
+def _renomear(linha, nome: str):
+    celula = next(c for c in linha if c.tag == TAG_CELL)
+    for filho in list(celula):
+        celula.remove(filho)
+    XML.SubElement(celula, TAG_P).text = nome
+
+
+def _aplicar(root, plano: Dict[str, Any]) -> int:
+    """Aplica o plano na raiz do content.xml; devolve as linhas tocadas"""
+    tabela = next(root.iter(TAG_TABLE))
+    filhos = list(tabela)
+    # Linha N da planilha (como no stream reader) -> índice entre os filhos da tabela
+    indice_linha = [i for i, filho in enumerate(filhos) if filho.tag == TAG_ROW]
+
+    def elemento(linha: int):
+        return filhos[indice_linha[linha - 1]]
+
+    def conferir(linha: int, matricula: str):
+        celulas = celulas_da_linha(elemento(linha))
+        if len(celulas) < 2 or celulas[1].strip() != matricula:
+            raise ValueError(f"A planilha mudou desde a leitura (linha {linha}); reconcilie de novo")
+
+    def fim_do_bloco(bloco) -> int:
+        # Índice depois da última linha do bloco, contando a linha em branco que o fecha
+        fim = indice_linha[bloco['linhas'][-1] - 1] + 1
+        if fim < len(filhos) and filhos[fim].tag == TAG_ROW and not celulas_da_linha(filhos[fim]):
+            fim += 1
+        return fim
+
+    # (início, fim, elementos): troca filhos[início:fim] por elementos
+    trocas: List[Tuple[int, int, list]] = []
+    tocadas = 0
+    por_linha_periodo = {}
+    for bloco in plano['blocos']:
+        por_linha_periodo[bloco['linha_periodo']] = bloco
+        for linha, matricula in zip(bloco['linhas'], bloco['matriculas']):
+            if bloco['acao'] != 'manter':
+                conferir(linha, matricula)
+        if bloco['acao'] == 'remover':
+            inicio, fim = indice_linha[bloco['linha_periodo'] - 1], fim_do_bloco(bloco)
+            trocas.append((inicio, fim, []))
+            tocadas += fim - inicio
+        elif bloco['acao'] == 'editar':
+            for item in bloco['renomear']:
+                _renomear(elemento(item['registro'].linha), item['nome'])
+            novos = [elemento(registro.linha) if registro is not None else None for registro in bloco['ordem']]
+            for item in bloco['inserir']:
+                s = item['servidor']
+                novos[item['posicao']] = _linha_xml([s['nome'], s['matricula'], s.get('nViagem', ''),
+                                                     s.get('conc', ''), s.get('rev', ''), s.get('obs', '')])
+            inicio = indice_linha[bloco['linhas'][0] - 1]
+            trocas.append((inicio, indice_linha[bloco['linhas'][-1] - 1] + 1, novos))
+            tocadas += len(bloco['inserir']) + len(bloco['remover']) + len(bloco['mover']) + len(bloco['renomear'])
+
+    # Blocos novos, agrupados pelo ponto de inserção
+    insercoes: Dict[int, list] = {}
+    primeiro = plano['blocos'][0]['linha_periodo'] if plano['blocos'] else None
+    for novo in plano['novos']:
+        if novo['apos'] is not None:
+            posicao = fim_do_bloco(por_linha_periodo[novo['apos']])
+        elif primeiro is not None:
+            posicao = indice_linha[primeiro - 1]
+        else:
+            posicao = len(filhos)
+        elementos = [_linha_xml(celulas) for celulas in linhas_do_periodo(novo['periodo_data'])]
+        insercoes.setdefault(posicao, []).extend(elementos)
+        tocadas += len(elementos)
+    trocas.extend((posicao, posicao, elementos) for posicao, elementos in insercoes.items())
+
+    # De baixo para cima, para os índices de cima continuarem valendo; no mesmo
+    # índice, a troca vem antes da inserção (que fica na frente dela)
+    for inicio, fim, elementos in sorted(trocas, key=lambda t: (t[0], t[1] - t[0]), reverse=True):
+        tabela[inicio:fim] = elementos
+    return tocadas
+
+
+def aplicar(ods_path: str, plano: Dict[str, Any]) -> int:
+    """
+    Aplica o plano de planejar() em uma única reescrita do arquivo
+
+    Confere, antes de mexer, se as linhas tocadas ainda têm as matrículas
+    lidas; se não, a planilha mudou no meio do caminho e nada é gravado.
+
+    Returns:
+        int: Linhas inseridas, removidas, movidas ou renomeadas
+    """
+    if not tem_mudancas(plano):
+        return 0
+    return reescrever_ods(ods_path, [lambda root: _aplicar(root, plano)])[0]
+
+
+def reconciliar(ods_path: str, diretoria_data: Dict[str, Any], simular: bool = False,
+                backup: bool = True) -> Dict[str, Any]:
+    """
+    Leva a planilha aos períodos novos preservando as colunas preenchidas
+
+    Returns:
+        dict: O plano (planejar), mais 'gravado' e 'backup' (caminho ou None)
+    """
+    plano = planejar(ods_path, diretoria_data)
+    plano['gravado'] = False
+    plano['backup'] = None
+    if simular or not tem_mudancas(plano):
+        return plano
+    if backup:
+        from ods_backup_store import ODSBackupStore
+        plano['backup'] = ODSBackupStore(ods_path).snapshot(rotulo='reconciliar')['path']
+    aplicar(ods_path, plano)
+    plano['gravado'] = True
+    return plano
+
+
+def imprimir_plano(plano: Dict[str, Any]):
+    for bloco in plano['blocos']:
+        if bloco['acao'] == 'remover':
+            print(f"➖ Período {bloco['periodo']} (linha {bloco['linha_periodo']}): bloco removido, "
+                  f"{len(bloco['linhas'])} servidores")
+        elif bloco['acao'] == 'editar':
+            print(f"✏️  Período {bloco['periodo']} (linha {bloco['linha_periodo']}): "
+                  f"+{len(bloco['inserir'])} -{len(bloco['remover'])} ↕{len(bloco['mover'])} "
+                  f"✎{len(bloco['renomear'])}, {bloco['mantidos']} no lugar")
+    for novo in plano['novos']:
+        print(f"➕ Período {novo['periodo_data']['periodo']}: bloco novo, "
+              f"{len(novo['periodo_data']['servidores'])} servidores")
+    r = plano['resumo']
+    print(f"📊 Blocos: {r['blocos_mantidos']} sem mudança, {r['blocos_editados']} editados, "
+          f"{r['blocos_removidos']} removidos, {r['blocos_novos']} novos | Servidores: "
+          f"+{r['inseridos']} -{r['removidos']} ↕{r['movidos']} ✎{r['renomeados']}")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Reconciliar a planilha com os períodos recalculados')
+    parser.add_argument('--file', '-f', required=True, help='Arquivo ODS já gerado')
+    origem = parser.add_mutually_exclusive_group()
+    origem.add_argument('--api', default='http://localhost:3000', help='URL base da API')
+    origem.add_argument('--dados', help='JSON com {"periodos": [...]}')
+    origem.add_argument('--mock', action='store_true', help='Dados mock do integrador da diretoria')
+    parser.add_argument('--janela', type=int, help='Janela (padrão: a primeira ativa)')
+    parser.add_argument('--simular', action='store_true', help='Só mostrar as diferenças')
+    parser.add_argument('--sem-backup', action='store_true', help='Não criar backup antes de gravar')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.file):
+        print(f"❌ Arquivo não encontrado: {args.file}")
+        return 1
+
+    if args.dados:
+        with open(args.dados, 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+    elif args.mock:
+        from ods_diretoria_integration import DiretoriaODSIntegrator
+        dados = DiretoriaODSIntegrator(args.file).get_diretoria_data_mock()
+    else:
+        from ods_diretoria_api_integration import DiretoriaAPIIntegrator
+        integrador = DiretoriaAPIIntegrator(args.file, args.api)
+        janela_id = args.janela
+        if janela_id is None:
+            janelas = integrador.get_janelas_operacionais()
+            if not janelas:
+                print("❌ Nenhuma janela operacional ativa encontrada")
+                return 1
+            janela_id = janelas[0]['id']
+        dados = integrador.processar_dados_diretoria(janela_id)
+
+    try:
+        plano = reconciliar(args.file, dados, simular=args.simular, backup=not args.sem_backup)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    imprimir_plano(plano)
+    if plano['backup']:
+        print(f"📁 Backup criado: {os.path.basename(plano['backup'])}")
+    if plano['gravado']:
+        print("✅ Planilha reconciliada")
+    elif not tem_mudancas(plano):
+        print("✅ Planilha já está em dia")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache dos relatórios gerados
+A mesma janela costuma ser exportada várias vezes ao dia com as mesmas
+participações. O arquivo pronto fica guardado sob uma chave que resume tudo
+que o determina: os dados de entrada normalizados, o hash do modelo, o formato
+e a versão do layout. Repetir a exportação vira a consulta de um hash.
+
+Dois níveis, cada um com limite de tamanho e descarte do menos usado (LRU):
+    memória   OrderedDict com os bytes dos relatórios mais recentes
+    disco     um arquivo por chave; o mtime marca o último uso
+
+Estrutura do diretório (por padrão em ".ods_cache" ao lado da planilha):
+    ab/abcdef...   bytes do relatório, imutável
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from ods_safe_writer import escrita_atomica
+
+DIRETORIO_PADRAO = '.ods_cache'
+
+# Mudou a forma como as linhas são montadas no relatório? Aumente: as entradas
+# antigas deixam de ser encontradas e saem pelo LRU
+VERSAO_LAYOUT = 1
+
+MAX_MEMORIA_PADRAO = 64 * 1024 * 1024
+MAX_DISCO_PADRAO = 512 * 1024 * 1024
+
+
+def normalizar(dados: Any) -> bytes:
+    """JSON canônico dos dados (chaves ordenadas, sem espaços) para o hash"""
+    return json.dumps(dados, sort_keys=True, ensure_ascii=False, separators=(',', ':'),
+                      default=str).encode('utf-8')
+
+
+def chave_relatorio(dados: Any, modelo_hash: str, formato: str = 'ods', **opcoes) -> str:
+    """
+    Chave do relatório: SHA-256 dos dados normalizados, do hash do modelo, do
+    formato, das opções de exportação e da versão do layout
+    """
+    h = hashlib.sha256()
+    cabecalho = {'layout': VERSAO_LAYOUT, 'modelo': modelo_hash, 'formato': formato,
+                 'opcoes': {k: v for k, v in opcoes.items() if v is not None}}
+    h.update(normalizar(cabecalho))
+    h.update(b'\0')
+    h.update(normalizar(dados))
+    return h.hexdigest()
+
+
+def hash_arquivo(caminho: str) -> str:
+    """SHA-256 do arquivo (o hash do modelo na chave)"""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+class CacheRelatorios:
+    """Relatórios prontos em memória e em disco, com limite de tamanho e LRU"""
+
+    def __init__(self, diretorio: Optional[str] = None, max_memoria: int = MAX_MEMORIA_PADRAO,
+                 max_disco: int = MAX_DISCO_PADRAO):
+        """
+        Args:
+            diretorio (str): Diretório do cache em disco (None = só memória)
+            max_memoria (int): Bytes máximos em memória (0 = sem cache em memória)
+            max_disco (int): Bytes máximos em disco
+        """
+        self.diretorio = diretorio
+        self.max_memoria = max_memoria
+        self.max_disco = max_disco
+        self._memoria: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._bytes_memoria = 0
+        self._disco: Dict[str, int] = {}
+        self._bytes_disco = 0
+        self._lock = threading.Lock()
+        self.acertos_memoria = 0
+        self.acertos_disco = 0
+        self.faltas = 0
+        self.descartes = 0
+
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+            self._indexar_disco()
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.diretorio, chave[:2], chave[2:])
+
+    def _indexar_disco(self):
+        for subdir in os.listdir(self.diretorio):
+            caminho_sub = os.path.join(self.diretorio, subdir)
+            if len(subdir) != 2 or not os.path.isdir(caminho_sub):
+                continue
+            for nome in os.listdir(caminho_sub):
+                if nome.startswith('.tmp_'):
+                    continue
+                tamanho = os.path.getsize(os.path.join(caminho_sub, nome))
+                self._disco[subdir + nome] = tamanho
+                self._bytes_disco += tamanho
+
+    def _guardar_memoria(self, chave: str, corpo: bytes):
+        if len(corpo) > self.max_memoria:
+            return
+        anterior = self._memoria.pop(chave, None)
+        if anterior is not None:
+            self._bytes_memoria -= len(anterior)
+        self._memoria[chave] = corpo
+        self._bytes_memoria += len(corpo)
+        while self._bytes_memoria > self.max_memoria:
+            _, removido = self._memoria.popitem(last=False)
+            self._bytes_memoria -= len(removido)
+
+    def _guardar_disco(self, chave: str, corpo: bytes):
+        if not self.diretorio or len(corpo) > self.max_disco:
+            return
+        caminho = self._caminho(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with escrita_atomica(caminho) as f:
+            f.write(corpo)
+        self._bytes_disco += len(corpo) - self._disco.get(chave, 0)
+        self._disco[chave] = len(corpo)
+        if self._bytes_disco > self.max_disco:
+            self._descartar_disco()
+
+    def _descartar_disco(self):
+        # Menos usados primeiro: o mtime é renovado a cada acerto
+        def ultimo_uso(chave):
+            try:
+                return os.stat(self._caminho(chave)).st_mtime_ns
+            except FileNotFoundError:
+                return 0
+        for chave in sorted(self._disco, key=ultimo_uso):
+            if self._bytes_disco <= self.max_disco:
+                break
+            self._bytes_disco -= self._disco.pop(chave)
+            self.descartes += 1
+            try:
+                os.remove(self._caminho(chave))
+            except FileNotFoundError:
+                pass
+
+    def obter(self, chave: str) -> Optional[bytes]:
+        """Bytes do relatório ou None; conta o acerto ou a falta"""
+        with self._lock:
+            corpo = self._memoria.get(chave)
+            if corpo is not None:
+                self._memoria.move_to_end(chave)
+                self.acertos_memoria += 1
+                return corpo
+
+            if chave in self._disco:
+                caminho = self._caminho(chave)
+                try:
+                    with open(caminho, 'rb') as f:
+                        corpo = f.read()
+                    os.utime(caminho)
+                except FileNotFoundError:
+                    # Removido por fora (outro processo descartou)
+                    self._bytes_disco -= self._disco.pop(chave)
+                else:
+                    self.acertos_disco += 1
+                    self._guardar_memoria(chave, corpo)
+                    return corpo
+
+            self.faltas += 1
+            return None
+
+    def guardar(self, chave: str, corpo: bytes):
+        with self._lock:
+            self._guardar_memoria(chave, corpo)
+            self._guardar_disco(chave, corpo)
+
+    def obter_ou_gerar(self, chave: str, gerar: Callable[[], bytes]) -> bytes:
+        """Devolve o relatório do cache ou o gera com 'gerar()' e o guarda"""
+        corpo = self.obter(chave)
+        if corpo is None:
+            corpo = gerar()
+            self.guardar(chave, corpo)
+        return corpo
+
+    def limpar(self):
+        with self._lock:
+            self._memoria.clear()
+            self._bytes_memoria = 0
+            for chave in list(self._disco):
+                try:
+                    os.remove(self._caminho(chave))
+                except FileNotFoundError:
+                    pass
+            self._disco.clear()
+            self._bytes_disco = 0
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            acertos = self.acertos_memoria + self.acertos_disco
+            consultas = acertos + self.faltas
+            return {
+                'acertos_memoria': self.acertos_memoria,
+                'acertos_disco': self.acertos_disco,
+                'faltas': self.faltas,
+                'taxa_acerto': acertos / consultas if consultas else None,
+                'descartes_disco': self.descartes,
+                'itens_memoria': len(self._memoria),
+                'bytes_memoria': self._bytes_memoria,
+                'itens_disco': len(self._disco),
+                'bytes_disco': self._bytes_disco,
+            }
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Saída das linhas da diretoria em outros formatos
+As mesmas linhas que os integradores inserem no ODS (listas de 6 células ou
+os dicionários de formatar_para_ods) podem ser gravadas como CSV, XLSX mínimo
+ou ODS plano (.fods), sem passar pelo LibreOffice.
+
+Todos os escritores consomem as linhas uma a uma e gravam em qualquer objeto
+com write(), sem seek(): a memória não cresce com o tamanho do relatório.
+"""
+
+import csv
+import io
+import os
+from typing import Any, BinaryIO, Iterable, Iterator, List, Tuple
+
+from ods_instrumentation import contar, medido
+from ods_safe_writer import escrita_atomica
+from ods_stream_writer import ODSZipStream
+from ods_xml_backend import escape
+
+COLUNAS = 6
+CABECALHO = ['Servidor', 'Matrícula', 'Nº Viagem', 'Conc?', 'Rev?', 'Obs.']
+PREFIXO_PERIODO = 'Período:'
+
+# (tipo, células): tipo é 'periodo', 'cabecalho', 'servidor' ou 'separador'
+Linha = Tuple[str, List[str]]
+
+
+def iterar_linhas_modelo(linhas_formatadas: Iterable[Any]) -> Iterator[Linha]:
+    """
+    Normaliza as linhas dos integradores em (tipo, 6 células)
+
+    Aceita os dicionários com 'tipo' de formatar_para_ods e as listas de
+    format_diretoria_data_for_ods, cujo tipo é deduzido do conteúdo.
+    """
+    for linha in linhas_formatadas:
+        if isinstance(linha, dict):
+            tipo = linha['tipo']
+            if tipo == 'periodo':
+                celulas = [linha['conteudo']]
+            elif tipo == 'separador':
+                celulas = []
+            else:
+                celulas = list(linha['colunas'])
+        else:
+            celulas = ['' if c is None else str(c) for c in linha]
+            if celulas and celulas[0].startswith(PREFIXO_PERIODO):
+                tipo = 'periodo'
+            elif celulas == CABECALHO:
+                tipo = 'cabecalho'
+            elif not any(celulas):
+                tipo = 'separador'
+            else:
+                tipo = 'servidor'
+        celulas = (celulas + [''] * COLUNAS)[:COLUNAS]
+        yield tipo, celulas
+
+
+@medido('escrever')
+def escrever_csv(linhas_formatadas: Iterable[Any], saida: BinaryIO, delimitador: str = ';') -> int:
+    """
+    CSV em UTF-8 com BOM e ';' (o que o Excel em português abre direto)
+
+    Returns:
+        int: Linhas gravadas
+    """
+    texto = io.TextIOWrapper(saida, encoding='utf-8-sig', newline='', write_through=False)
+    try:
+        writer = csv.writer(texto, delimiter=delimitador)
+        total = 0
+        for _, celulas in iterar_linhas_modelo(linhas_formatadas):
+            writer.writerow(celulas)
+            total += 1
+        texto.flush()
+    finally:
+        # Não fecha a saída de quem chamou
+        texto.detach()
+    contar(linhas=total)
+    return total
+
+
+def _coluna_xlsx(indice: int) -> str:
+    return 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'[indice]
+
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+_XLSX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Diretoria" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Estilo 1: fundo amarelo e negrito (período e cabeçalho, como no modelo)
+_XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Arial"/></font>'
+    '<font><b/><sz val="11"/><name val="Arial"/></font></fonts>'
+    '<fills count="3"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="FFFFFF00"/></patternFill></fill></fills>'
+    '<borders count="1"><border/></borders>'
+    '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+    '<cellXfs count="2"><xf/><xf fontId="1" fillId="2" applyFont="1" applyFill="1"/></cellXfs>'
+    '</styleSheet>'
+)
+
+
+@medido('escrever')
+def escrever_xlsx(linhas_formatadas: Iterable[Any], saida: BinaryIO) -> int:
+    """
+    XLSX mínimo de uma folha, com strings inline (sem tabela de strings compartilhadas)
+
+    A folha é gravada em streaming; só a lista de células mescladas dos
+    períodos fica em memória até o fim.
+
+    Returns:
+        int: Linhas gravadas
+    """
+    zip_stream = ODSZipStream(saida)
+    zip_stream.adicionar('[Content_Types].xml', _XLSX_CONTENT_TYPES.encode('utf-8'))
+    zip_stream.adicionar('_rels/.rels', _XLSX_RELS.encode('utf-8'))
+    zip_stream.adicionar('xl/workbook.xml', _XLSX_WORKBOOK.encode('utf-8'))
+    zip_stream.adicionar('xl/_rels/workbook.xml.rels', _XLSX_WORKBOOK_RELS.encode('utf-8'))
+    zip_stream.adicionar('xl/styles.xml', _XLSX_STYLES.encode('utf-8'))
+
+    total = 0
+    mescladas = []
+    with zip_stream.membro('xl/worksheets/sheet1.xml') as membro:
+        membro.write(
+            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            b'<cols><col min="1" max="1" width="45" customWidth="1"/>'
+            b'<col min="2" max="6" width="14" customWidth="1"/></cols><sheetData>'
+        )
+        for tipo, celulas in iterar_linhas_modelo(linhas_formatadas):
+            total += 1
+            estilo = ' s="1"' if tipo in ('periodo', 'cabecalho') else ''
+            partes = [f'<row r="{total}">']
+            for indice, texto in enumerate(celulas):
+                if texto:
+                    partes.append(f'<c r="{_coluna_xlsx(indice)}{total}" t="inlineStr"{estilo}>'
+                                  f'<is><t xml:space="preserve">{escape(texto)}</t></is></c>')
+                elif estilo:
+                    partes.append(f'<c r="{_coluna_xlsx(indice)}{total}"{estilo}/>')
+            partes.append('</row>')
+            membro.write(''.join(partes).encode('utf-8'))
+            if tipo == 'periodo':
+                mescladas.append(f"A{total}:{_coluna_xlsx(COLUNAS - 1)}{total}")
+        membro.write(b'</sheetData>')
+        if mescladas:
+            membro.write(f'<mergeCells count="{len(mescladas)}">'.encode('utf-8'))
+            membro.write(''.join(f'<mergeCell ref="{ref}"/>' for ref in mescladas).encode('utf-8'))
+            membro.write(b'</mergeCells>')
+        membro.write(b'</worksheet>')
+
+    zip_stream.fechar()
+    contar(linhas=total)
+    return total
+
+
+_FODS_INICIO = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<office:document xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+    'xmlns:style="urn:oasis:names:tc:opendocument:xmlns:style:1.0" '
+    'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" '
+    'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" '
+    'xmlns:fo="urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0" '
+    'office:version="1.3" office:mimetype="application/vnd.oasis.opendocument.spreadsheet">'
+    '<office:automatic-styles>'
+    '<style:style style:name="amarelo" style:family="table-cell">'
+    '<style:table-cell-properties fo:background-color="#ffff00"/>'
+    '<style:text-properties fo:font-weight="bold"/></style:style>'
+    '</office:automatic-styles>'
+    '<office:body><office:spreadsheet><table:table table:name="Diretoria">'
+    '<table:table-column table:number-columns-repeated="6"/>'
+)
+_FODS_FIM = '</table:table></office:spreadsheet></office:body></office:document>'
+
+
+@medido('escrever')
+def escrever_fods(linhas_formatadas: Iterable[Any], saida: BinaryIO) -> int:
+    """
+    ODS plano (.fods): o documento inteiro em um único XML, sem ZIP
+
+    O período ocupa uma célula mesclada nas 6 colunas, como nos integradores.
+
+    Returns:
+        int: Linhas gravadas
+    """
+    saida.write(_FODS_INICIO.encode('utf-8'))
+    total = 0
+    for tipo, celulas in iterar_linhas_modelo(linhas_formatadas):
+        total += 1
+        estilo = ' table:style-name="amarelo"' if tipo in ('periodo', 'cabecalho') else ''
+        if tipo == 'periodo':
+            partes = [f'<table:table-row><table:table-cell{estilo} office:value-type="string" '
+                      f'table:number-columns-spanned="{COLUNAS}"><text:p>{escape(celulas[0])}</text:p>'
+                      f'</table:table-cell><table:covered-table-cell table:number-columns-repeated="{COLUNAS - 1}"/>']
+        else:
+            partes = ['<table:table-row>']
+            for texto in celulas:
+                if texto:
+                    partes.append(f'<table:table-cell{estilo} office:value-type="string">'
+                                  f'<text:p>{escape(texto)}</text:p></table:table-cell>')
+                else:
+                    partes.append(f'<table:table-cell{estilo}/>')
+        partes.append('</table:table-row>')
+        saida.write(''.join(partes).encode('utf-8'))
+    saida.write(_FODS_FIM.encode('utf-8'))
+    contar(linhas=total)
+    return total
+
+
+ESCRITORES = {
+    'csv': escrever_csv,
+    'xlsx': escrever_xlsx,
+    'fods': escrever_fods,
+}
+
+
+def exportar_linhas(linhas_formatadas: Iterable[Any], destino: str, formato: str = None) -> int:
+    """
+    Grava as linhas em 'destino' no formato pedido (padrão: pela extensão)
+
+    A gravação é atômica: o arquivo só aparece quando está completo.
+
+    Returns:
+        int: Linhas gravadas
+    """
+    formato = formato or os.path.splitext(destino)[1].lstrip('.').lower()
+    if formato not in ESCRITORES:
+        raise ValueError(f"Formato não suportado: {formato} (use {', '.join(ESCRITORES)})")
+    with escrita_atomica(destino) as f:
+        return ESCRITORES[formato](linhas_formatadas, f)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Escrita segura e concorrente de arquivos ODS
+- Lock consultivo por arquivo ("<arquivo>.lock") entre processos
+- Escrita atômica: arquivo temporário no mesmo diretório + os.replace
+- Fila de escrita única por arquivo: edições pendentes de chamadores
+  concorrentes são aplicadas juntas em uma só reescrita do content.xml
+"""
+
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import zipfile
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Union
+
+from ods_stream_writer import TAMANHO_BLOCO, ODSZipStream, nivel_do_membro, obter_executor
+from ods_instrumentation import contar, etapa, medido
+from ods_xml_backend import obter_backend
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+XML = obter_backend()
+
+# os.umask só lê trocando o valor: lido uma vez, antes de existirem outras threads
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def copiar_permissoes(destino: str, temp_path: str):
+    """
+    Dá ao temporário as permissões de 'destino' antes do os.replace
+
+    O mkstemp cria o arquivo com 0600; sem isso, substituir a planilha (ou o
+    manifesto, o diário...) a deixaria legível só pelo dono. Sem destino
+    ainda, vale o padrão de um arquivo novo (0666 menos a umask).
+    """
+    try:
+        shutil.copymode(destino, temp_path)
+    except FileNotFoundError:
+        os.chmod(temp_path, 0o666 & ~_UMASK)
+
+
+@contextmanager
+def lock_arquivo(caminho: str):
+    """Lock exclusivo consultivo sobre '<caminho>.lock' (bloqueia até conseguir)"""
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+    with open(f"{caminho}.lock", 'a+b') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            return
+
+        # Windows: trava o primeiro byte do arquivo de lock
+        import msvcrt
+        lock_file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                break
+            except OSError:
+                # LK_LOCK desiste depois de ~10 tentativas de 1 s: continua esperando
+                continue
+        try:
+            yield
+        finally:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def escrita_atomica(destino: str):
+    """
+    Abre um arquivo temporário ao lado de 'destino' e o renomeia por cima ao final
+
+    Leitores nunca veem um arquivo pela metade: ou o antigo, ou o novo completo.
+    Quem lê o próprio 'destino' para gerar o novo precisa fechá-lo antes do fim
+    do bloco (no Windows, os.replace falha sobre um arquivo aberto).
+    """
+    diretorio = os.path.dirname(os.path.abspath(destino))
+    fd, temp_path = tempfile.mkstemp(dir=diretorio, prefix='.tmp_', suffix='.ods')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        copiar_permissoes(destino, temp_path)
+        os.replace(temp_path, destino)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+@medido('zip')
+def gravar_ods(original_zip: zipfile.ZipFile, destino, content_xml: bytes,
+               niveis: Optional[Dict[str, Union[int, str]]] = None):
+    """
+    Grava um ODS copiando os membros do original e trocando o content.xml
+
+    Membros sem nível em 'niveis' são copiados já comprimidos; o content.xml é
+    comprimido em blocos paralelos quando é grande.
+    """
+    zip_stream = ODSZipStream(destino)
+    # mimetype primeiro e sem compressão, como exige o formato
+    itens = sorted(original_zip.infolist(), key=lambda i: i.filename != 'mimetype')
+    with open(original_zip.filename, 'rb') as origem:
+        for item in itens:
+            if item.filename == 'content.xml':
+                executor = obter_executor() if len(content_xml) > TAMANHO_BLOCO else None
+                zip_stream.adicionar(item.filename, content_xml, nivel_do_membro(item.filename, niveis),
+                                     executor=executor)
+            elif item.filename == 'mimetype' or (niveis and item.filename in niveis):
+                zip_stream.adicionar(item.filename, original_zip.read(item), nivel_do_membro(item.filename, niveis),
+                                     momento=item.date_time, atributos=item.external_attr)
+            else:
+                zip_stream.copiar(origem, item)
+    contar(bytes=zip_stream.fechar())
+
+
+def substituir_content_xml(arquivo_ods: str, content_xml: bytes):
+    """Troca o content.xml de um ODS com lock e escrita atômica"""
+    with lock_arquivo(arquivo_ods):
+        # O ZIP original é fechado antes do os.replace: no Windows não dá para
+        # substituir um arquivo com handle aberto
+        with escrita_atomica(arquivo_ods) as f:
+            with zipfile.ZipFile(arquivo_ods, 'r') as original_zip:
+                gravar_ods(original_zip, f, content_xml)
+
+
+def reescrever_ods(arquivo_ods: str, mutadores: List[Callable[[Any], Any]],
+                   apos_gravar: Optional[Callable[[List[Any], bytes], Any]] = None) -> List[Any]:
+    """
+    Aplica funções sobre a raiz do content.xml e regrava o arquivo uma única vez
+
+    O arquivo fica travado do momento da leitura até a substituição, então
+    nenhuma escrita de outro processo é perdida.
+
+    Args:
+        arquivo_ods (str): Caminho do arquivo ODS
+        mutadores (list): Funções que recebem a raiz do content.xml
+        apos_gravar (callable): Chamada com (retornos dos mutadores, content.xml
+            gravado) depois da substituição e ainda sob o lock: o que ela deriva
+            do content.xml (um manifesto, por exemplo) é o que está no arquivo
+
+    Returns:
+        list: Retorno de cada mutador, na mesma ordem
+    """
+    with lock_arquivo(arquivo_ods):
+        # Como em substituir_content_xml, o original é fechado antes do os.replace
+        with escrita_atomica(arquivo_ods) as f:
+            with zipfile.ZipFile(arquivo_ods, 'r') as original_zip:
+                root = XML.fromstring(original_zip.read('content.xml'))
+                resultados = [mutador(root) for mutador in mutadores]
+                with etapa('serializar') as e:
+                    content_xml = XML.tostring(root)
+                    e.contar(bytes=len(content_xml))
+                gravar_ods(original_zip, f, content_xml)
+        if apos_gravar is not None:
+            apos_gravar(resultados, content_xml)
+    return resultados
+
+
+class FilaEscritaODS:
+    """
+    Escritor único de um arquivo ODS
+
+    Cada chamador submete uma função que altera a raiz do content.xml e recebe um
+    Future. A thread escritora pega tudo que estiver pendente e aplica em uma só
+    reescrita, então N exportações concorrentes custam perto de uma reescrita.
+    """
+
+    def __init__(self, arquivo_ods: str):
+        self.arquivo_ods = arquivo_ods
+        self._pendentes = queue.Queue()
+        self._thread = threading.Thread(target=self._executar, name=f"ods-writer:{arquivo_ods}", daemon=True)
+        self._thread.start()
+        self.reescritas = 0
+        self.edicoes = 0
+
+    def submeter(self, mutador: Callable[[Any], Any],
+                 apos_gravar: Optional[Callable[[Any, bytes], Any]] = None) -> 'Future':
+        """
+        Agenda uma alteração; o Future resolve com o retorno do mutador
+
+        Com apos_gravar, o Future resolve com apos_gravar(retorno do mutador,
+        content.xml gravado), chamada logo depois da substituição e ainda sob o
+        lock do arquivo.
+        """
+        from concurrent.futures import Future
+        future = Future()
+        self._pendentes.put((mutador, apos_gravar, future))
+        return future
+
+    def _executar(self):
+        while True:
+            lote = [self._pendentes.get()]
+            while True:
+                try:
+                    lote.append(self._pendentes.get_nowait())
+                except queue.Empty:
+                    break
+            self._aplicar_lote(lote)
+
+    def _aplicar_lote(self, lote):
+        lote = [(m, a, f) for m, a, f in lote if f.set_running_or_notify_cancel()]
+        while lote:
+            falhas = []
+            saidas = []
+
+            def protegido(mutador, indice):
+                def executar(root):
+                    try:
+                        return mutador(root)
+                    except Exception as e:
+                        falhas.append((indice, e))
+                        raise
+                return executar
+
+            def apos_gravar(resultados, content_xml):
+                # O arquivo já foi substituído: um erro aqui é só de quem o causou
+                for (_, apos, _), resultado in zip(lote, resultados):
+                    if apos is None:
+                        saidas.append((resultado, None))
+                        continue
+                    try:
+                        saidas.append((apos(resultado, content_xml), None))
+                    except Exception as e:
+                        saidas.append((None, e))
+
+            try:
+                reescrever_ods(self.arquivo_ods, [protegido(m, i) for i, (m, _, _) in enumerate(lote)],
+                               apos_gravar=apos_gravar)
+            except Exception as e:
+                if not falhas:
+                    # Falha de leitura/gravação: todos do lote recebem o erro
+                    for _, _, future in lote:
+                        future.set_exception(e)
+                    return
+                # Um mutador falhou e pode ter deixado a árvore pela metade:
+                # descarta a tentativa e reaplica os demais em uma árvore nova
+                indice, erro = falhas[0]
+                lote[indice][2].set_exception(erro)
+                del lote[indice]
+                continue
+
+            self.reescritas += 1
+            self.edicoes += len(lote)
+            for (_, _, future), (resultado, erro) in zip(lote, saidas):
+                if erro is not None:
+                    future.set_exception(erro)
+                else:
+                    future.set_result(resultado)
+            return
+
+
+_filas: Dict[str, FilaEscritaODS] = {}
+_filas_lock = threading.Lock()
+
+
+def obter_fila(arquivo_ods: str) -> FilaEscritaODS:
+    """Fila de escrita compartilhada do arquivo (uma por caminho absoluto)"""
+    chave = os.path.abspath(arquivo_ods)
+    with _filas_lock:
+        if chave not in _filas:
+            _filas[chave] = FilaEscritaODS(chave)
+        return _filas[chave]
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Leitura em streaming de planilhas ODS
+Percorre o content.xml com iterparse, direto de dentro do ZIP, liberando cada
+linha depois de lida: a memória fica limitada a uma linha por vez, qualquer
+que seja o tamanho da planilha.
+
+As posições de linha seguem a mesma regra do ODSModifier: a N-ésima linha é o
+N-ésimo elemento table:table-row filho direto da primeira tabela.
+"""
+
+import zipfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ods_xml_backend import obter_backend
+
+XML = obter_backend()
+
+TABLE_NS = 'urn:oasis:names:tc:opendocument:xmlns:table:1.0'
+TEXT_NS = 'urn:oasis:names:tc:opendocument:xmlns:text:1.0'
+
+TAG_TABLE = f"{{{TABLE_NS}}}table"
+TAG_ROW = f"{{{TABLE_NS}}}table-row"
+TAG_CELL = f"{{{TABLE_NS}}}table-cell"
+TAG_COVERED = f"{{{TABLE_NS}}}covered-table-cell"
+TAG_P = f"{{{TEXT_NS}}}p"
+ATTR_COLS_REPEATED = f"{{{TABLE_NS}}}number-columns-repeated"
+
+# Células vazias repetidas além disso não viram colunas (o LibreOffice
+# costuma gravar uma última célula repetida até o fim da linha)
+MAX_COLUNAS_REPETIDAS = 1024
+
+
+def texto_celula(celula) -> str:
+    """Texto de uma célula: parágrafos unidos por quebra de linha"""
+    return '\n'.join(''.join(p.itertext()) for p in celula.iter(TAG_P))
+
+
+def celulas_da_linha(linha) -> List[str]:
+    """
+    Textos das células de uma linha, na ordem das colunas
+
+    Células cobertas (mescladas) contam como vazias, repetições de coluna são
+    expandidas e as células vazias do final são descartadas.
+    """
+    celulas = []
+    for celula in linha:
+        if celula.tag == TAG_CELL:
+            texto = texto_celula(celula)
+        elif celula.tag == TAG_COVERED:
+            texto = ''
+        else:
+            continue
+        repeticoes = int(celula.get(ATTR_COLS_REPEATED, '1'))
+        celulas.extend([texto] * min(repeticoes, MAX_COLUNAS_REPETIDAS))
+
+    while celulas and celulas[-1] == '':
+        celulas.pop()
+    return celulas
+
+
+def celula_na_coluna(linha, column: int) -> Tuple[Optional[object], int]:
+    """
+    Elemento que ocupa a coluna lógica 'column' (1-indexed) de uma linha
+
+    Mesma contagem de celulas_da_linha: células cobertas ocupam a sua coluna e
+    uma célula com table:number-columns-repeated ocupa várias.
+
+    Returns:
+        tuple: (elemento, deslocamento da coluna dentro das repetições dele);
+        se a linha é mais curta, (None, colunas da linha)
+    """
+    posicao = 0
+    for celula in linha:
+        if celula.tag != TAG_CELL and celula.tag != TAG_COVERED:
+            continue
+        repeticoes = int(celula.get(ATTR_COLS_REPEATED, '1'))
+        if posicao + repeticoes >= column:
+            return celula, column - posicao - 1
+        posicao += repeticoes
+    return None, posicao
+
+
+def contar_linhas(root) -> int:
+    """Elementos table:table-row da primeira tabela de uma raiz de content.xml (contagem de iterar_elementos_linha)"""
+    tabela = next(root.iter(TAG_TABLE), None)
+    if tabela is None:
+        return 0
+    return sum(1 for filho in tabela if filho.tag == TAG_ROW)
+
+
+def posicao_linha(tabela, linha) -> int:
+    """Posição (1-indexed) de um table:table-row na tabela, na contagem de iterar_elementos_linha"""
+    posicao = 0
+    for filho in tabela:
+        if filho.tag == TAG_ROW:
+            posicao += 1
+            if filho is linha:
+                return posicao
+    raise ValueError("Linha não pertence à tabela")
+
+
+def iterar_elementos_linha(ods_path: str) -> Iterator[Tuple[int, object]]:
+    """
+    Percorre os elementos table:table-row da primeira tabela
+
+    O elemento só é válido até a próxima iteração: em seguida ele é limpo e
+    removido da árvore.
+
+    Yields:
+        tuple: (posição 1-indexed, elemento da linha)
+    """
+    with zipfile.ZipFile(ods_path, 'r') as zip_ref:
+        with zip_ref.open('content.xml') as content:
+            profundidade = 0
+            tabela = None
+            profundidade_tabela = None
+            posicao = 0
+
+            for evento, elem in XML.iterparse(content, events=('start', 'end')):
+                if evento == 'start':
+                    profundidade += 1
+                    if tabela is None and elem.tag == TAG_TABLE:
+                        tabela = elem
+                        profundidade_tabela = profundidade
+                    continue
+
+                if elem is tabela:
+                    return
+
+                if tabela is not None and elem.tag == TAG_ROW and profundidade == profundidade_tabela + 1:
+                    posicao += 1
+                    yield posicao, elem
+                    elem.clear()
+                    tabela.remove(elem)
+
+                profundidade -= 1
+
+
+def iterar_linhas(ods_path: str) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Percorre as linhas da primeira tabela como listas de textos
+
+    Yields:
+        tuple: (posição 1-indexed, textos das células)
+    """
+    for posicao, linha in iterar_elementos_linha(ods_path):
+        yield posicao, celulas_da_linha(linha)
+
+
+def localizar_celula(ods_path: str, row: int, column: int = 1) -> Dict[str, Any]:
+    """
+    Localiza uma célula parando a leitura assim que a linha alvo termina
+
+    Segue a regra do ODSModifier: a célula é a da coluna lógica 'column'
+    (celula_na_coluna) e o texto é o do primeiro text:p. Ler uma célula do começo da
+    planilha custa o mesmo qualquer que seja o tamanho dela.
+
+    Returns:
+        dict: 'content_xml' e 'tabela' (se existem), 'linhas' (linhas lidas),
+        'celulas' (colunas até a célula alvo, ou todas as da linha se ela é
+        mais curta; None se a linha não existe),
+        'paragrafos' (da célula alvo) e 'texto' (do primeiro parágrafo)
+    """
+    resultado = {'content_xml': True, 'tabela': False, 'linhas': 0,
+                 'celulas': None, 'paragrafos': 0, 'texto': None}
+
+    with zipfile.ZipFile(ods_path, 'r') as zip_ref:
+        if 'content.xml' not in zip_ref.namelist():
+            resultado['content_xml'] = False
+            return resultado
+
+    for posicao, linha in iterar_elementos_linha(ods_path):
+        resultado['tabela'] = True
+        resultado['linhas'] = posicao
+        if posicao < row:
+            continue
+
+        celula, colunas = celula_na_coluna(linha, column)
+        if celula is None:
+            resultado['celulas'] = colunas
+        else:
+            resultado['celulas'] = column
+            paragrafos = [p for p in celula if p.tag == TAG_P]
+            resultado['paragrafos'] = len(paragrafos)
+            if paragrafos and paragrafos[0].text:
+                resultado['texto'] = paragrafos[0].text
+        # Sair do laço fecha o gerador e interrompe o parse
+        break
+
+    if not resultado['tabela']:
+        resultado['tabela'] = _tem_tabela(ods_path)
+    return resultado
+
+
+def _tem_tabela(ods_path: str) -> bool:
+    with zipfile.ZipFile(ods_path, 'r') as zip_ref:
+        with zip_ref.open('content.xml') as content:
+            for _, elem in XML.iterparse(content, events=('start',)):
+                if elem.tag == TAG_TABLE:
+                    return True
+    return False
+
+
+def ler_celula(ods_path: str, row: int, column: int = 1) -> Optional[str]:
+    """Texto de uma célula (1-indexed), ou None se vazia ou inexistente"""
+    return localizar_celula(ods_path, row, column)['texto']
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Saída de ODS em streaming
+Grava a planilha pronta direto em qualquer objeto com write() (stdout, socket,
+resposta HTTP, BytesIO), sem arquivo temporário e sem precisar de seek():
+
+- o mimetype sai primeiro, sem compressão, como exige o formato
+- os membros que não mudaram são copiados do modelo já comprimidos
+- o content.xml é serializado e comprimido aos pedaços, com descritor de
+  dados no fim (o tamanho não precisa ser conhecido antes)
+
+Assim o primeiro byte sai assim que o modelo é aberto, qualquer que seja o
+tamanho do relatório.
+
+Membros grandes podem ser comprimidos em paralelo: o conteúdo é dividido em
+blocos de tamanho fixo, cada bloco vira um trecho deflate independente (com os
+últimos 32 KiB do bloco anterior como dicionário, para não perder taxa) e os
+trechos são concatenados. O zlib libera o GIL, então as threads usam núcleos
+de verdade.
+"""
+
+import io
+import os
+import struct
+import threading
+import zipfile
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, BinaryIO, Callable, Dict, Iterable, Optional, Tuple, Union
+
+from ods_instrumentation import contar, etapa, medido
+from ods_xml_backend import obter_backend
+
+if TYPE_CHECKING:
+    # concurrent.futures puxa o logging: só é importado quando o pool é criado
+    from concurrent.futures import Executor, ThreadPoolExecutor
+
+XML = obter_backend()
+
+NIVEL_PADRAO = 6
+LIMITE_ZIP32 = 0xFFFFFFFF
+FLAG_DESCRITOR = 0x08
+FLAG_UTF8 = 0x800
+
+# Níveis nomeados aceitos onde se pede um nível de compressão
+NIVEIS = {'stored': 0, 'fastest': 1, 'default': NIVEL_PADRAO, 'smallest': 9}
+
+TAMANHO_BLOCO = 1 << 20
+JANELA_DEFLATE = 1 << 15
+
+# Já comprimidos: deflate só gasta CPU
+EXTENSOES_SEM_COMPRESSAO = ('.png', '.jpg', '.jpeg', '.gif')
+
+_executor: Optional['ThreadPoolExecutor'] = None
+_executor_lock = threading.Lock()
+
+
+def obter_executor() -> 'ThreadPoolExecutor':
+    """Pool de threads compartilhado para compressão (um worker por núcleo)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='ods-deflate')
+        return _executor
+
+
+def resolver_nivel(nivel: Union[int, str]) -> int:
+    """Converte 'stored'/'fastest'/'default'/'smallest' ou um número de 0 a 9"""
+    if isinstance(nivel, str):
+        if nivel not in NIVEIS:
+            raise ValueError(f"Nível de compressão desconhecido: {nivel}")
+        return NIVEIS[nivel]
+    if not 0 <= nivel <= 9:
+        raise ValueError(f"Nível de compressão fora de 0-9: {nivel}")
+    return nivel
+
+
+def nivel_do_membro(nome: str, niveis: Optional[Dict[str, Union[int, str]]] = None,
+                    padrao: Union[int, str] = NIVEL_PADRAO) -> int:
+    """Nível de um membro: o configurado para ele, 0 para imagens ou o padrão"""
+    if niveis and nome in niveis:
+        return resolver_nivel(niveis[nome])
+    if nome == 'mimetype' or nome.lower().endswith(EXTENSOES_SEM_COMPRESSAO):
+        return 0
+    return resolver_nivel(padrao)
+
+
+def _deflate_bloco(dados: memoryview, inicio: int, fim: int, nivel: int, ultimo: bool) -> bytes:
+    if inicio:
+        dicionario = bytes(dados[max(0, inicio - JANELA_DEFLATE):inicio])
+        compressor = zlib.compressobj(nivel, zlib.DEFLATED, -15, zdict=dicionario)
+    else:
+        compressor = zlib.compressobj(nivel, zlib.DEFLATED, -15)
+    saida = compressor.compress(dados[inicio:fim])
+    # Z_SYNC_FLUSH termina o trecho alinhado em byte e sem bloco final
+    return saida + compressor.flush(zlib.Z_FINISH if ultimo else zlib.Z_SYNC_FLUSH)
+
+
+def comprimir_deflate(dados: bytes, nivel: int = NIVEL_PADRAO, executor: Optional['Executor'] = None,
+                      tamanho_bloco: int = TAMANHO_BLOCO) -> bytes:
+    """
+    Deflate cru (sem cabeçalho zlib) de 'dados', em blocos paralelos se houver executor
+
+    Com um bloco só, ou sem executor, é o mesmo que um compressobj comum.
+    """
+    if executor is None or len(dados) <= tamanho_bloco:
+        compressor = zlib.compressobj(nivel, zlib.DEFLATED, -15)
+        return compressor.compress(dados) + compressor.flush()
+
+    visao = memoryview(dados)
+    inicios = range(0, len(dados), tamanho_bloco)
+    futuros = [
+        executor.submit(_deflate_bloco, visao, inicio, min(inicio + tamanho_bloco, len(dados)),
+                        nivel, inicio + tamanho_bloco >= len(dados))
+        for inicio in inicios
+    ]
+    return b''.join(f.result() for f in futuros)
+
+
+def _data_dos(momento) -> tuple:
+    ano, mes, dia, hora, minuto, segundo = momento[:6]
+    return (hora << 11) | (minuto << 5) | (segundo // 2), ((ano - 1980) << 9) | (mes << 5) | dia
+
+
+def _nome_bytes(nome: str) -> tuple:
+    try:
+        return nome.encode('ascii'), 0
+    except UnicodeEncodeError:
+        return nome.encode('utf-8'), FLAG_UTF8
+
+
+class _MembroStream:
+    """Membro sendo gravado: comprime e calcula o CRC a cada write()"""
+
+    def __init__(self, zip_stream, nivel: int):
+        self._zip = zip_stream
+        self._compressor = zlib.compressobj(nivel, zlib.DEFLATED, -15) if nivel else None
+        self.crc = 0
+        self.tamanho = 0
+        self.comprimido = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados) -> int:
+        dados = bytes(dados)
+        self.crc = zlib.crc32(dados, self.crc)
+        self.tamanho += len(dados)
+        saida = self._compressor.compress(dados) if self._compressor else dados
+        if saida:
+            self._zip._gravar(saida)
+            self.comprimido += len(saida)
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def _finalizar(self):
+        if self._compressor:
+            saida = self._compressor.flush()
+            self._zip._gravar(saida)
+            self.comprimido += len(saida)
+
+
+class ODSZipStream:
+    """
+    Escritor de ZIP só para frente
+
+    Conta os bytes gravados em vez de usar tell()/seek(), então funciona em
+    pipes e sockets. Não gera ZIP64 (membros e arquivo até 4 GiB).
+    """
+
+    def __init__(self, saida: BinaryIO):
+        self._saida = saida
+        self._offset = 0
+        self._entradas = []
+
+    def _gravar(self, dados: bytes):
+        self._saida.write(dados)
+        self._offset += len(dados)
+
+    @property
+    def bytes_gravados(self) -> int:
+        """Bytes escritos na saída até agora (o arquivo inteiro, depois de fechar())"""
+        return self._offset
+
+    def _cabecalho_local(self, nome: bytes, flags: int, metodo: int, data_dos: tuple,
+                         crc: int, comprimido: int, tamanho: int):
+        self._gravar(struct.pack('<4s5H3L2H', b'PK\x03\x04', 20, flags, metodo, data_dos[0], data_dos[1],
+                                 crc, comprimido, tamanho, len(nome), 0) + nome)
+
+    def _registrar(self, nome: bytes, flags: int, metodo: int, data_dos: tuple, crc: int,
+                   comprimido: int, tamanho: int, offset: int, atributos: int):
+        if max(comprimido, tamanho, offset) > LIMITE_ZIP32:
+            raise ValueError("Membro grande demais para ZIP sem ZIP64")
+        self._entradas.append((nome, flags, metodo, data_dos, crc, comprimido, tamanho, offset, atributos))
+
+    def adicionar(self, nome: str, dados: bytes, nivel: Union[int, str] = NIVEL_PADRAO, momento=None,
+                  atributos: int = 0, executor: Optional['Executor'] = None):
+        """Grava um membro já em memória (nivel 0 = sem compressão)"""
+        nivel = resolver_nivel(nivel)
+        corpo = comprimir_deflate(dados, nivel, executor) if nivel else dados
+        self._gravar_comprimido(nome, dados, corpo, nivel, momento, atributos)
+
+    def adicionar_varios(self, membros: Iterable[Tuple[str, bytes, Union[int, str]]],
+                         executor: Optional['Executor'] = None):
+        """
+        Grava vários membros, comprimindo todos ao mesmo tempo no executor
+
+        A ordem no arquivo é a da lista; só a compressão é concorrente.
+        """
+        membros = [(nome, dados, resolver_nivel(nivel)) for nome, dados, nivel in membros]
+        if executor is None:
+            for nome, dados, nivel in membros:
+                self.adicionar(nome, dados, nivel)
+            return
+        futuros = [
+            executor.submit(comprimir_deflate, dados, nivel) if nivel and len(dados) <= TAMANHO_BLOCO else None
+            for _, dados, nivel in membros
+        ]
+        for (nome, dados, nivel), futuro in zip(membros, futuros):
+            if futuro is not None:
+                self._gravar_comprimido(nome, dados, futuro.result(), nivel)
+            else:
+                # Membros grandes dividem-se em blocos no próprio executor
+                self.adicionar(nome, dados, nivel, executor=executor)
+
+    def _gravar_comprimido(self, nome: str, dados: bytes, corpo: bytes, nivel: int, momento=None, atributos: int = 0):
+        nome_b, flags = _nome_bytes(nome)
+        data_dos = _data_dos(momento or datetime.now().timetuple())
+        crc = zlib.crc32(dados)
+        metodo = zipfile.ZIP_DEFLATED if nivel else zipfile.ZIP_STORED
+        offset = self._offset
+        self._cabecalho_local(nome_b, flags, metodo, data_dos, crc, len(corpo), len(dados))
+        self._gravar(corpo)
+        self._registrar(nome_b, flags, metodo, data_dos, crc, len(corpo), len(dados), offset, atributos)
+
+    def copiar(self, origem: BinaryIO, info: zipfile.ZipInfo):
+        """Copia um membro de outro ZIP sem descomprimir e recomprimir"""
+        origem.seek(info.header_offset)
+        cabecalho = origem.read(30)
+        if cabecalho[:4] != b'PK\x03\x04':
+            raise zipfile.BadZipFile(f"Cabeçalho inválido para {info.filename}")
+        tamanho_nome, tamanho_extra = struct.unpack('<2H', cabecalho[26:30])
+        origem.seek(tamanho_nome + tamanho_extra, io.SEEK_CUR)
+
+        nome_b, flags = _nome_bytes(info.filename)
+        data_dos = _data_dos(info.date_time)
+        offset = self._offset
+        self._cabecalho_local(nome_b, flags, info.compress_type, data_dos,
+                              info.CRC, info.compress_size, info.file_size)
+        restante = info.compress_size
+        while restante:
+            bloco = origem.read(min(restante, 1 << 16))
+            if not bloco:
+                raise zipfile.BadZipFile(f"Membro truncado: {info.filename}")
+            self._gravar(bloco)
+            restante -= len(bloco)
+        self._registrar(nome_b, flags, info.compress_type, data_dos, info.CRC,
+                        info.compress_size, info.file_size, offset, info.external_attr)
+
+    @contextmanager
+    def membro(self, nome: str, nivel: int = NIVEL_PADRAO):
+        """
+        Abre um membro de tamanho desconhecido para gravação incremental
+
+        O CRC e os tamanhos vão no descritor de dados depois do conteúdo.
+        """
+        nome_b, flags = _nome_bytes(nome)
+        flags |= FLAG_DESCRITOR
+        metodo = zipfile.ZIP_DEFLATED if nivel else zipfile.ZIP_STORED
+        data_dos = _data_dos(datetime.now().timetuple())
+        offset = self._offset
+        self._cabecalho_local(nome_b, flags, metodo, data_dos, 0, 0, 0)
+
+        membro = _MembroStream(self, nivel)
+        yield membro
+        membro._finalizar()
+
+        self._gravar(struct.pack('<4s3L', b'PK\x07\x08', membro.crc, membro.comprimido, membro.tamanho))
+        self._registrar(nome_b, flags, metodo, data_dos, membro.crc,
+                        membro.comprimido, membro.tamanho, offset, 0)
+
+    def fechar(self) -> int:
+        """Grava o diretório central e retorna o tamanho do arquivo; o objeto de saída continua aberto"""
+        inicio = self._offset
+        for nome, flags, metodo, data_dos, crc, comprimido, tamanho, offset, atributos in self._entradas:
+            self._gravar(struct.pack('<4s6H3L5H2L', b'PK\x01\x02', 20, 20, flags, metodo, data_dos[0], data_dos[1],
+                                     crc, comprimido, tamanho, len(nome), 0, 0, 0, 0, atributos, offset) + nome)
+        tamanho_diretorio = self._offset - inicio
+        if inicio > LIMITE_ZIP32 or len(self._entradas) > 0xFFFF:
+            raise ValueError("Arquivo grande demais para ZIP sem ZIP64")
+        self._gravar(struct.pack('<4s4H2LH', b'PK\x05\x06', 0, 0, len(self._entradas), len(self._entradas),
+                                 tamanho_diretorio, inicio, 0))
+        return self._offset
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, *_):
+        if tipo is None:
+            self.fechar()
+        return False
+
+
+def abrir_modelo(modelo: Union[str, bytes]) -> BinaryIO:
+    """Abre o modelo a partir do caminho ou dos bytes já carregados"""
+    if isinstance(modelo, (bytes, bytearray, memoryview)):
+        return io.BytesIO(modelo)
+    return open(modelo, 'rb')
+
+
+@medido('zip')
+def transmitir_ods(modelo: Union[str, bytes], saida: BinaryIO, root=None,
+                   mutador: Optional[Callable[[Any], Any]] = None, nivel: int = NIVEL_PADRAO) -> int:
+    """
+    Grava em 'saida' o ODS do modelo com um content.xml novo
+
+    Args:
+        modelo: Caminho do ODS modelo ou seus bytes
+        saida: Objeto com write(); não precisa suportar seek()
+        root: Raiz do content.xml já alterada (padrão: a do modelo)
+        mutador: Função aplicada à raiz antes de serializar
+        nivel (int): Nível de compressão do content.xml (0 = sem compressão)
+
+    Returns:
+        int: Bytes gravados
+    """
+    with abrir_modelo(modelo) as origem:
+        with zipfile.ZipFile(origem, 'r') as zip_modelo:
+            itens = zip_modelo.infolist()
+            zip_stream = ODSZipStream(saida)
+
+            mimetype = next((i for i in itens if i.filename == 'mimetype'), None)
+            if mimetype is not None:
+                zip_stream.adicionar('mimetype', zip_modelo.read(mimetype), nivel=0, momento=mimetype.date_time)
+
+            if root is None:
+                root = XML.fromstring(zip_modelo.read('content.xml'))
+            if mutador is not None:
+                mutador(root)
+
+            for item in itens:
+                if item.filename == 'mimetype':
+                    continue
+                if item.filename == 'content.xml':
+                    # A serialização escreve direto no compressor: 'serializar'
+                    # inclui a compressão do content.xml
+                    with etapa('serializar'), zip_stream.membro('content.xml', nivel) as membro:
+                        # TextIOWrapper do ElementTree agrupa a escrita em blocos
+                        XML.write(root, membro)
+                else:
+                    zip_stream.copiar(origem, item)
+
+            total = zip_stream.fechar()
+            contar(bytes=total)
+            return total
+
+
+def gerar_ods_bytes(modelo: Union[str, bytes], root=None, mutador: Optional[Callable[[Any], Any]] = None,
+                    nivel: int = NIVEL_PADRAO) -> bytes:
+    """ODS completo em memória (para quem precisa do corpo inteiro, como um cache)"""
+    saida = io.BytesIO()
+    transmitir_ods(modelo, saida, root=root, mutador=mutador, nivel=nivel)
+    return saida.getvalue()
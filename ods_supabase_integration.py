@@ -3,25 +3,53 @@
 """
 Integração Direta entre Supabase e planilha ODS
 Este script conecta diretamente com o banco Supabase para obter dados reais da diretoria
+
+Uso:
+    python ods_supabase_integration.py [--cache DIR]
 """
 
+import hashlib
 import zipfile
-import xml.etree.ElementTree as ET
 import os
-import shutil
 from datetime import datetime, timedelta
 import json
+from ods_backup_store import ODSBackupStore
+from ods_export_manifest import gerar_manifesto
+from ods_instrumentation import contar, etapa, medido
+from ods_period_cache import periodos_da_janela
+from ods_safe_writer import obter_fila, substituir_content_xml
+from ods_stream_reader import contar_linhas
+from ods_stream_writer import transmitir_ods
 from typing import List, Dict, Any, Optional
 from collections import defaultdict
+from ods_xml_backend import obter_backend
+
+XML = obter_backend()
+
+def chave_consulta(filtros: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Chave da consulta no cache de períodos: os filtros da consulta (janela inclusive)
+
+    A mesma consulta cai sempre no mesmo arquivo de períodos, mesmo quando as
+    operações que ela traz mudam: quem decide o que recalcular é a impressão das
+    datas de cada servidor, e quem saiu da consulta sai do arquivo.
+    """
+    if not filtros:
+        return 'supabase'
+    texto = json.dumps(filtros, sort_keys=True, ensure_ascii=False, default=str)
+    return 'supabase_' + hashlib.sha256(texto.encode('utf-8')).hexdigest()[:16]
 
 class SupabaseODSIntegrator:
-    def __init__(self, ods_file_path: str):
+    def __init__(self, ods_file_path: str, cache_periodos=None):
         self.ods_file_path = ods_file_path
-        self.backup_path = f"{ods_file_path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.backup_path = None
+        # CachePeriodos: só recalcula os servidores cujas datas mudaram
+        self.cache_periodos = cache_periodos
         
     def create_backup(self):
-        """Criar backup do arquivo original"""
-        shutil.copy2(self.ods_file_path, self.backup_path)
+        """Criar backup do arquivo original no repositório deduplicado"""
+        manifesto = ODSBackupStore(self.ods_file_path).snapshot(rotulo=self.__class__.__name__)
+        self.backup_path = manifesto['path']
         print(f"✅ Backup criado: {self.backup_path}")
         
     def get_mock_supabase_data(self) -> List[Dict]:
@@ -287,8 +315,16 @@ class SupabaseODSIntegrator:
         
         return periodos
         
-    def processar_dados_supabase(self, participacoes_data: List[Dict]) -> Dict[str, Any]:
-        """Processar dados do Supabase seguindo a lógica da TabelaOperacoesDiretoria"""
+    @medido('periodos')
+    def processar_dados_supabase(self, participacoes_data: List[Dict], janela: Optional[str] = None,
+                                 filtros: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Processar dados do Supabase seguindo a lógica da TabelaOperacoesDiretoria
+
+        Args:
+            janela (str): Nome da consulta no cache de períodos (padrão: chave_consulta(filtros))
+            filtros (dict): Filtros da consulta que trouxe as participações
+        """
         print(f"🔄 Processando {len(participacoes_data)} participações...")
         
         # Agrupar por servidor
@@ -308,6 +344,7 @@ class SupabaseODSIntegrator:
         
         # Calcular PORTARIA MOR para cada servidor
         portarias_mor = []
+        periodos_janela = periodos_da_janela(self.cache_periodos, janela or chave_consulta(filtros))
         
         for servidor_id, dados in servidores_por_id.items():
             # Obter datas das operações
@@ -316,8 +353,8 @@ class SupabaseODSIntegrator:
             if not datas_operacao:
                 continue
                 
-            # Calcular períodos consecutivos
-            periodos = self.calcular_periodos_consecutivos(datas_operacao)
+            # Calcular períodos consecutivos (ou reaproveitar do cache)
+            periodos = periodos_janela.periodos(servidor_id, datas_operacao, self.calcular_periodos_consecutivos)
             
             for periodo in periodos:
                 # Calcular data de retorno (+1 dia após a última operação)
@@ -338,6 +375,9 @@ class SupabaseODSIntegrator:
                     }
                 })
                 
+        periodos_janela.salvar()
+        periodos_janela.relatar()
+                
         # Agrupar por período
         periodos_agrupados = defaultdict(list)
         for portaria in portarias_mor:
@@ -356,14 +396,16 @@ class SupabaseODSIntegrator:
         }
         
         print(f"📊 {len(resultado['periodos'])} períodos processados")
+        contar(participacoes=len(participacoes_data), periodos=len(resultado['periodos']))
         return resultado
         
     def extract_ods_content(self):
         """Extrair conteúdo XML do arquivo ODS"""
         with zipfile.ZipFile(self.ods_file_path, 'r') as zip_file:
             content_xml = zip_file.read('content.xml')
-            return ET.fromstring(content_xml)
+            return XML.fromstring(content_xml)
             
+    @medido('formatar')
     def format_diretoria_data_for_ods(self, diretoria_data: Dict[str, Any]) -> List[List[str]]:
         """Formatar dados da diretoria para inserção na planilha ODS conforme especificação do usuário"""
         formatted_rows = []
@@ -389,12 +431,15 @@ class SupabaseODSIntegrator:
             # 4. Linha em branco entre períodos
             formatted_rows.append(["", "", "", "", "", ""])
             
+        contar(linhas=len(formatted_rows))
         return formatted_rows
         
-    def insert_data_into_ods(self, data_rows: List[List[str]], start_row: int = 30):
-        """Inserir dados formatados na planilha ODS"""
+    @medido('xml')
+    def insert_data_into_ods(self, data_rows: List[List[str]], start_row: int = 30, root=None):
+        """Inserir dados formatados na planilha ODS (ou na raiz do content.xml recebida)"""
         # Extrair conteúdo
-        root = self.extract_ods_content()
+        if root is None:
+            root = self.extract_ods_content()
         
         # Encontrar a planilha (sheet)
         namespaces = {
@@ -413,15 +458,15 @@ class SupabaseODSIntegrator:
         
         for row_data in data_rows:
             # Criar nova linha
-            new_row = ET.Element(f"{{{namespaces['table']}}}table-row")
+            new_row = XML.Element(f"{{{namespaces['table']}}}table-row")
             
             for cell_data in row_data:
                 # Criar nova célula
-                new_cell = ET.Element(f"{{{namespaces['table']}}}table-cell")
+                new_cell = XML.Element(f"{{{namespaces['table']}}}table-cell")
                 new_cell.set(f"{{{namespaces['table']}}}value-type", "string")
                 
                 # Criar parágrafo com texto
-                paragraph = ET.Element(f"{{{namespaces['text']}}}p")
+                paragraph = XML.Element(f"{{{namespaces['text']}}}p")
                 paragraph.text = str(cell_data)
                 new_cell.append(paragraph)
                 
@@ -431,26 +476,48 @@ class SupabaseODSIntegrator:
             sheet.append(new_row)
             current_row += 1
             
+        contar(linhas=len(data_rows))
         return root
         
     def save_modified_ods(self, modified_root):
         """Salvar planilha ODS modificada"""
-        # Criar arquivo temporário
-        temp_content = ET.tostring(modified_root, encoding='utf-8', xml_declaration=True)
+        with etapa('serializar') as e:
+            temp_content = XML.tostring(modified_root)
+            e.contar(bytes=len(temp_content))
         
-        # Recriar arquivo ODS
-        with zipfile.ZipFile(self.ods_file_path, 'r') as original_zip:
-            with zipfile.ZipFile(f"{self.ods_file_path}.temp", 'w', zipfile.ZIP_DEFLATED) as new_zip:
-                # Copiar todos os arquivos exceto content.xml
-                for item in original_zip.infolist():
-                    if item.filename != 'content.xml':
-                        new_zip.writestr(item, original_zip.read(item.filename))
-                
-                # Adicionar content.xml modificado
-                new_zip.writestr('content.xml', temp_content)
+        # Recriar arquivo ODS com lock e substituição atômica do original
+        substituir_content_xml(self.ods_file_path, temp_content)
         
-        # Substituir arquivo original
-        os.replace(f"{self.ods_file_path}.temp", self.ods_file_path)
+    def insert_and_save(self, data_rows: List[List[str]], start_row: int = 30) -> Dict[str, Any]:
+        """
+        Inserir as linhas e salvar a planilha em uma única reescrita
+
+        Leitura do content.xml, inserção e substituição do arquivo passam pela
+        fila de escrita da planilha, sob lock do começo ao fim: exportações
+        concorrentes não partem da mesma base nem sobrescrevem umas às outras.
+        O manifesto sai do content.xml gravado, ainda sob o lock, com a linha
+        onde o bloco começou ('linha_inicio') para a verificação conferir ali.
+
+        Returns:
+            dict: Manifesto da exportação (gerar_manifesto)
+        """
+        def inserir(root):
+            # As linhas vão para o fim da tabela: o bloco começa logo depois da última
+            linha_inicio = contar_linhas(root) + 1
+            self.insert_data_into_ods(data_rows, start_row, root=root)
+            return linha_inicio
+
+        fila = obter_fila(self.ods_file_path)
+        return fila.submeter(
+            inserir,
+            apos_gravar=lambda linha_inicio, content_xml: gerar_manifesto(self.ods_file_path, data_rows,
+                                                                          content_xml=content_xml,
+                                                                          linha_inicio=linha_inicio)
+        ).result()
+        
+    def stream_modified_ods(self, modified_root, output) -> int:
+        """Gravar a planilha modificada direto em um stream (stdout, socket, BytesIO), sem tocar no original"""
+        return transmitir_ods(self.ods_file_path, output, root=modified_root)
         
     def integrate_supabase_data(self, start_row: int = 30):
         """Processo completo de integração com dados do Supabase"""
@@ -475,17 +542,13 @@ class SupabaseODSIntegrator:
             print("📝 Formatando dados para inserção...")
             formatted_data = self.format_diretoria_data_for_ods(diretoria_data)
             
-            # Inserir dados na planilha
+            # Inserir dados, salvar a planilha e o manifesto (fila de escrita, sob lock)
             print("📋 Inserindo dados na planilha...")
-            modified_root = self.insert_data_into_ods(formatted_data, start_row)
-            
-            # Salvar planilha modificada
-            print("💾 Salvando planilha modificada...")
-            self.save_modified_ods(modified_root)
+            manifesto = self.insert_and_save(formatted_data, start_row)
             
             print("✅ Integração com Supabase concluída com sucesso!")
             print(f"📁 Backup salvo em: {self.backup_path}")
-            print(f"📊 {len(formatted_data)} linhas inseridas a partir da linha {start_row}")
+            print(f"📊 {len(formatted_data)} linhas inseridas a partir da linha {manifesto['linha_inicio']}")
             print(f"🎯 {len(diretoria_data['periodos'])} períodos processados")
             
             # Mostrar resumo dos períodos
@@ -499,8 +562,14 @@ class SupabaseODSIntegrator:
             print(f"❌ Erro durante a integração: {str(e)}")
             return False
 
-def main():
+def main(argv=None):
     """Função principal"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Integração Supabase + ODS')
+    parser.add_argument('--cache', metavar='DIR', help='Reaproveitar os períodos já calculados guardados em DIR')
+    args = parser.parse_args(argv)
+
     ods_file = r"c:\Users\BLITZ\Desktop\FOCO\blitz\Pedido Diária Padrao (3).ods"
     
     if not os.path.exists(ods_file):
@@ -508,7 +577,11 @@ def main():
         return
         
     # Configurar integrador
-    integrator = SupabaseODSIntegrator(ods_file)
+    cache_periodos = None
+    if args.cache:
+        from ods_period_cache import CachePeriodos
+        cache_periodos = CachePeriodos(args.cache)
+    integrator = SupabaseODSIntegrator(ods_file, cache_periodos=cache_periodos)
     
     print("🚀 Integração Supabase + ODS")
     print("=============================")
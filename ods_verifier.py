@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Verificação estrutural de exportações ODS
+Em vez de procurar nomes soltos no XML, confere o bloco completo de linhas
+que a exportação gerou, célula por célula, em uma única passada pela planilha.
+
+O bloco é localizado com KMP sobre as linhas, então a verificação custa
+O(linhas da planilha + linhas do bloco), independente de quantas linhas são
+esperadas. Quando o bloco não é encontrado, a divergência reportada é a da
+tentativa que casou mais linhas.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ods_instrumentation import medido
+from ods_stream_reader import iterar_linhas
+
+COLUNAS_BLOCO = 6
+
+
+def normalizar_celulas(celulas: Sequence[Any]) -> Tuple[str, ...]:
+    """Textos da linha como tupla, sem as células vazias do final"""
+    textos = ['' if c is None else str(c) for c in celulas]
+    while textos and textos[-1] == '':
+        textos.pop()
+    return tuple(textos)
+
+
+def linhas_para_celulas(linhas_formatadas: List[Any]) -> List[Tuple[str, ...]]:
+    """
+    Converte as linhas produzidas pelos integradores em textos de células
+
+    Aceita tanto listas de células (format_diretoria_data_for_ods) quanto os
+    dicionários com 'tipo' de formatar_para_ods / formatar_dados_para_ods.
+    """
+    resultado = []
+    for linha in linhas_formatadas:
+        if isinstance(linha, dict):
+            if linha['tipo'] == 'periodo':
+                # Célula mesclada seguida das células cobertas
+                celulas = [linha['conteudo']] + [''] * (COLUNAS_BLOCO - 1)
+            elif linha['tipo'] == 'separador':
+                celulas = [''] * COLUNAS_BLOCO
+            else:
+                celulas = linha['colunas']
+        else:
+            celulas = linha
+        resultado.append(normalizar_celulas(celulas))
+    return resultado
+
+
+def _tabela_falhas(padrao: List[Tuple[str, ...]]) -> List[int]:
+    falhas = [0] * len(padrao)
+    k = 0
+    for i in range(1, len(padrao)):
+        while k > 0 and padrao[i] != padrao[k]:
+            k = falhas[k - 1]
+        if padrao[i] == padrao[k]:
+            k += 1
+        falhas[i] = k
+    return falhas
+
+
+def _primeira_coluna_divergente(esperado: Tuple[str, ...], encontrado: Tuple[str, ...]) -> int:
+    for coluna in range(max(len(esperado), len(encontrado))):
+        valor_esperado = esperado[coluna] if coluna < len(esperado) else ''
+        valor_encontrado = encontrado[coluna] if coluna < len(encontrado) else ''
+        if valor_esperado != valor_encontrado:
+            return coluna + 1
+    return 0
+
+
+@medido('verificar')
+def verificar_bloco(ods_path: str, linhas_formatadas: List[Any],
+                    linha_inicio: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Confere se o bloco de linhas exportado está na primeira tabela da planilha
+
+    Args:
+        ods_path (str): Caminho do arquivo ODS
+        linhas_formatadas (list): Linhas que a exportação gerou
+        linha_inicio (int): Posição exata esperada do bloco (1-indexed); se
+            omitida, o bloco é procurado em qualquer posição
+
+    Returns:
+        dict: 'ok', 'linhas' (tamanho do bloco), 'linha_inicio' (posição
+        encontrada, se ok) e 'divergencia' (linha, coluna, esperado, encontrado)
+    """
+    padrao = linhas_para_celulas(linhas_formatadas)
+    resultado = {'ok': False, 'linhas': len(padrao), 'linha_inicio': None, 'divergencia': None}
+
+    if not padrao:
+        resultado['ok'] = True
+        return resultado
+
+    if linha_inicio is not None:
+        indice = 0
+        for posicao, celulas in iterar_linhas(ods_path):
+            if posicao < linha_inicio:
+                continue
+            encontrado = tuple(celulas)
+            if encontrado != padrao[indice]:
+                resultado['divergencia'] = _divergencia(posicao, padrao[indice], encontrado)
+                return resultado
+            indice += 1
+            if indice == len(padrao):
+                resultado['ok'] = True
+                resultado['linha_inicio'] = linha_inicio
+                return resultado
+        resultado['divergencia'] = _divergencia(linha_inicio + indice, padrao[indice], None)
+        return resultado
+
+    falhas = _tabela_falhas(padrao)
+    k = 0
+    melhor = -1
+    ultima_posicao = 0
+    for posicao, celulas in iterar_linhas(ods_path):
+        ultima_posicao = posicao
+        encontrado = tuple(celulas)
+        if k > 0 and encontrado != padrao[k] and k > melhor:
+            melhor = k
+            resultado['divergencia'] = _divergencia(posicao, padrao[k], encontrado)
+        while k > 0 and encontrado != padrao[k]:
+            k = falhas[k - 1]
+        if encontrado == padrao[k]:
+            k += 1
+        if k == len(padrao):
+            resultado['ok'] = True
+            resultado['linha_inicio'] = posicao - len(padrao) + 1
+            resultado['divergencia'] = None
+            return resultado
+
+    if k > melhor and k > 0:
+        # A planilha acabou no meio do bloco
+        resultado['divergencia'] = _divergencia(ultima_posicao + 1, padrao[k], None)
+    elif resultado['divergencia'] is None:
+        resultado['divergencia'] = {'linha': None, 'coluna': 1, 'esperado': padrao[0][0] if padrao[0] else '',
+                                    'encontrado': None, 'motivo': 'primeira linha do bloco não encontrada'}
+    return resultado
+
+
+def _divergencia(posicao: int, esperado: Tuple[str, ...], encontrado: Optional[Tuple[str, ...]]) -> Dict[str, Any]:
+    if encontrado is None:
+        return {'linha': posicao, 'coluna': 1, 'esperado': esperado[0] if esperado else '',
+                'encontrado': None, 'motivo': 'planilha terminou antes do fim do bloco'}
+    coluna = _primeira_coluna_divergente(esperado, encontrado)
+    return {
+        'linha': posicao,
+        'coluna': coluna,
+        'esperado': esperado[coluna - 1] if coluna - 1 < len(esperado) else '',
+        'encontrado': encontrado[coluna - 1] if coluna - 1 < len(encontrado) else '',
+        'motivo': 'célula diferente'
+    }
+
+
+def imprimir_resultado(resultado: Dict[str, Any]):
+    """Mostra o resultado da verificação no formato das mensagens dos scripts"""
+    if resultado['ok']:
+        print(f"  ✅ Bloco de {resultado['linhas']} linhas confere a partir da linha {resultado['linha_inicio']}")
+        return
+
+    divergencia = resultado['divergencia']
+    if divergencia['linha'] is None:
+        print(f"  ❌ Bloco não encontrado: primeira linha '{divergencia['esperado']}' não está na planilha")
+    else:
+        print(f"  ❌ Divergência na linha {divergencia['linha']}, coluna {divergencia['coluna']} "
+              f"({divergencia['motivo']}): esperado '{divergencia['esperado']}', "
+              f"encontrado '{divergencia['encontrado']}'")
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gerador de carga sintética: janelas, operações e participações
+Substitui os poucos registros escritos à mão dos integradores
+(get_mock_supabase_data, obter_dados_react_diretoria, get_diretoria_data_mock)
+por dados realistas em qualquer escala, sempre os mesmos para a mesma semente:
+
+- operações por dia em cada janela, com dias sem operação;
+- servidores com um ou mais períodos de dias seguidos por janela, e buracos
+  quando o dia não tem operação;
+- estado_visual em proporções configuráveis (confirmados, adicionados pelo
+  supervisor, fila, pendentes, cancelados) e participações inativas.
+
+Cada servidor de cada janela tem o próprio gerador aleatório, derivado da
+semente: os dados saem em streaming, servidor a servidor, sem montar a carga
+inteira na memória (milhões de linhas em JSON lines).
+
+Uso:
+    python ods_workload.py jsonl [--semente 42] [--servidores 200] [--janelas 1] [--dias 30]
+                                 [--formato api|supabase] [--saida carga.jsonl]
+    python ods_workload.py serve [--port 3001] [...mesmas opções de escala]
+        (API local no lugar do Next.js:
+         python ods_cli.py export --source api --api http://127.0.0.1:3001;
+         latência, erros e gzip pelo ods_mock_api.py)
+"""
+
+import json
+import os
+import random
+import sys
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+ESTADOS_PADRAO = {
+    'CONFIRMADO': 70,
+    'ADICIONADO_SUP': 10,
+    'NA_FILA': 12,
+    'PENDENTE': 5,
+    'CANCELADO': 3,
+}
+# Estados que entram na planilha (mesmo filtro dos integradores)
+ESTADOS_CONFIRMADOS = ('CONFIRMADO', 'ADICIONADO_SUP')
+
+MODALIDADES = ('BLITZ', 'BLITZ', 'BLITZ', 'BALANCA')
+TURNOS = ('MANHA', 'TARDE', 'NOITE')
+
+NOMES = (
+    'ANTÔNIA', 'ANTÔNIO', 'CIDNO', 'DOUGLAS', 'JOSÉ', 'MARIA', 'PEDRO', 'ANA', 'RICARDO', 'FERNANDA',
+    'CARLOS', 'JULIANA', 'ROBERTO', 'FRANCISCO', 'RAIMUNDO', 'FRANCISCA', 'LUCAS', 'MÁRCIO', 'JOÃO',
+    'PAULO', 'SÉRGIO', 'CLÁUDIA', 'PATRÍCIA', 'FÁBIO', 'ÍTALO', 'LUÍS', 'MÔNICA', 'VITÓRIA', 'IVANILDO',
+)
+SOBRENOMES = (
+    'SILVA', 'SANTOS', 'OLIVEIRA', 'SOUZA', 'LIMA', 'COSTA', 'FERREIRA', 'RODRIGUES', 'ALMEIDA',
+    'CARVALHO', 'ARAÚJO', 'MORAIS', 'CAETANO', 'FABRÍCIO', 'MENEZES', 'BEZERRA', 'NOGUEIRA',
+    'CAVALCANTE', 'PEREIRA', 'BARBOSA', 'MONTEIRO', 'GONÇALVES', 'FREITAS', 'ROCHA', 'TAVARES',
+)
+PARTICULAS = ('', '', '', 'DA ', 'DE ', 'DOS ', 'DAS ')
+
+# Faixas dos ids: permitem achar a janela e o dia de uma operação sem gerar as anteriores
+MAX_PARTICIPACOES_JANELA = 10_000_000
+
+
+def _escolha_pesada(rng: random.Random, pesos: List[Tuple[str, int]], total: int) -> str:
+    alvo = rng.random() * total
+    for valor, peso in pesos:
+        alvo -= peso
+        if alvo < 0:
+            return valor
+    return pesos[-1][0]
+
+
+class GeradorCarga:
+    """Carga sintética determinística (mesma semente, mesmos dados)"""
+
+    def __init__(self, semente: int = 42, servidores: int = 200, janelas: int = 1, dias: int = 30,
+                 inicio: date = date(2025, 10, 3), operacoes_por_dia: int = 2,
+                 dias_sem_operacao: float = 0.15, presenca: float = 0.85,
+                 periodos_por_servidor: Tuple[int, int] = (1, 3), dias_por_periodo: Tuple[int, int] = (1, 5),
+                 estados: Optional[Dict[str, int]] = None, inativas: float = 0.02):
+        """
+        Args:
+            semente (int): Semente de todos os geradores aleatórios
+            servidores (int): Servidores cadastrados
+            janelas (int): Janelas operacionais seguidas, de 'dias' dias cada
+            dias (int): Duração de cada janela
+            inicio (date): Primeiro dia da primeira janela
+            operacoes_por_dia (int): Máximo de operações em um dia
+            dias_sem_operacao (float): Fração dos dias sem nenhuma operação
+            presenca (float): Fração dos servidores que participam de cada janela
+            periodos_por_servidor (tuple): Mínimo e máximo de períodos por servidor na janela
+            dias_por_periodo (tuple): Mínimo e máximo de dias seguidos de cada período
+            estados (dict): Peso de cada estado_visual (padrão: ESTADOS_PADRAO)
+            inativas (float): Fração das participações não canceladas com ativa=False
+        """
+        self.semente = semente
+        self.num_servidores = servidores
+        self.num_janelas = janelas
+        self.dias = dias
+        self.inicio = inicio
+        self.operacoes_por_dia = operacoes_por_dia
+        self.dias_sem_operacao = dias_sem_operacao
+        self.presenca = presenca
+        self.periodos_por_servidor = periodos_por_servidor
+        self.dias_por_periodo = dias_por_periodo
+        self.inativas = inativas
+        self._estados = list((estados or ESTADOS_PADRAO).items())
+        self._total_estados = sum(peso for _, peso in self._estados)
+        self._servidores: Optional[List[Dict[str, Any]]] = None
+        self._operacoes: Dict[int, List[Dict[str, Any]]] = {}
+        # Índice operação -> participações de uma janela por vez (para a API local)
+        self._indice: Tuple[Optional[int], Dict[int, List[Dict[str, Any]]]] = (None, {})
+
+    def _rng(self, *partes) -> random.Random:
+        return random.Random(':'.join(str(p) for p in (self.semente,) + partes))
+
+    # -- cadastros ------------------------------------------------------------
+
+    def servidores(self) -> List[Dict[str, Any]]:
+        """Servidores cadastrados: membro_id, nome e matrícula (única)"""
+        if self._servidores is None:
+            rng = self._rng('servidores')
+            self._servidores = []
+            for membro_id in range(1, self.num_servidores + 1):
+                nome = f"{rng.choice(NOMES)} {rng.choice(NOMES) + ' ' if rng.random() < 0.4 else ''}" \
+                       f"{rng.choice(PARTICULAS)}{rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}"
+                self._servidores.append({
+                    'membro_id': membro_id,
+                    'nome': nome,
+                    'matricula': str(300000 + membro_id * 13 + rng.randrange(13)),
+                })
+        return self._servidores
+
+    def janelas(self) -> List[Dict[str, Any]]:
+        """Janelas operacionais seguidas, todas ATIVA"""
+        resultado = []
+        for indice in range(self.num_janelas):
+            inicio = self.inicio + timedelta(days=indice * self.dias)
+            fim = inicio + timedelta(days=self.dias - 1)
+            resultado.append({
+                'id': indice + 1,
+                'titulo': f"Janela {inicio.strftime('%d/%m')} a {fim.strftime('%d/%m/%Y')}",
+                'status': 'ATIVA',
+                'data_inicio': inicio.isoformat(),
+                'data_fim': fim.isoformat(),
+            })
+        return resultado
+
+    def _id_operacao(self, janela_id: int, dia: int, ordem: int) -> int:
+        return ((janela_id - 1) * self.dias + dia) * self.operacoes_por_dia + ordem + 1
+
+    def janela_da_operacao(self, operacao_id: int) -> int:
+        return (operacao_id - 1) // self.operacoes_por_dia // self.dias + 1
+
+    def operacoes(self, janela_id: int) -> List[Dict[str, Any]]:
+        """Operações planejadas da janela, de zero a operacoes_por_dia por dia"""
+        if janela_id not in self._operacoes:
+            rng = self._rng('operacoes', janela_id)
+            inicio = self.inicio + timedelta(days=(janela_id - 1) * self.dias)
+            operacoes = []
+            for dia in range(self.dias):
+                if rng.random() < self.dias_sem_operacao:
+                    continue
+                data = (inicio + timedelta(days=dia)).isoformat()
+                for ordem in range(rng.randint(1, self.operacoes_por_dia)):
+                    operacoes.append({
+                        'id': self._id_operacao(janela_id, dia, ordem),
+                        'janela_id': janela_id,
+                        'data_operacao': data,
+                        'modalidade': rng.choice(MODALIDADES),
+                        'tipo': 'PLANEJADA',
+                        'turno': TURNOS[ordem % len(TURNOS)],
+                        'limite_participantes': rng.choice((10, 15, 20, 30)),
+                    })
+            if len(self._operacoes) >= 4:
+                self._operacoes.pop(next(iter(self._operacoes)))
+            self._operacoes[janela_id] = operacoes
+        return self._operacoes[janela_id]
+
+    # -- participações --------------------------------------------------------
+
+    def _dias_do_servidor(self, rng: random.Random) -> List[int]:
+        # Períodos de dias seguidos, separados por pelo menos um dia livre
+        quantidade = rng.randint(*self.periodos_por_servidor)
+        dias = []
+        cursor = rng.randrange(max(1, self.dias // 2))
+        for _ in range(quantidade):
+            duracao = rng.randint(*self.dias_por_periodo)
+            if cursor >= self.dias:
+                break
+            dias.extend(range(cursor, min(self.dias, cursor + duracao)))
+            cursor += duracao + rng.randint(2, 6)
+        return dias
+
+    def participacoes(self, janela_id: int) -> Iterator[Dict[str, Any]]:
+        """Participações da janela, servidor a servidor (streaming)"""
+        por_dia: Dict[str, List[Dict[str, Any]]] = {}
+        for operacao in self.operacoes(janela_id):
+            por_dia.setdefault(operacao['data_operacao'], []).append(operacao)
+        inicio = self.inicio + timedelta(days=(janela_id - 1) * self.dias)
+        datas = [(inicio + timedelta(days=dia)).isoformat() for dia in range(self.dias)]
+
+        sequencia = janela_id * MAX_PARTICIPACOES_JANELA
+        for servidor in self.servidores():
+            rng = self._rng('participacoes', janela_id, servidor['membro_id'])
+            if rng.random() >= self.presenca:
+                continue
+            for dia in self._dias_do_servidor(rng):
+                operacoes_do_dia = por_dia.get(datas[dia])
+                if not operacoes_do_dia:
+                    # Dia sem operação: o período do servidor fica quebrado
+                    continue
+                operacao = rng.choice(operacoes_do_dia)
+                estado = _escolha_pesada(rng, self._estados, self._total_estados)
+                sequencia += 1
+                yield {
+                    'id': sequencia,
+                    'operacao_id': operacao['id'],
+                    'data_operacao': operacao['data_operacao'],
+                    'membro_id': servidor['membro_id'],
+                    'servidor_nome': servidor['nome'],
+                    'nome': servidor['nome'],
+                    'matricula': servidor['matricula'],
+                    'estado_visual': estado,
+                    'ativa': estado != 'CANCELADO' and rng.random() >= self.inativas,
+                }
+
+    def participacoes_operacao(self, operacao_id: int) -> List[Dict[str, Any]]:
+        """Participações de uma operação (indexa a janela dela na primeira consulta)"""
+        janela_id = self.janela_da_operacao(operacao_id)
+        if self._indice[0] != janela_id:
+            indice: Dict[int, List[Dict[str, Any]]] = {}
+            for participacao in self.participacoes(janela_id):
+                indice.setdefault(participacao['operacao_id'], []).append(participacao)
+            self._indice = (janela_id, indice)
+        return self._indice[1].get(operacao_id, [])
+
+    # -- formatos dos integradores ---------------------------------------------
+
+    def linhas_supabase(self, janela_id: int = 1) -> Iterator[Dict[str, Any]]:
+        """Linhas como as da consulta do Supabase (get_mock_supabase_data): só confirmadas e ativas"""
+        modalidade = {op['id']: op['modalidade'] for op in self.operacoes(janela_id)}
+        for p in self.participacoes(janela_id):
+            if p['ativa'] and p['estado_visual'] in ESTADOS_CONFIRMADOS:
+                yield {
+                    'operacao_id': p['operacao_id'],
+                    'data_operacao': p['data_operacao'],
+                    'modalidade': modalidade[p['operacao_id']],
+                    'tipo': 'PLANEJADA',
+                    'participacao_id': p['id'],
+                    'membro_id': p['membro_id'],
+                    'servidor_nome': p['servidor_nome'],
+                    'matricula': p['matricula'],
+                    'estado_visual': p['estado_visual'],
+                }
+
+    def dados_api_final(self, janela_id: int = 1) -> Dict[str, Any]:
+        """Estrutura de obter_dados_api_diretoria() do ods_api_final_integration"""
+        janela = self.janelas()[janela_id - 1]
+        return {
+            'janelas_operacionais': [{'janela_id': janela_id, 'data_inicio': janela['data_inicio'],
+                                      'data_fim': janela['data_fim'], 'supervisor': 'SUPERVISOR', 'ativa': True}],
+            'operacoes': [{'operacao_id': op['id'], 'data_operacao': op['data_operacao'],
+                           'modalidade': op['modalidade']} for op in self.operacoes(janela_id)],
+            'participacoes': [{'operacao_id': p['operacao_id'], 'servidor_nome': p['servidor_nome'],
+                               'matricula': p['matricula'],
+                               'confirmado': p['ativa'] and p['estado_visual'] in ESTADOS_CONFIRMADOS}
+                              for p in self.participacoes(janela_id)],
+        }
+
+    def registros(self, formato: str = 'api') -> Iterator[Dict[str, Any]]:
+        """
+        Toda a carga em registros com 'registro' (janela, operacao ou participacao), para JSON lines
+
+        'api': janelas, operações e participações como a API as devolve;
+        'supabase': só as linhas da consulta do Supabase.
+        """
+        for janela in self.janelas():
+            if formato == 'supabase':
+                for linha in self.linhas_supabase(janela['id']):
+                    yield {'registro': 'participacao', **linha}
+                continue
+            yield {'registro': 'janela', **janela}
+            for operacao in self.operacoes(janela['id']):
+                yield {'registro': 'operacao', **operacao}
+            for participacao in self.participacoes(janela['id']):
+                yield {'registro': 'participacao', **participacao}
+
+    # -- API ------------------------------------------------------------------
+
+    def responder(self, caminho: str, params: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, Any]]:
+        """
+        Resposta dos endpoints /api/... usados pelos integradores
+
+        Returns:
+            tuple: (status HTTP, corpo JSON)
+        """
+        params = params or {}
+        partes = caminho.strip('/').split('/')
+        if caminho == '/api/supervisor/janelas-operacionais':
+            return 200, {'success': True, 'data': self.janelas()}
+        if caminho == '/api/unified/operacoes':
+            try:
+                janela_id = int(params.get('janela_id', 1))
+            except ValueError:
+                return 400, {'success': False, 'error': 'janela_id inválido'}
+            if not 1 <= janela_id <= self.num_janelas:
+                return 200, {'success': True, 'data': []}
+            return 200, {'success': True, 'data': self.operacoes(janela_id)}
+        if len(partes) == 5 and partes[:3] == ['api', 'agendamento', 'operacoes'] and partes[4] == 'participacoes':
+            try:
+                operacao_id = int(partes[3])
+            except ValueError:
+                return 400, {'success': False, 'error': 'operação inválida'}
+            if not 1 <= self.janela_da_operacao(operacao_id) <= self.num_janelas:
+                return 404, {'success': False, 'error': 'operação não encontrada'}
+            return 200, {'success': True, 'data': self.participacoes_operacao(operacao_id)}
+        return 404, {'success': False, 'error': 'não encontrado'}
+
+
+def escrever_jsonl(registros: Iterator[Dict[str, Any]], saida: TextIO) -> int:
+    """Um registro JSON por linha; devolve a quantidade"""
+    total = 0
+    for registro in registros:
+        saida.write(json.dumps(registro, ensure_ascii=False, separators=(',', ':')))
+        saida.write('\n')
+        total += 1
+    return total
+
+
+def adicionar_opcoes_escala(parser):
+    """Opções de escala do gerador (também usadas pelo ods_mock_api.py)"""
+    parser.add_argument('--semente', type=int, default=42, help='Semente (mesma semente, mesmos dados)')
+    parser.add_argument('--servidores', type=int, default=200, help='Servidores cadastrados')
+    parser.add_argument('--janelas', type=int, default=1, help='Janelas operacionais')
+    parser.add_argument('--dias', type=int, default=30, help='Dias de cada janela')
+    parser.add_argument('--operacoes-por-dia', type=int, default=2, help='Máximo de operações por dia')
+    parser.add_argument('--dias-sem-operacao', type=float, default=0.15, help='Fração de dias sem operação')
+
+
+def gerador_dos_args(args) -> GeradorCarga:
+    return GeradorCarga(args.semente, args.servidores, args.janelas, args.dias,
+                        operacoes_por_dia=args.operacoes_por_dia, dias_sem_operacao=args.dias_sem_operacao)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Carga sintética de janelas, operações e participações')
+    parser.add_argument('comando', choices=['jsonl', 'serve'], help='jsonl: gravar a carga; serve: API local')
+    adicionar_opcoes_escala(parser)
+    parser.add_argument('--formato', choices=['api', 'supabase'], default='api', help='Registros gravados (jsonl)')
+    parser.add_argument('--saida', '-o', help='Arquivo JSON lines (padrão: stdout)')
+    parser.add_argument('--port', type=int, default=3001, help='Porta em 127.0.0.1 (serve)')
+
+    args = parser.parse_args(argv)
+    gerador = gerador_dos_args(args)
+
+    if args.comando == 'serve':
+        from ods_mock_api import servir
+        return servir(gerador, args.port)
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            total = escrever_jsonl(gerador.registros(args.formato), f)
+        print(f"📝 {total:,} registros gravados em {args.saida}", file=sys.stderr)
+    else:
+        try:
+            total = escrever_jsonl(gerador.registros(args.formato), sys.stdout)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # Quem lia fechou a saída (ex.: '| head'): não há mais para quem escrever
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return 0
+        print(f"📝 {total:,} registros gerados", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
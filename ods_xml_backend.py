@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backend de XML dos scripts ODS
+Todos os scripts fazem parse, alteração e serialização do content.xml através
+deste módulo. Quando o lxml está instalado ele é usado (parse, iterparse e
+serialização em C, e escrita incremental com xmlfile); senão, cai para o
+xml.etree.ElementTree da biblioteca padrão, com a mesma interface.
+
+A escolha pode ser forçada pela variável de ambiente ODS_XML_BACKEND
+('lxml', 'stdlib' ou 'auto', o padrão).
+"""
+
+import os
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+# Prefixos padrão do OpenDocument, usados ao serializar elementos novos
+ODF_NAMESPACES = {
+    'office': 'urn:oasis:names:tc:opendocument:xmlns:office:1.0',
+    'style': 'urn:oasis:names:tc:opendocument:xmlns:style:1.0',
+    'text': 'urn:oasis:names:tc:opendocument:xmlns:text:1.0',
+    'table': 'urn:oasis:names:tc:opendocument:xmlns:table:1.0',
+    'draw': 'urn:oasis:names:tc:opendocument:xmlns:drawing:1.0',
+    'fo': 'urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0',
+    'xlink': 'http://www.w3.org/1999/xlink',
+    'dc': 'http://purl.org/dc/elements/1.1/',
+    'meta': 'urn:oasis:names:tc:opendocument:xmlns:meta:1.0',
+    'number': 'urn:oasis:names:tc:opendocument:xmlns:datastyle:1.0',
+    'svg': 'urn:oasis:names:tc:opendocument:xmlns:svg-compatible:1.0',
+    'of': 'urn:oasis:names:tc:opendocument:xmlns:of:1.2',
+    'loext': 'urn:org:documentfoundation:names:experimental:office:xmlns:loext:1.0',
+}
+for _prefixo, _uri in ODF_NAMESPACES.items():
+    ET.register_namespace(_prefixo, _uri)
+
+
+# Equivalentes de xml.sax.saxutils.escape/quoteattr: importar o saxutils puxa
+# o urllib.request (e o http.client) e custa dezenas de ms na partida
+def escape(texto: str) -> str:
+    """Escapa &, < e > para texto de elemento XML"""
+    return texto.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def quoteattr(texto: str) -> str:
+    """Valor de atributo XML já entre aspas"""
+    texto = escape(texto).replace('"', '&quot;')
+    return '"' + texto.replace('\n', '&#10;').replace('\r', '&#13;').replace('\t', '&#9;') + '"'
+
+
+class StdlibBackend:
+    """Backend baseado em xml.etree.ElementTree"""
+
+    nome = 'stdlib'
+
+    def __init__(self):
+        self.etree = ET
+
+    def fromstring(self, dados: bytes):
+        return ET.fromstring(dados)
+
+    def tostring(self, root) -> bytes:
+        return ET.tostring(root, encoding='utf-8', xml_declaration=True)
+
+    def write(self, root, output):
+        """Serializa direto em um objeto com write(), em pedaços"""
+        ET.ElementTree(root).write(output, encoding='utf-8', xml_declaration=True)
+
+    def iterparse(self, source, events=('end',)):
+        return ET.iterparse(source, events=events)
+
+    def Element(self, tag: str, attrib: Optional[Dict[str, str]] = None):
+        return ET.Element(tag, attrib or {})
+
+    def SubElement(self, parent, tag: str, attrib: Optional[Dict[str, str]] = None):
+        return ET.SubElement(parent, tag, attrib or {})
+
+    def xmlfile(self, output):
+        return _StdlibXMLFile(output)
+
+
+class LxmlBackend:
+    """Backend baseado em lxml.etree"""
+
+    nome = 'lxml'
+
+    def __init__(self):
+        from lxml import etree
+        self.etree = etree
+        # huge_tree: planilhas grandes passam dos limites padrão de proteção do libxml2
+        self._parser = etree.XMLParser(huge_tree=True, remove_blank_text=False)
+
+    def fromstring(self, dados: bytes):
+        return self.etree.fromstring(dados, self._parser)
+
+    def tostring(self, root) -> bytes:
+        return self.etree.tostring(root, encoding='UTF-8', xml_declaration=True)
+
+    def write(self, root, output):
+        self.etree.ElementTree(root).write(output, encoding='UTF-8', xml_declaration=True)
+
+    def iterparse(self, source, events=('end',)):
+        return self.etree.iterparse(source, events=events, huge_tree=True)
+
+    def Element(self, tag: str, attrib: Optional[Dict[str, str]] = None):
+        return self.etree.Element(tag, attrib or {})
+
+    def SubElement(self, parent, tag: str, attrib: Optional[Dict[str, str]] = None):
+        return self.etree.SubElement(parent, tag, attrib or {})
+
+    def xmlfile(self, output):
+        return _LxmlXMLFile(self.etree, output)
+
+
+class _LxmlXMLFile:
+    """Adapta etree.xmlfile à interface usada pelos escritores"""
+
+    def __init__(self, etree, output):
+        self._contexto = etree.xmlfile(output, encoding='utf-8')
+        self._xf = None
+
+    def __enter__(self):
+        self._xf = self._contexto.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._contexto.__exit__(*exc)
+
+    def write_declaration(self):
+        self._xf.write_declaration()
+
+    def element(self, tag: str, attrib: Optional[Dict[str, str]] = None, nsmap: Optional[Dict[str, str]] = None):
+        return self._xf.element(tag, attrib or {}, nsmap=nsmap)
+
+    def write(self, item):
+        self._xf.write(item)
+
+
+class _StdlibXMLFile:
+    """
+    Escrita incremental de XML para a biblioteca padrão
+
+    Imita o subconjunto de lxml.etree.xmlfile usado aqui: element() abre uma
+    tag e a fecha ao sair do bloco; write() grava texto ou um elemento inteiro.
+    Os nomes '{uri}local' são escritos com os prefixos do OpenDocument.
+    """
+
+    def __init__(self, output):
+        self._output = output
+        self._prefixos = {uri: prefixo for prefixo, uri in ODF_NAMESPACES.items()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def _qualificar(self, nome: str) -> str:
+        if nome[0] != '{':
+            return nome
+        uri, local = nome[1:].split('}', 1)
+        if uri == 'http://www.w3.org/XML/1998/namespace':
+            return f"xml:{local}"
+        if uri not in self._prefixos:
+            self._prefixos[uri] = f"ns{len(self._prefixos)}"
+        return f"{self._prefixos[uri]}:{local}"
+
+    def _atributos(self, attrib) -> str:
+        return ''.join(f" {self._qualificar(k)}={quoteattr(v)}" for k, v in attrib.items())
+
+    def _gravar(self, texto: str):
+        self._output.write(texto.encode('utf-8'))
+
+    def write_declaration(self):
+        self._gravar("<?xml version='1.0' encoding='utf-8'?>\n")
+
+    @contextmanager
+    def element(self, tag: str, attrib: Optional[Dict[str, str]] = None, nsmap: Optional[Dict[str, str]] = None):
+        declaracoes = ''
+        for prefixo, uri in (nsmap or {}).items():
+            self._prefixos[uri] = prefixo
+            declaracoes += f" xmlns:{prefixo}={quoteattr(uri)}"
+        nome = self._qualificar(tag)
+        self._gravar(f"<{nome}{declaracoes}{self._atributos(attrib or {})}>")
+        yield
+        self._gravar(f"</{nome}>")
+
+    def write(self, item):
+        if isinstance(item, str):
+            self._gravar(escape(item))
+        else:
+            self._gravar(self._serializar(item))
+
+    def _serializar(self, elem) -> str:
+        nome = self._qualificar(elem.tag)
+        partes = [f"<{nome}{self._atributos(elem.attrib)}"]
+        if len(elem) == 0 and not elem.text:
+            partes.append('/>')
+        else:
+            partes.append('>')
+            if elem.text:
+                partes.append(escape(elem.text))
+            for filho in elem:
+                partes.append(self._serializar(filho))
+            partes.append(f"</{nome}>")
+        if elem.tail:
+            partes.append(escape(elem.tail))
+        return ''.join(partes)
+
+
+_backends: Dict[str, Any] = {}
+
+
+def obter_backend(nome: Optional[str] = None):
+    """
+    Retorna o backend de XML
+
+    Args:
+        nome (str): 'lxml', 'stdlib' ou 'auto' (padrão: ODS_XML_BACKEND ou 'auto')
+    """
+    nome = nome or os.environ.get('ODS_XML_BACKEND', 'auto')
+    if nome not in _backends:
+        if nome == 'stdlib':
+            _backends[nome] = StdlibBackend()
+        elif nome == 'lxml':
+            _backends[nome] = LxmlBackend()
+        else:
+            try:
+                _backends[nome] = LxmlBackend()
+            except ImportError:
+                _backends[nome] = StdlibBackend()
+    return _backends[nome]
+
+
+def backends_disponiveis() -> Dict[str, Any]:
+    """Backends que podem ser carregados neste ambiente"""
+    disponiveis = {'stdlib': obter_backend('stdlib')}
+    try:
+        disponiveis['lxml'] = obter_backend('lxml')
+    except ImportError:
+        pass
+    return disponiveis